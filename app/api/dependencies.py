@@ -1,7 +1,47 @@
-from app.db.database import session
-def get_db():
-    db = session()
-    try:
+import hashlib
+from typing import Optional
+
+from fastapi import Depends, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.database import read_session, replica_sessions, session
+from app.services.cache import is_pinned_to_primary, pin_to_primary
+
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+def _client_key(request: Request) -> Optional[str]:
+    # Clients are told apart by their bearer token; the token itself is not stored.
+    authorization = request.headers.get("authorization")
+    if not authorization:
+        return None
+    return hashlib.sha1(authorization.encode()).hexdigest()
+
+
+async def get_primary_db():
+    """
+    Session on the primary for reads that must not be stale, e.g. when the result is cached.
+    """
+    async with session() as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
+
+
+async def get_db(request: Request, primary_db: AsyncSession = Depends(get_primary_db)):
+    """
+    Session for the request: a replica for reads, the primary for writes.
+
+    A client that sent a write is pinned to the primary for PRIMARY_STICKY_SECONDS,
+    so it reads its own writes even while the replicas lag behind. Requests served
+    by the primary share one session (and connection) with get_primary_db.
+    """
+    if replica_sessions:
+        client_key = _client_key(request)
+        if request.method not in SAFE_METHODS:
+            if client_key is not None:
+                await pin_to_primary(client_key)
+        elif client_key is None or not await is_pinned_to_primary(client_key):
+            replica = read_session()
+            async with replica() as db:
+                yield db
+            return
+    yield primary_db
@@ -0,0 +1,56 @@
+import asyncio
+
+from fastapi import APIRouter, status
+from fastapi.responses import JSONResponse, PlainTextResponse
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.core.metrics import render_metrics
+from app.db.database import engine, replica_engines
+
+router = APIRouter()
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    """
+    Prometheus scrape endpoint.
+    """
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@router.get("/livez", include_in_schema=False)
+async def livez():
+    """
+    Liveness probe: the worker's event loop is serving requests. It deliberately
+    does not touch the database, so an outage does not get every worker restarted.
+    """
+    return {"status": "ok"}
+
+
+async def _ping(db_engine) -> bool:
+    try:
+        async with asyncio.timeout(settings.READINESS_TIMEOUT_SECONDS):
+            async with db_engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+    except Exception:
+        return False
+    return True
+
+
+@router.get("/readyz", include_in_schema=False)
+async def readyz():
+    """
+    Readiness probe: the worker can get a connection to the primary and to every
+    replica (GET requests are routed to those) and run a query on each.
+    """
+    db_engines = {"database": engine}
+    db_engines.update({f"replica-{i}": replica for i, replica in enumerate(replica_engines)})
+    results = await asyncio.gather(*(_ping(db_engine) for db_engine in db_engines.values()))
+    checks = {name: "ok" if ok else "failed" for name, ok in zip(db_engines, results)}
+    if not all(results):
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"status": "unavailable", "checks": checks},
+        )
+    return {"status": "ok", "checks": checks}
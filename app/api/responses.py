@@ -0,0 +1,35 @@
+import functools
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, TypeAdapter
+
+
+@functools.lru_cache(maxsize=None)
+def type_adapter(tp: Any) -> TypeAdapter:
+    """
+    Return a TypeAdapter for `tp`, building its validator and serializer only once.
+    """
+    return TypeAdapter(tp)
+
+
+def _default(value: Any) -> Any:
+    # orjson handles dicts, lists, datetimes and enums natively; models go through pydantic.
+    if isinstance(value, BaseModel):
+        return type_adapter(type(value)).dump_python(value, mode="json")
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response rendered with orjson instead of the stdlib encoder.
+
+    It is the default response class of the v1 routers, where FastAPI still
+    validates results against `response_model` first. Hot endpoints return a
+    FastJSONResponse of plain data built from row tuples instead, which skips
+    that validation, so such data must already have the response model's shape.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_default)
@@ -1,97 +1,207 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
 import datetime
 
 from app.api.v1.auth import get_current_patient, get_current_doctor, get_current_user
-from app.api.dependencies import get_db
-from app.models.appointment import AppointmentCreate, AppointmentOut, AppointmentStatus
+from app.api.dependencies import get_db, get_primary_db
+from app.api.responses import FastJSONResponse
+from app.core.config import settings
+from app.models.appointment import (
+    AppointmentCreate,
+    AppointmentOut,
+    AppointmentReport,
+    AppointmentStatus,
+    BulkBookingResult,
+    BulkCancelRequest,
+    BulkCancelResult,
+    ExportFormat,
+)
+from app.models.pagination import Page
 from app.models.roles import Role
+from app.models.token import Principal
 from app.schema.users import User as UserModel
 from app.schema.appointment import Appointment as AppointmentModel
+from app.services.analytics import appointment_report
+from app.services.appointments import (
+    appointment_history_queries,
+    export_csv,
+    export_ndjson,
+    filter_appointments,
+    row_to_appointment,
+)
+from app.services.events import group_by_doctor, slot_events
+from app.services.notifications import enqueue_booking_notifications
+from app.services.schedule import scheduled_starts
+from app.util.pagination import decode_cursor, encode_cursor, is_id
 
 router = APIRouter()
 
 
-@router.get("/appointments", response_model=List[AppointmentOut])
-def get_my_appointments_as_doctor(
-    db: Session = Depends(get_db),
-    current_doctor: UserModel = Depends(get_current_doctor),
+@router.get("/appointments", response_model=Page[AppointmentOut])
+async def get_my_appointments_as_doctor(
+    cursor: Optional[str] = None,
+    limit: int = Query(settings.PAGE_DEFAULT_LIMIT, ge=1, le=settings.PAGE_MAX_LIMIT),
+    from_: Optional[datetime.datetime] = Query(None, alias="from"),
+    to: Optional[datetime.datetime] = None,
+    status_: Optional[AppointmentStatus] = Query(None, alias="status"),
+    db: AsyncSession = Depends(get_db),
+    current_doctor: Principal = Depends(get_current_doctor),
 ):
     """
-    Get a list of all appointments for the currently logged-in doctor.
+    Get the appointments of the currently logged-in doctor, archived ones included, ordered by time.
+    Results are keyset-paginated: pass `next_cursor` back as `cursor` to get the next page.
     """
-    return current_doctor.appointments_as_doctor
+    after = None
+    if cursor:
+        try:
+            after_time, after_id = decode_cursor(cursor)
+            if not is_id(after_id):
+                raise ValueError("Invalid cursor")
+            after = (datetime.datetime.fromisoformat(after_time), after_id)
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor.")
+
+    # The AppointmentOut fields are selected as plain columns, which skips building
+    # ORM entities and validating them into models. Archived appointments come first,
+    # so the live table is only read once the archive has run out of rows for this page.
+    rows = []
+    for query in appointment_history_queries(current_doctor.id, from_, to, status_, after):
+        # One extra row tells us whether there is a next page.
+        columns = query.selected_columns
+        rows += (await db.execute(
+            query.order_by(columns.appointment_time, columns.id).limit(limit + 1 - len(rows))
+        )).all()
+        if len(rows) > limit:
+            break
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].appointment_time, rows[-1].id)
+    return FastJSONResponse({"items": [row_to_appointment(row) for row in rows], "next_cursor": next_cursor})
+
+
+@router.get("/appointments/export")
+async def export_my_appointments(
+    format_: ExportFormat = Query(ExportFormat.NDJSON, alias="format"),
+    from_: Optional[datetime.datetime] = Query(None, alias="from"),
+    to: Optional[datetime.datetime] = None,
+    status_: Optional[AppointmentStatus] = Query(None, alias="status"),
+    db: AsyncSession = Depends(get_db),
+    current_doctor: Principal = Depends(get_current_doctor),
+):
+    """
+    Stream the currently logged-in doctor's appointments, archived ones included, as NDJSON or CSV.
+    Rows are read through a server-side cursor, so memory use does not grow with the history.
+    """
+    queries = appointment_history_queries(current_doctor.id, from_, to, status_)
+    if format_ == ExportFormat.CSV:
+        return StreamingResponse(
+            export_csv(db, queries),
+            media_type="text/csv",
+            headers={"Content-Disposition": 'attachment; filename="appointments.csv"'},
+        )
+    return StreamingResponse(export_ndjson(db, queries), media_type="application/x-ndjson")
+
+
+@router.get("/appointments/report", response_model=AppointmentReport)
+async def get_my_appointment_report(
+    from_: Optional[datetime.date] = Query(None, alias="from"),
+    to: Optional[datetime.date] = None,
+    # The appointment columns behind the report are cached, so they must not be filled from a lagging replica.
+    db: AsyncSession = Depends(get_primary_db),
+    current_doctor: Principal = Depends(get_current_doctor),
+):
+    """
+    Summarize the currently logged-in doctor's appointments from `from` up to (excluding) `to`:
+    status counts and rates, occupancy by weekday and hour, utilization of the available
+    minutes and booking lead times. Defaults to the 12 weeks up to and including today.
+    """
+    to = to or datetime.date.today() + datetime.timedelta(days=1)
+    from_ = from_ or to - datetime.timedelta(weeks=12)
+    if to <= from_:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="'to' must be after 'from'.")
+    return FastJSONResponse(await appointment_report(db, current_doctor.id, from_, to))
 
 
 @router.post("/book-appointments", response_model=AppointmentOut, status_code=status.HTTP_201_CREATED)
-def book_appointment(
+async def book_appointment(
     appointment_in: AppointmentCreate,
-    db: Session = Depends(get_db),
-    current_patient: UserModel = Depends(get_current_patient),
+    db: AsyncSession = Depends(get_db),
+    current_patient: Principal = Depends(get_current_patient),
 ):
     """
     Book an appointment with a doctor for the currently logged-in patient.
     """
-    doctor = db.query(UserModel).filter(
-        UserModel.id == appointment_in.doctor_id,
-        UserModel.role == Role.DOCTOR
-    ).first()
+    doctor = await db.scalar(
+        select(UserModel).where(
+            UserModel.id == appointment_in.doctor_id,
+            UserModel.role == Role.DOCTOR
+        )
+    )
 
     if not doctor:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Doctor not found.")
 
     # --- Availability Check ---
-    appointment_day = appointment_in.appointment_time.strftime("%A").lower()  # e.g., "monday"
-    appointment_time = appointment_in.appointment_time.time()
-
-    is_available = False
-    for slot in doctor.availabilities:
-        if slot.day_of_week.value == appointment_day:
-            if slot.start_time <= appointment_time < slot.end_time:
-                is_available = True
-                break
-
-    if not is_available:
+    # The time must be the start of one of the doctor's materialized slots.
+    if not await scheduled_starts(db, [doctor.id], [appointment_in.appointment_time]):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="The requested time slot is outside the doctor's availability."
         )
 
-    # --- Conflict Check ---
-    existing_appointment = db.query(AppointmentModel).filter(
-        AppointmentModel.doctor_id == appointment_in.doctor_id,
-        AppointmentModel.appointment_time == appointment_in.appointment_time,
-        AppointmentModel.status != AppointmentStatus.CANCELLED
-    ).first()
-
-    if existing_appointment:
-        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="This time slot is already booked.")
-
     # --- Create Appointment ---
+    # Double bookings are rejected atomically by the (doctor_id, active_slot) unique constraint.
     new_appointment = AppointmentModel(
-        **appointment_in.model_dump(),
-        patient_id=current_patient.id
+        appointment_time=appointment_in.appointment_time,
+        active_slot=appointment_in.appointment_time,
+        status=AppointmentStatus.SCHEDULED,
+        doctor_id=doctor.id,
+        patient_id=current_patient.id,
     )
     db.add(new_appointment)
-    db.commit()
-    db.refresh(new_appointment)
+    try:
+        # Flushed first so the notifications can reference the new id; they
+        # are committed together with the appointment.
+        await db.flush()
+        await enqueue_booking_notifications(db, [new_appointment])
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="This time slot is already booked.")
+    await slot_events.booked(doctor.id, [new_appointment.appointment_time])
 
-    return new_appointment
+    return AppointmentOut(
+        id=new_appointment.id,
+        appointment_time=new_appointment.appointment_time,
+        status=new_appointment.status,
+        doctor=doctor,
+        patient=current_patient,
+    )
 
 
 @router.patch("/appointments/{appointment_id}/cancel", response_model=AppointmentOut)
-def cancel_appointment(
+async def cancel_appointment(
     appointment_id: int,
-    db: Session = Depends(get_db),
-    current_user: UserModel = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
 ):
     """
     Cancel an appointment.
     Can be cancelled by either the patient who booked it or the doctor it's with.
     """
     # Fetch the appointment from the DB
-    appointment = db.query(AppointmentModel).filter(AppointmentModel.id == appointment_id).first()
+    appointment = await db.scalar(
+        select(AppointmentModel)
+        .options(joinedload(AppointmentModel.doctor), joinedload(AppointmentModel.patient))
+        .where(AppointmentModel.id == appointment_id)
+    )
 
     # Check if appointment exists
     if not appointment:
@@ -109,6 +219,232 @@ def cancel_appointment(
         )
 
     appointment.status = AppointmentStatus.CANCELLED
-    db.commit()
-    db.refresh(appointment)
-    return appointment
\ No newline at end of file
+    appointment.active_slot = None
+    await db.commit()
+    await slot_events.freed(appointment.doctor_id, [appointment.appointment_time])
+    return appointment
+
+
+
+@router.post("/book-appointments/bulk", response_model=List[BulkBookingResult])
+async def bulk_book_appointments(
+    appointments_in: List[AppointmentCreate],
+    db: AsyncSession = Depends(get_db),
+    current_patient: Principal = Depends(get_current_patient),
+):
+    """
+    Book several appointments for the currently logged-in patient, e.g. a recurring series.
+    Every item is validated against a single fetch of doctors, schedule slots and booked slots,
+    valid items are written in one transaction, and a result is returned per item.
+    """
+    if len(appointments_in) > settings.BULK_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.BULK_MAX_ITEMS} appointments can be booked at once.",
+        )
+
+    doctor_ids = {item.doctor_id for item in appointments_in}
+    times = {item.appointment_time for item in appointments_in}
+
+    doctors = {
+        doctor.id: doctor
+        for doctor in await db.scalars(
+            select(UserModel).where(UserModel.id.in_(doctor_ids), UserModel.role == Role.DOCTOR)
+        )
+    }
+    scheduled = await scheduled_starts(db, doctors, times)
+    booked = set(
+        (await db.execute(
+            select(AppointmentModel.doctor_id, AppointmentModel.active_slot).where(
+                AppointmentModel.doctor_id.in_(doctors),
+                AppointmentModel.active_slot.in_(times),
+            )
+        )).tuples()
+    )
+
+    results = []
+    pending = []
+    for index, item in enumerate(appointments_in):
+        slot = (item.doctor_id, item.appointment_time)
+        if item.doctor_id not in doctors:
+            results.append(BulkBookingResult(index=index, status_code=status.HTTP_404_NOT_FOUND, detail="Doctor not found."))
+        elif slot not in scheduled:
+            results.append(BulkBookingResult(
+                index=index,
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="The requested time slot is outside the doctor's availability.",
+            ))
+        elif slot in booked:
+            results.append(BulkBookingResult(index=index, status_code=status.HTTP_409_CONFLICT, detail="This time slot is already booked."))
+        else:
+            # Also catches the same slot appearing twice in this request.
+            booked.add(slot)
+            appointment = AppointmentModel(
+                appointment_time=item.appointment_time,
+                active_slot=item.appointment_time,
+                status=AppointmentStatus.SCHEDULED,
+                doctor_id=item.doctor_id,
+                patient_id=current_patient.id,
+            )
+            result = BulkBookingResult(index=index, status_code=status.HTTP_201_CREATED)
+            results.append(result)
+            pending.append((result, appointment))
+
+    if pending:
+        try:
+            async with db.begin_nested():
+                db.add_all([appointment for _, appointment in pending])
+        except IntegrityError:
+            # Another request claimed a slot after our check, so the batch insert was rolled
+            # back. Each item is retried in a savepoint of its own, and only the items whose
+            # slot was taken fail.
+            claimed = []
+            for result, appointment in pending:
+                retry = AppointmentModel(
+                    appointment_time=appointment.appointment_time,
+                    active_slot=appointment.active_slot,
+                    status=appointment.status,
+                    doctor_id=appointment.doctor_id,
+                    patient_id=appointment.patient_id,
+                )
+                try:
+                    async with db.begin_nested():
+                        db.add(retry)
+                except IntegrityError:
+                    result.status_code = status.HTTP_409_CONFLICT
+                    result.detail = "This time slot was booked concurrently, please retry."
+                else:
+                    claimed.append((result, retry))
+            pending = claimed
+        if pending:
+            await enqueue_booking_notifications(db, [appointment for _, appointment in pending])
+        await db.commit()
+
+    for doctor_id, starts in group_by_doctor(
+        (appointment.doctor_id, appointment.appointment_time) for _, appointment in pending
+    ).items():
+        await slot_events.booked(doctor_id, starts)
+    for result, appointment in pending:
+        result.appointment = AppointmentOut(
+            id=appointment.id,
+            appointment_time=appointment.appointment_time,
+            status=appointment.status,
+            doctor=doctors[appointment.doctor_id],
+            patient=current_patient,
+        )
+    return results
+
+
+@router.post("/appointments/bulk-cancel", response_model=List[BulkCancelResult])
+async def bulk_cancel_appointments(
+    request: BulkCancelRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+):
+    """
+    Cancel several appointments at once, either by id or every scheduled appointment
+    of the current user in a time range (e.g. a doctor calling in sick).
+    Matching rows are cancelled with a single UPDATE and a result is returned per appointment.
+    """
+    query = select(AppointmentModel).options(
+        joinedload(AppointmentModel.doctor), joinedload(AppointmentModel.patient)
+    )
+    if request.appointment_ids is not None:
+        if len(request.appointment_ids) > settings.BULK_MAX_ITEMS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"At most {settings.BULK_MAX_ITEMS} appointments can be cancelled at once.",
+            )
+        query = query.where(AppointmentModel.id.in_(request.appointment_ids))
+    else:
+        query = filter_appointments(
+            query.where(
+                or_(AppointmentModel.doctor_id == current_user.id, AppointmentModel.patient_id == current_user.id)
+            ),
+            request.from_,
+            request.to,
+            AppointmentStatus.SCHEDULED,
+        ).order_by(AppointmentModel.appointment_time, AppointmentModel.id).limit(settings.BULK_MAX_ITEMS + 1)
+    appointments = {appointment.id: appointment for appointment in await db.scalars(query)}
+    if len(appointments) > settings.BULK_MAX_ITEMS:
+        # Cancelling only part of the range would look like a complete cancellation.
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"More than {settings.BULK_MAX_ITEMS} appointments are in this range, please cancel a shorter one.",
+        )
+
+    results = []
+    cancellable = []
+    seen = set()
+    for appointment_id in request.appointment_ids if request.appointment_ids is not None else appointments:
+        appointment = appointments.get(appointment_id)
+        repeated = appointment_id in seen
+        seen.add(appointment_id)
+        if repeated:
+            # Only the first mention is cancelled and reported on.
+            results.append(BulkCancelResult(
+                appointment_id=appointment_id,
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="This appointment is listed more than once.",
+            ))
+        elif appointment is None:
+            results.append(BulkCancelResult(appointment_id=appointment_id, status_code=status.HTTP_404_NOT_FOUND, detail="Appointment not found."))
+        elif current_user.id not in (appointment.patient_id, appointment.doctor_id):
+            results.append(BulkCancelResult(
+                appointment_id=appointment_id,
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="You are not authorized to cancel this appointment.",
+            ))
+        elif appointment.status != AppointmentStatus.SCHEDULED:
+            results.append(BulkCancelResult(
+                appointment_id=appointment_id,
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Cannot cancel an appointment with status '{appointment.status.value}'.",
+            ))
+        else:
+            cancellable.append(appointment)
+            results.append(BulkCancelResult(appointment_id=appointment_id, status_code=status.HTTP_200_OK))
+
+    if cancellable:
+        ids = [appointment.id for appointment in cancellable]
+        # Re-checks the status, so an appointment the sweeper completed in between stays completed.
+        updated = await db.execute(
+            update(AppointmentModel)
+            .where(AppointmentModel.id.in_(ids), AppointmentModel.status == AppointmentStatus.SCHEDULED)
+            .values(status=AppointmentStatus.CANCELLED, active_slot=None)
+            .execution_options(synchronize_session=False)
+        )
+        current = {}
+        if updated.rowcount != len(ids):
+            current = {
+                appointment_id: appointment_status
+                for appointment_id, appointment_status in await db.execute(
+                    select(AppointmentModel.id, AppointmentModel.status).where(AppointmentModel.id.in_(ids))
+                )
+            }
+        await db.commit()
+
+        freed = []
+        for appointment in cancellable:
+            current_status = current.get(appointment.id, AppointmentStatus.CANCELLED)
+            if current_status == AppointmentStatus.CANCELLED:
+                appointment.status = AppointmentStatus.CANCELLED
+                appointment.active_slot = None
+                freed.append(appointment)
+            else:
+                appointment.status = current_status
+        for doctor_id, starts in group_by_doctor(
+            (appointment.doctor_id, appointment.appointment_time) for appointment in freed
+        ).items():
+            await slot_events.freed(doctor_id, starts)
+
+    for result in results:
+        if result.status_code != status.HTTP_200_OK:
+            continue
+        appointment = appointments[result.appointment_id]
+        if appointment.status != AppointmentStatus.CANCELLED:
+            result.status_code = status.HTTP_400_BAD_REQUEST
+            result.detail = f"Cannot cancel an appointment with status '{appointment.status.value}'."
+        else:
+            result.appointment = AppointmentOut.model_validate(appointment)
+    return results
@@ -1,23 +1,52 @@
+from typing import Optional
+
 from fastapi import Depends, HTTPException, status
+from fastapi.requests import HTTPConnection
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from pydantic import BaseModel, ValidationError
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.api.dependencies import get_db
+from app.api.dependencies import get_primary_db
 from app.core.config import settings
+from app.core.security import SLOT_FEED_SCOPE
+from app.db.database import session
+from app.models.token import Principal
 from app.schema.users import User as UserModel
+from app.services.cache import get_user_version, invalidate_user_version
 from app.util.roles import UserRole
+from app.util.ttl_cache import TTLCache
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
 
+# (Principal, shared user version) keyed by the token subject (email).
+principal_cache = TTLCache(maxsize=settings.AUTH_CACHE_SIZE, ttl=settings.AUTH_CACHE_TTL_SECONDS)
+
 
 class TokenData(BaseModel):
     sub: str
     role: UserRole
+    uid: Optional[int] = None
+    ver: Optional[int] = None
+    # Set on feed tokens only: their scope and the doctor whose feed they open.
+    scope: Optional[str] = None
+    doc: Optional[int] = None
+
 
+async def invalidate_user(email: str) -> None:
+    """
+    Drop a cached user in every worker, e.g. after a password reset or when the user is deleted.
+    """
+    principal_cache.pop(email)
+    await invalidate_user_version(email)
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> UserModel:
+
+async def authenticate(token: str, db: AsyncSession, scope: Optional[str] = None) -> Principal:
+    """
+    The user a token belongs to. Only tokens issued for `scope` are accepted, so scoped
+    tokens such as feed tokens never work as access tokens.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Invalid Token",
@@ -28,19 +57,78 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         token_data = TokenData(**payload)
     except (JWTError, ValidationError):
         raise credentials_exception
+    if token_data.scope != scope:
+        raise credentials_exception
+
+    # Read before the database so a concurrent invalidation is never cached as current.
+    version = await get_user_version(token_data.sub)
+    principal = None
+    cached = principal_cache.get(token_data.sub)
+    # A token newer than the cached user means another worker reset the password.
+    if cached is not None and cached[1] == version and (token_data.ver or 0) <= cached[0].token_version:
+        principal = cached[0]
+    if principal is None:
+        # Read from the primary: a lagging replica could still hold the pre-reset version.
+        row = (await db.execute(
+            select(UserModel.id, UserModel.email, UserModel.role, UserModel.token_version)
+            .where(UserModel.email == token_data.sub)
+        )).first()
+        if row is None:
+            raise credentials_exception
+        principal = Principal(id=row.id, email=row.email, role=row.role, token_version=row.token_version)
+        principal_cache.set(token_data.sub, (principal, version))
+
+    # Tokens issued before a password reset carry an older version and are rejected.
+    if token_data.ver is not None and token_data.ver != principal.token_version:
+        raise credentials_exception
+    if token_data.uid is not None and token_data.uid != principal.id:
+        raise credentials_exception
+    return principal
+
 
-    user = db.query(UserModel).filter(UserModel.email == token_data.sub).first()
-    if user is None:
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_primary_db)) -> Principal:
+    return await authenticate(token, db)
+
+
+async def get_streaming_user(connection: HTTPConnection, doctor_id: int) -> Principal:
+    """
+    get_current_user for long-lived event streams and WebSockets of `doctor_id`'s slots.
+    Browsers cannot set headers on those, so they may pass a feed token from
+    POST /doctors/{doctor_id}/slots/feed-token as `feed_token` in the query instead. Query
+    strings are written to access logs, so access tokens are only taken from the header.
+    The user is looked up in a session of its own that is closed right away, so an open
+    stream does not hold a database connection.
+    """
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Not authenticated",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    scheme, _, token = connection.headers.get("authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and token:
+        async with session() as db:
+            return await authenticate(token, db)
+
+    token = connection.query_params.get("feed_token")
+    if not token:
+        raise credentials_exception
+    try:
+        feed_doctor_id = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]).get("doc")
+    except JWTError:
+        raise credentials_exception
+    # A feed token opens the feed of the doctor it was issued for only.
+    if feed_doctor_id != doctor_id:
         raise credentials_exception
-    return user
+    async with session() as db:
+        return await authenticate(token, db, scope=SLOT_FEED_SCOPE)
 
 
-def get_current_doctor(current_user: UserModel = Depends(get_current_user)) -> UserModel:
+def get_current_doctor(current_user: Principal = Depends(get_current_user)) -> Principal:
     if current_user.role != UserRole.DOCTOR:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="The user is not a doctor")
     return current_user
 
-def get_current_patient(current_user: UserModel = Depends(get_current_user)) -> UserModel:
+def get_current_patient(current_user: Principal = Depends(get_current_user)) -> Principal:
     if current_user.role != UserRole.PATIENT:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="The user is not a patient")
     return current_user
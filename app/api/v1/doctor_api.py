@@ -1,33 +1,239 @@
-from typing import List
+import asyncio
+import datetime
+import hashlib
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 
-from app.api.dependencies import get_db
-from app.api.v1.auth import get_current_patient, get_current_doctor
-from app.models.availability import AvailabilityBase, AvailabilityOut
+from app.api.dependencies import get_db, get_primary_db
+from app.api.v1.auth import get_current_patient, get_current_doctor, get_current_user, get_streaming_user
+from app.core.config import settings
+from app.core.security import create_slot_feed_token
+from app.db.database import session
+from app.models.availability import (
+    AvailabilityBase,
+    AvailabilityExceptionOut,
+    AvailabilityOut,
+    AvailabilityWindow,
+    SlotOut,
+)
 from app.models.roles import Role
 from app.models.users import DoctorOut
-from app.schema.availability import Availability as AvailabilityModel
+from app.schema.availability import Availability as AvailabilityModel, AvailabilityException
+from app.models.token import FeedToken, Principal
 from app.schema.users import User as UserModel
+from app.services.availability import DAY_ORDER, diff_intervals, normalize_intervals
+from app.services.cache import get_doctor_payload, invalidate_doctor, set_doctor_payload
+from app.services.doctor_search import doctor_search_index
+from app.services.events import HEARTBEAT, SlotFeedFull, Subscription, slot_events
+from app.services.jobs import now
+from app.services.schedule import (
+    WEEKDAYS,
+    covering_runs,
+    free_slots,
+    horizon_dates,
+    regenerate_schedule,
+)
+from app.util.datetimes import to_local_naive
 
 router = APIRouter()
 
 
 @router.get("/doctors/{doctor_id}", response_model=DoctorOut)
-def get_doctor_details(
+async def get_doctor_details(
     doctor_id: int,
-    db: Session = Depends(get_db),
-    current_user: UserModel = Depends(get_current_patient),
+    if_none_match: Optional[str] = Header(None),
+    # Misses fill the shared cache, so they must not read from a lagging replica.
+    db: AsyncSession = Depends(get_primary_db),
+    current_user: Principal = Depends(get_current_patient),
 ):
     """
     Get a specific doctor's profile and availability.
     Accessible by any authenticated user.
+    The serialized profile is cached and served with an ETag, so clients can revalidate
+    with `If-None-Match` and get a 304 while the schedule is unchanged.
+    """
+    payload, cache_key = await get_doctor_payload(doctor_id)
+    if payload is None:
+        doctor = await db.scalar(
+            select(UserModel)
+            .options(selectinload(UserModel.availabilities))
+            .where(UserModel.id == doctor_id, UserModel.role == Role.DOCTOR)
+        )
+        if not doctor:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Doctor not found")
+        payload = DoctorOut.model_validate(doctor).model_dump_json().encode()
+        await set_doctor_payload(cache_key, payload)
+
+    headers = {"ETag": f'"{hashlib.sha1(payload).hexdigest()}"', "Cache-Control": "no-cache"}
+    if if_none_match and headers["ETag"] in (tag.strip() for tag in if_none_match.split(",")):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=payload, media_type="application/json", headers=headers)
+
+
+@router.get("/doctors/{doctor_id}/slots", response_model=List[SlotOut])
+async def get_doctor_slots(
+    doctor_id: int,
+    from_: datetime.datetime = Query(..., alias="from"),
+    to: datetime.datetime = Query(...),
+    duration: Optional[int] = Query(None, ge=5, le=480, description="Appointment length in minutes"),
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+):
     """
-    doctor = db.query(UserModel).filter(UserModel.id == doctor_id, UserModel.role == Role.DOCTOR).first()
+    Get the free slots of a doctor between `from` and `to`.
+    Slots are read from the doctor's materialized schedule, whose slot lengths are
+    set per availability window, and exclude booked appointments.
+    With `duration`, the spans of that length covered by back-to-back free slots are
+    returned instead, one per slot they can start at.
+    """
+    start = to_local_naive(from_)
+    end = to_local_naive(to)
+    if end <= start:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="'to' must be after 'from'.")
+    if end - start > datetime.timedelta(days=settings.SLOT_SEARCH_MAX_DAYS):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"The search window cannot exceed {settings.SLOT_SEARCH_MAX_DAYS} days.",
+        )
+
+    doctor = await db.scalar(select(UserModel.id).where(UserModel.id == doctor_id, UserModel.role == Role.DOCTOR))
     if not doctor:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Doctor not found")
-    return doctor
+
+    slots = await free_slots(db, doctor_id, start, end)
+    if duration is not None:
+        slots = covering_runs(slots, datetime.timedelta(minutes=duration))
+    return [SlotOut(start=slot_start, end=slot_end) for slot_start, slot_end in slots]
+
+
+@router.post("/doctors/{doctor_id}/slots/feed-token", response_model=FeedToken)
+async def create_doctor_slot_feed_token(
+    doctor_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+):
+    """
+    Issue a short-lived token that opens this doctor's slot feed, for clients that cannot
+    send the `Authorization` header: `?feed_token=` on `/slots/events` or `/slots/ws`.
+    """
+    doctor = await db.scalar(select(UserModel.id).where(UserModel.id == doctor_id, UserModel.role == Role.DOCTOR))
+    if not doctor:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Doctor not found")
+    token_data = {
+        "sub": current_user.email,
+        "role": current_user.role.value,
+        "uid": current_user.id,
+        "ver": current_user.token_version,
+    }
+    return FeedToken(
+        feed_token=create_slot_feed_token(token_data, doctor_id),
+        expires_in=settings.SLOT_FEED_TOKEN_EXPIRE_SECONDS,
+    )
+
+
+async def _subscribe_to_slots(doctor_id: int) -> Subscription:
+    # A session of its own: the stream that follows must not keep a connection checked out.
+    async with session() as db:
+        doctor = await db.scalar(select(UserModel.id).where(UserModel.id == doctor_id, UserModel.role == Role.DOCTOR))
+    if not doctor:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Doctor not found")
+    try:
+        return slot_events.subscribe(doctor_id)
+    except SlotFeedFull:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Too many open slot feeds, please retry later."
+        )
+
+
+async def _server_sent_events(subscription: Subscription):
+    try:
+        # Sent right away, so the client knows it is subscribed; also sets EventSource's reconnect delay.
+        yield b"retry: 3000\n\n"
+        while not subscription.closed:
+            payload = await subscription.get(settings.SLOT_FEED_HEARTBEAT_SECONDS)
+            if payload is None and subscription.closed:
+                break
+            # A comment line keeps proxies from closing an idle stream, and writing it
+            # is how a client that went away is noticed.
+            yield b"data: " + payload + b"\n\n" if payload is not None else b": heartbeat\n\n"
+    finally:
+        slot_events.unsubscribe(subscription)
+
+
+@router.get("/doctors/{doctor_id}/slots/events")
+async def stream_doctor_slot_events(
+    doctor_id: int,
+    current_user: Principal = Depends(get_streaming_user),
+):
+    """
+    Server-Sent Events feed of changes to a doctor's slots, replacing polling while a
+    booking screen is open. Subscribe first, then fetch the slots, then apply each event:
+    `booked` and `freed` list slot start times, `schedule` lists dates whose slots should
+    be fetched again, and `resync` means everything should be fetched again.
+    """
+    subscription = await _subscribe_to_slots(doctor_id)
+    return StreamingResponse(
+        _server_sent_events(subscription),
+        media_type="text/event-stream",
+        # No caching, and no buffering by nginx-style proxies.
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _wait_for_close(websocket: WebSocket) -> None:
+    # Clients only listen; anything they send is ignored.
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+        pass
+
+
+@router.websocket("/doctors/{doctor_id}/slots/ws")
+async def doctor_slot_events_websocket(websocket: WebSocket, doctor_id: int):
+    """
+    The same feed as `/doctors/{doctor_id}/slots/events` over a WebSocket, one JSON
+    event per text message, with `{"op": "heartbeat"}` messages while idle.
+    """
+    try:
+        await get_streaming_user(websocket, doctor_id)
+        subscription = await _subscribe_to_slots(doctor_id)
+    except HTTPException as e:
+        code = status.WS_1013_TRY_AGAIN_LATER if e.status_code == 503 else status.WS_1008_POLICY_VIOLATION
+        await websocket.close(code=code, reason=e.detail)
+        return
+
+    await websocket.accept()
+    closed = asyncio.create_task(_wait_for_close(websocket))
+    closed.add_done_callback(lambda _: subscription.close())
+    try:
+        while not subscription.closed:
+            payload = await subscription.get(settings.SLOT_FEED_HEARTBEAT_SECONDS)
+            if payload is None and subscription.closed:
+                break
+            await websocket.send_text((payload or HEARTBEAT).decode())
+        if not closed.done():
+            # The server closed the feed because it is shutting down.
+            await websocket.close(code=status.WS_1001_GOING_AWAY)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        closed.cancel()
+        slot_events.unsubscribe(subscription)
+
+
+async def _commit_schedule_change(db: AsyncSession) -> None:
+    try:
+        await db.commit()
+    except IntegrityError:
+        # Another request regenerated the same slots first.
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT, detail="The schedule was changed concurrently, please retry."
+        )
 
 
 @router.post(
@@ -35,25 +241,158 @@ def get_doctor_details(
     response_model=List[AvailabilityOut],
     status_code=status.HTTP_201_CREATED,
 )
-def set_doctor_availability(
+async def set_doctor_availability(
     availabilities: List[AvailabilityBase],
-    db: Session = Depends(get_db),
-    current_doctor: UserModel = Depends(get_current_doctor),
+    db: AsyncSession = Depends(get_db),
+    current_doctor: Principal = Depends(get_current_doctor),
 ):
     """
     Set or update the weekly availability for the logged-in doctor.
     This will replace any existing availability for the doctor.
+    Overlapping intervals on the same day are merged, and only the rows that
+    actually differ from the stored schedule are inserted, updated or deleted.
+    The materialized slots are regenerated for the weekdays that changed.
     """
-    # Clear old availability
-    current_doctor.availabilities = []
+    try:
+        desired = normalize_intervals(availabilities)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    existing = (await db.scalars(
+        select(AvailabilityModel).where(AvailabilityModel.doctor_id == current_doctor.id)
+    )).all()
+    diff = diff_intervals(existing, desired)
 
-    # Add new availability
-    for item in availabilities:
-        db_availability = AvailabilityModel(**item.model_dump(), doctor_id=current_doctor.id)
-        current_doctor.availabilities.append(db_availability)
+    if diff.deletes:
+        await db.execute(
+            delete(AvailabilityModel).where(AvailabilityModel.id.in_([row.id for row in diff.deletes]))
+        )
+    if diff.updates:
+        # Bulk UPDATE by primary key, sent as a single executemany.
+        await db.execute(
+            update(AvailabilityModel),
+            [{"id": row.id, **interval._asdict()} for row, interval in diff.updates],
+        )
+    new_rows = [AvailabilityModel(**interval._asdict(), doctor_id=current_doctor.id) for interval in diff.inserts]
+    db.add_all(new_rows)
 
-    db.add(current_doctor)
-    db.commit()
-    db.refresh(current_doctor)
+    changed_days = {row.day_of_week for row in diff.deletes} | {interval.day_of_week for interval in diff.inserts}
+    for row, interval in diff.updates:
+        changed_days.update((row.day_of_week, interval.day_of_week))
+    if changed_days:
+        # Autoflush is off, and regenerating reads the new rows back.
+        await db.flush()
+        await regenerate_schedule(db, current_doctor.id, horizon_dates(changed_days))
+        await _commit_schedule_change(db)
+        await invalidate_doctor(current_doctor.id)
+        await doctor_search_index.set_doctor(
+            current_doctor.id, [(interval.day_of_week, interval.start_time, interval.end_time) for interval in desired]
+        )
+        await slot_events.schedule_changed(current_doctor.id, horizon_dates(changed_days))
 
-    return current_doctor.availabilities
\ No newline at end of file
+    result = [AvailabilityOut.model_validate(row) for row in diff.unchanged + new_rows]
+    result += [
+        AvailabilityOut(id=row.id, doctor_id=row.doctor_id, **interval._asdict())
+        for row, interval in diff.updates
+    ]
+    return sorted(result, key=lambda a: (DAY_ORDER[a.day_of_week], a.start_time))
+
+
+@router.get("/availability/exceptions", response_model=List[AvailabilityExceptionOut])
+async def get_availability_exceptions(
+    db: AsyncSession = Depends(get_db),
+    current_doctor: Principal = Depends(get_current_doctor),
+):
+    """
+    List the logged-in doctor's exceptions from today on.
+    """
+    rows = await db.execute(
+        select(
+            AvailabilityException.date,
+            AvailabilityException.start_time,
+            AvailabilityException.end_time,
+            AvailabilityException.slot_minutes,
+        )
+        .where(AvailabilityException.doctor_id == current_doctor.id, AvailabilityException.date >= now().date())
+        .order_by(AvailabilityException.date, AvailabilityException.start_time)
+    )
+    exceptions = {}
+    for day, start, end, minutes in rows:
+        windows = exceptions.setdefault(day, [])
+        if start is not None:
+            windows.append(AvailabilityWindow(start_time=start, end_time=end, slot_minutes=minutes))
+    return [AvailabilityExceptionOut(date=day, windows=windows) for day, windows in exceptions.items()]
+
+
+@router.put("/availability/exceptions/{date}", response_model=AvailabilityExceptionOut)
+async def set_availability_exception(
+    date: datetime.date,
+    windows: List[AvailabilityWindow],
+    db: AsyncSession = Depends(get_db),
+    current_doctor: Principal = Depends(get_current_doctor),
+):
+    """
+    Replace the logged-in doctor's weekly availability on one date, e.g. with shorter
+    hours, or with an empty list for a day off. Only that date's slots are regenerated.
+    """
+    if date < now().date():
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Exceptions cannot be set for past dates.")
+    day_of_week = WEEKDAYS[date.weekday()]
+    try:
+        intervals = normalize_intervals(
+            AvailabilityBase(day_of_week=day_of_week, **window.model_dump()) for window in windows
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    await db.execute(
+        delete(AvailabilityException).where(
+            AvailabilityException.doctor_id == current_doctor.id, AvailabilityException.date == date
+        )
+    )
+    rows = [
+        AvailabilityException(
+            date=date,
+            start_time=interval.start_time,
+            end_time=interval.end_time,
+            slot_minutes=interval.slot_minutes,
+            doctor_id=current_doctor.id,
+        )
+        for interval in intervals
+    ]
+    # A row without times marks the day off.
+    db.add_all(rows or [AvailabilityException(date=date, doctor_id=current_doctor.id)])
+    await db.flush()
+    await regenerate_schedule(db, current_doctor.id, [date])
+    await _commit_schedule_change(db)
+    await slot_events.schedule_changed(current_doctor.id, [date])
+
+    return AvailabilityExceptionOut(
+        date=date,
+        windows=[
+            AvailabilityWindow(start_time=interval.start_time, end_time=interval.end_time, slot_minutes=interval.slot_minutes)
+            for interval in intervals
+        ],
+    )
+
+
+@router.delete("/availability/exceptions/{date}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_availability_exception(
+    date: datetime.date,
+    db: AsyncSession = Depends(get_db),
+    current_doctor: Principal = Depends(get_current_doctor),
+):
+    """
+    Remove the exception on `date`, so the weekly availability applies again.
+    """
+    result = await db.execute(
+        delete(AvailabilityException).where(
+            AvailabilityException.doctor_id == current_doctor.id, AvailabilityException.date == date
+        )
+    )
+    if not result.rowcount:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No exception on this date.")
+    await regenerate_schedule(db, current_doctor.id, [date])
+    await _commit_schedule_change(db)
+    await slot_events.schedule_changed(current_doctor.id, [date])
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
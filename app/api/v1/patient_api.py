@@ -1,22 +1,111 @@
-from typing import List
+import bisect
+import datetime
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.dependencies import get_db
-from app.api.v1.auth import get_current_doctor, get_current_patient
+from app.api.responses import FastJSONResponse
+from app.api.v1.auth import get_current_patient
+from app.core.config import settings
+from app.models.availability import DayOfWeek
+from app.models.pagination import Page
+from app.models.token import Principal
+from app.schema.availability import AvailabilityException
 from app.schema.users import User as UserModel
 from app.models.roles import Role
 from app.models.users import UserDto
+from app.services.doctor_search import doctor_search_index
+from app.services.schedule import WEEKDAYS, doctors_with_free_slot
+from app.util.pagination import decode_cursor, encode_cursor, is_id
 
 router = APIRouter()
 
 
-@router.get(path="/doctors", response_model=List[UserDto])
-def get_doctors(db: Session = Depends(get_db), current_user: UserModel = Depends(get_current_patient())):
-    all_doctors = db.query(UserModel).filter(UserModel.role == Role.DOCTOR).all()
+async def _search_doctor_ids(
+    db: AsyncSession,
+    after_id: Optional[int],
+    limit: int,
+    day: Optional[DayOfWeek],
+    at: Optional[datetime.time],
+    date: Optional[datetime.date],
+) -> List[int]:
+    """
+    Up to `limit` + 1 ids of matching doctors after `after_id`, in id order.
+    """
+    bitmap = await doctor_search_index.get()
+    weekday = WEEKDAYS[date.weekday()] if date else day
+    mask = bitmap.available_at(weekday, at) if at else bitmap.available_on(weekday)
+    if date is None:
+        return bitmap.doctors(mask, after_id, limit + 1)
 
-    if not all_doctors:
+    # An exception can give a doctor hours on a day they do not usually work.
+    extra = await db.scalars(
+        select(AvailabilityException.doctor_id).distinct().where(AvailabilityException.date == date)
+    )
+    candidates = sorted(set(bitmap.doctors(mask)).union(extra))
+    if after_id is not None:
+        candidates = candidates[bisect.bisect_right(candidates, after_id):]
+
+    # The bitmap only knows the weekly hours, so the candidates are checked against
+    # that date's free slots (exceptions and bookings included), a page at a time.
+    found = []
+    for i in range(0, len(candidates), limit + 1):
+        chunk = candidates[i:i + limit + 1]
+        free = await doctors_with_free_slot(db, chunk, date, at)
+        found.extend(doctor_id for doctor_id in chunk if doctor_id in free)
+        if len(found) > limit:
+            break
+    return found[:limit + 1]
+
+
+@router.get(path="/doctors", response_model=Page[UserDto])
+async def get_doctors(
+    cursor: Optional[str] = None,
+    limit: int = Query(settings.PAGE_DEFAULT_LIMIT, ge=1, le=settings.PAGE_MAX_LIMIT),
+    day: Optional[DayOfWeek] = Query(None, description="Only doctors whose weekly hours include this day"),
+    date: Optional[datetime.date] = Query(None, description="Only doctors with a free slot on this date"),
+    at: Optional[datetime.time] = Query(None, alias="time", description="Narrow `day` or `date` to this time"),
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_patient),
+):
+    """
+    Get the doctor directory ordered by id, keyset-paginated through `cursor`.
+    `day` (and `time`) search the doctors' weekly hours; `date` (and `time`) only
+    return doctors who still have a free slot then. Searches are answered from an
+    in-memory bitmap of the weekly availability instead of scanning every doctor.
+    """
+    if day is not None and date is not None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Pass either 'day' or 'date', not both.")
+    if at is not None and day is None and date is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="'time' needs a 'day' or a 'date'.")
+
+    after_id = None
+    if cursor:
+        try:
+            (after_id,) = decode_cursor(cursor)
+            if not is_id(after_id):
+                raise ValueError("Invalid cursor")
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor.")
+
+    query = select(UserModel.id, UserModel.email, UserModel.role).where(UserModel.role == Role.DOCTOR)
+    searching = day is not None or date is not None
+    if searching:
+        query = query.where(UserModel.id.in_(await _search_doctor_ids(db, after_id, limit, day, at, date)))
+    elif after_id is not None:
+        query = query.where(UserModel.id > after_id)
+
+    doctors = (await db.execute(query.order_by(UserModel.id).limit(limit + 1))).all()
+
+    if not doctors and not cursor and not searching:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No Doctors Found")
 
-    return all_doctors
\ No newline at end of file
+    next_cursor = None
+    if len(doctors) > limit:
+        doctors = doctors[:limit]
+        next_cursor = encode_cursor(doctors[-1].id)
+    # The rows already have UserDto's fields, so they are rendered without model validation.
+    return FastJSONResponse({"items": [doctor._asdict() for doctor in doctors], "next_cursor": next_cursor})
@@ -1,72 +1,89 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.dependencies import get_db
+from app.api.v1.auth import invalidate_user
 from app.models.login_dto import LoginDto
 from app.models.token import Token
 from app.models.password import ForgotPasswordRequest, ResetPasswordRequest
 from app.models.users import UserDto, UserCreateDto
 from app.schema.users import User as UserModel
-from app.core.security import create_access_token, hash_password, verify_password, create_password_reset_token, verify_password_reset_token
+from app.services.cache import invalidate_doctor
+from app.services.notifications import enqueue_password_reset
+from app.core.security import create_access_token, verify_password_reset_token
+from app.services.password_hasher import password_hasher
+from app.services.rate_limit import enforce_rate_limit
 
 router = APIRouter()
 
 
 @router.post("/auth/register", response_model=UserDto, status_code=status.HTTP_201_CREATED)
-def register_user(user: UserCreateDto, db: Session = Depends(get_db)):
+async def register_user(user: UserCreateDto, request: Request, db: AsyncSession = Depends(get_db)):
     """
     Register a new user (Doctor or Patient).
     """
+    await enforce_rate_limit("register", request.client and request.client.host)
     db_user = UserModel(
         email=user.email,
-        password=hash_password(user.password),
+        password=await password_hasher.hash(user.password),
         role=user.role
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 
 @router.post('/auth/login', response_model=Token)
-def login(login_dto: LoginDto, db: Session=Depends(get_db)):
-    db_user = db.query(UserModel).filter(UserModel.email == login_dto.email).first()
+async def login(login_dto: LoginDto, request: Request, db: AsyncSession = Depends(get_db)):
+    # Throttled per IP and per account before the lookup and the bcrypt verify.
+    await enforce_rate_limit("login", request.client and request.client.host, login_dto.email)
+    db_user = await db.scalar(select(UserModel).where(UserModel.email == login_dto.email))
 
     if not db_user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect email or password")
 
-    if not verify_password(login_dto.password, db_user.password):
+    is_valid, new_hash = await password_hasher.verify_and_update(login_dto.password, db_user.password)
+    if not is_valid:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect email or password")
 
-    token_data = {"sub": db_user.email, "role": db_user.role.value}
+    # Transparently upgrade hashes made with outdated bcrypt settings.
+    if new_hash:
+        db_user.password = new_hash
+        await db.commit()
+
+    token_data = {
+        "sub": db_user.email,
+        "role": db_user.role.value,
+        "uid": db_user.id,
+        "ver": db_user.token_version,
+    }
     access_token = create_access_token(data=token_data)
     return {"access_token": access_token, "token_type": "bearer"}
 
 
 @router.post("/auth/forgot-password")
-def forgot_password(
+async def forgot_password(
     request: ForgotPasswordRequest,
-    db: Session = Depends(get_db)
+    http_request: Request,
+    db: AsyncSession = Depends(get_db)
 ):
     """
-    Forgot password endpoint. In this mock flow, it returns the reset token.
-    In a real application, this would send an email and return a success message.
+    Forgot password endpoint. Queues an email with a reset link and always gives
+    the same answer, so it does not reveal whether an account exists.
     """
-    user = db.query(UserModel).filter(UserModel.email == request.email).first()
-    # To prevent user enumeration, we don't reveal if the user was found.
-    # We proceed as if the process was successful.
-    if user:
-        password_reset_token = create_password_reset_token(email=request.email)
-        # In a real app, you would email this token. Here, we return it.
-        return {"msg": "Password reset token generated.", "reset_token": password_reset_token}
-    
+    await enforce_rate_limit("forgot-password", http_request.client and http_request.client.host, request.email)
+    # The job worker checks the address and sends the mail, keeping both off the request path.
+    await enqueue_password_reset(db, request.email)
+    await db.commit()
     return {"msg": "If an account with this email exists, a password reset link has been sent."}
 
 
 @router.post("/auth/reset-password")
-def reset_password(
+async def reset_password(
     request: ResetPasswordRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Reset user password using a valid token.
@@ -75,11 +92,15 @@ def reset_password(
     if not email:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid or expired token")
 
-    user = db.query(UserModel).filter(UserModel.email == email).first()
+    user = await db.scalar(select(UserModel).where(UserModel.email == email))
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
-    user.password = hash_password(request.new_password)
-    db.commit()
+    user.password = await password_hasher.hash(request.new_password)
+    # Revoke every access token issued with the old password.
+    user.token_version = UserModel.token_version + 1
+    await db.commit()
+    await invalidate_user(user.email)
+    await invalidate_doctor(user.id)
 
     return {"msg": "Password has been reset successfully."}
\ No newline at end of file
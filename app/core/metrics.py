@@ -0,0 +1,206 @@
+import contextvars
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from starlette.datastructures import MutableHeaders
+
+from app.core.config import settings
+
+slow_query_logger = logging.getLogger("app.db.slow")
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge", f"{self.name} {self.value}"]
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> (per-bucket counts, sum, count)
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        entry = self._values.get(labels)
+        if entry is None:
+            entry = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                entry[0][i] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, (bucket_counts, total, count) in self._values.items():
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), bucket_counts + [count]):
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {bucket_count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+REGISTRY: List = []
+
+
+def _register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+http_requests_total = _register(Counter(
+    "http_requests_total", "HTTP requests handled.", ["method", "route", "status"]
+))
+http_request_duration_seconds = _register(Histogram(
+    "http_request_duration_seconds", "Time spent handling HTTP requests.", ["method", "route"]
+))
+db_queries_total = _register(Counter(
+    "db_queries_total", "SQL statements executed.", ["route"]
+))
+db_query_duration_seconds = _register(Histogram(
+    "db_query_duration_seconds", "Time spent executing SQL statements.", ["route"]
+))
+db_pool_wait_seconds = _register(Histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled DB connection.", ["route"]
+))
+rate_limited_total = _register(Counter(
+    "rate_limited_requests_total", "Requests rejected by a rate limit.", ["scope"]
+))
+slot_feed_subscribers = _register(Gauge(
+    "slot_feed_subscribers", "Open slot feed subscriptions (event streams and WebSockets)."
+))
+slot_feed_resyncs_total = _register(Counter(
+    "slot_feed_resyncs_total", "Slot feed subscribers that fell behind and were told to resync."
+))
+
+
+def render_metrics() -> str:
+    """
+    Render every registered metric in the Prometheus text exposition format.
+    """
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --- Per-request statistics ---
+
+@dataclass
+class RequestStats:
+    scope: dict
+    started: float = field(default_factory=time.perf_counter)
+    query_count: int = 0
+    query_time: float = 0.0
+    pool_wait: float = 0.0
+
+    @property
+    def route(self) -> str:
+        route = self.scope.get("route")
+        return route.path if route is not None else "unmatched"
+
+    def server_timing(self) -> str:
+        total = (time.perf_counter() - self.started) * 1000
+        return (
+            f'app;dur={total:.2f}, '
+            f'db;dur={self.query_time * 1000:.2f};desc="{self.query_count} queries", '
+            f'pool;dur={self.pool_wait * 1000:.2f}'
+        )
+
+
+request_stats: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar("request_stats", default=None)
+
+
+def record_query(duration: float, statement: str) -> None:
+    stats = request_stats.get()
+    route = stats.route if stats is not None else "background"
+    if stats is not None:
+        stats.query_count += 1
+        stats.query_time += duration
+    db_queries_total.inc(route)
+    db_query_duration_seconds.observe(duration, route)
+    if settings.SLOW_QUERY_THRESHOLD_MS is not None and duration * 1000 >= settings.SLOW_QUERY_THRESHOLD_MS:
+        slow_query_logger.warning("Slow query (%.1f ms) on %s: %s", duration * 1000, route, statement)
+
+
+def record_pool_wait(duration: float) -> None:
+    stats = request_stats.get()
+    if stats is not None:
+        stats.pool_wait += duration
+    db_pool_wait_seconds.observe(duration, stats.route if stats is not None else "background")
+
+
+class MetricsMiddleware:
+    """
+    Times every HTTP request, collects the DB statistics recorded while it runs
+    and exposes them in a `Server-Timing` response header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope=scope)
+        token = request_stats.set(stats)
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                MutableHeaders(scope=message).append("Server-Timing", stats.server_timing())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            request_stats.reset(token)
+            http_requests_total.inc(scope["method"], stats.route, str(status_code))
+            http_request_duration_seconds.observe(time.perf_counter() - stats.started, scope["method"], stats.route)
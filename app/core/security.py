@@ -5,7 +5,17 @@ from jose import jwt
 from passlib.context import CryptContext
 from app.core.config import settings
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=settings.BCRYPT_ROUNDS,
+    # Makes needs_update() flag hashes made with a lower cost, so login upgrades them.
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+)
+
+# Scope of the short-lived tokens that open one doctor's slot feed. A token with a
+# scope is only accepted where that scope is expected.
+SLOT_FEED_SCOPE = "slot-feed"
 
 
 def hash_password(password: str) -> str:
@@ -28,6 +38,17 @@ def create_access_token(data: dict, expires_delta: timedelta = None) -> str:
     return encoded_jwt
 
 
+def create_slot_feed_token(data: dict, doctor_id: int) -> str:
+    """
+    A token that only opens `doctor_id`'s slot feed, for clients that have to pass it in
+    the URL, where it ends up in access logs.
+    """
+    return create_access_token(
+        data={**data, "scope": SLOT_FEED_SCOPE, "doc": doctor_id},
+        expires_delta=timedelta(seconds=settings.SLOT_FEED_TOKEN_EXPIRE_SECONDS),
+    )
+
+
 def create_password_reset_token(email: str) -> str:
     expire = datetime.now(timezone.utc) + timedelta(
         minutes=settings.PASSWORD_RESET_TOKEN_EXPIRE_MINUTES
@@ -40,6 +61,9 @@ def create_password_reset_token(email: str) -> str:
 def verify_password_reset_token(token: str) -> Optional[str]:
     try:
         decoded_token = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        # Feed tokens travel in URLs and must not be usable to reset a password.
+        if decoded_token.get("scope") is not None:
+            return None
         return decoded_token.get("sub")
     except jwt.JWTError:
         return None
\ No newline at end of file
@@ -1,6 +1,7 @@
-
 from app.db.base_class import Base  # Import the Base class
 
 from app.schema.users import User
-from app.schema.availability import Availability
-from app.schema.appointment import Appointment
\ No newline at end of file
+from app.schema.availability import Availability, AvailabilityException
+from app.schema.appointment import Appointment, ArchivedAppointment
+from app.schema.job import Job
+from app.schema.schedule import ScheduleSlot
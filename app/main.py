@@ -1,24 +1,103 @@
+import asyncio
+import math
+import signal
+import threading
 from contextlib import asynccontextmanager
+from typing import Callable
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, status
+from fastapi.responses import JSONResponse
 
-from app.db.database import engine
-from app.db.base import Base
-from app.api.v1 import users_api, doctor_api, appointment_api
+from app.db.database import dispose_engines
+from app.api import ops_api
+from app.api.responses import FastJSONResponse
+from app.api.v1 import users_api, doctor_api, appointment_api, patient_api
+from app.core.config import settings
+from app.core.metrics import MetricsMiddleware
+from app.services.cache import cache
+from app.services.events import slot_events
+from app.services.jobs import job_worker
+from app.services.password_hasher import PasswordHasherBusy, password_hasher
+from app.services.rate_limit import RateLimited, rate_limit_backend
+
+
+def _on_exit_signal(callback: Callable[[], None]) -> Callable[[], None]:
+    """
+    Schedule `callback` in the event loop when SIGINT or SIGTERM arrives, then call the
+    handler the server installed, which stops accepting connections and waits for the
+    open ones to finish. Returns a function that puts the server's handlers back.
+    """
+    # Signal handlers can only be set from the main thread.
+    if threading.current_thread() is not threading.main_thread():
+        return lambda: None
+    loop = asyncio.get_running_loop()
+    previous = {}
+
+    def handle(sig, frame):
+        loop.call_soon_threadsafe(callback)
+        handler = previous[sig]
+        if callable(handler):
+            handler(sig, frame)
+        elif handler == signal.SIG_DFL:
+            signal.signal(sig, handler)
+            signal.raise_signal(sig)
+
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        previous[sig] = signal.signal(sig, handle)
+
+    def restore():
+        for sig, handler in previous.items():
+            signal.signal(sig, handler)
+
+    return restore
 
 
 @asynccontextmanager
 async def lifespan(app:FastAPI):
-    print("INFO:     Creating database tables...")
-    Base.metadata.create_all(bind=engine)
-    print("INFO:     Database tables created successfully.")
+    # The schema is owned by Alembic (`alembic upgrade head`, run once per deploy
+    # by the `migrate` service), so starting a worker issues no DDL.
+    password_hasher.start()
+    await slot_events.start()
+    if settings.JOB_WORKER_ENABLED:
+        job_worker.start()
+    # Open slot feeds would hold up the shutdown until GRACEFUL_TIMEOUT runs out and the
+    # worker is killed, skipping everything below, so they are ended right away.
+    restore_signal_handlers = _on_exit_signal(slot_events.close_subscriptions)
     yield
 
-    await engine.dispose()
+    restore_signal_handlers()
+    await job_worker.stop()
+    await slot_events.close()
+    password_hasher.shutdown()
+    await cache.close()
+    await rate_limit_backend.close()
+    await dispose_engines()
 
 
 app = FastAPI(title="Doctor Appointment API", lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
+
+
+@app.exception_handler(PasswordHasherBusy)
+async def password_hasher_busy_handler(request: Request, exc: PasswordHasherBusy):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "The server is busy, please retry shortly."},
+        headers={"Retry-After": "1"},
+    )
+
+
+@app.exception_handler(RateLimited)
+async def rate_limited_handler(request: Request, exc: RateLimited):
+    return JSONResponse(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        content={"detail": "Too many requests, please retry later."},
+        headers={"Retry-After": str(math.ceil(exc.retry_after))},
+    )
+
 
-app.include_router(users_api.router, prefix="/api/v1", tags=["Users"])
-app.include_router(doctor_api.router, prefix="/api/v1", tags=["Doctors"])
-app.include_router(appointment_api.router, prefix="/api/v1", tags=["Appointments"])
\ No newline at end of file
+app.include_router(ops_api.router, tags=["Operations"])
+app.include_router(users_api.router, prefix="/api/v1", tags=["Users"], default_response_class=FastJSONResponse)
+app.include_router(doctor_api.router, prefix="/api/v1", tags=["Doctors"], default_response_class=FastJSONResponse)
+app.include_router(patient_api.router, prefix="/api/v1", tags=["Doctors"], default_response_class=FastJSONResponse)
+app.include_router(appointment_api.router, prefix="/api/v1", tags=["Appointments"], default_response_class=FastJSONResponse)
\ No newline at end of file
@@ -1,8 +1,10 @@
 from enum import Enum
-from pydantic import BaseModel, ConfigDict, field_validator
+from typing import Dict, List, Optional
+from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
 import datetime
 
 from app.models.users import UserDto
+from app.util.datetimes import to_local_naive
 
 
 class AppointmentStatus(str, Enum):
@@ -11,6 +13,11 @@ class AppointmentStatus(str, Enum):
     COMPLETED = "completed"
 
 
+class ExportFormat(str, Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+
 class AppointmentCreate(BaseModel):
     doctor_id: int
     appointment_time: datetime.datetime
@@ -31,6 +38,11 @@ class AppointmentCreate(BaseModel):
                 pass
         return value
 
+    @field_validator("appointment_time")
+    @classmethod
+    def to_storage_time(cls, value: datetime.datetime) -> datetime.datetime:
+        return to_local_naive(value)
+
 
 class AppointmentOut(BaseModel):
     id: int
@@ -39,4 +51,67 @@ class AppointmentOut(BaseModel):
     doctor: UserDto
     patient: UserDto
 
-    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+
+
+class BulkBookingResult(BaseModel):
+    index: int
+    status_code: int
+    appointment: Optional[AppointmentOut] = None
+    detail: Optional[str] = None
+
+
+class BulkCancelRequest(BaseModel):
+    """
+    Select appointments to cancel either by id or by a time range.
+    The time range only matches scheduled appointments of the current user.
+    """
+    appointment_ids: Optional[List[int]] = None
+    from_: Optional[datetime.datetime] = Field(None, alias="from")
+    to: Optional[datetime.datetime] = None
+
+    @field_validator("from_", "to")
+    @classmethod
+    def to_storage_time(cls, value: Optional[datetime.datetime]) -> Optional[datetime.datetime]:
+        return to_local_naive(value)
+
+    @model_validator(mode="after")
+    def check_selection(self) -> "BulkCancelRequest":
+        if self.appointment_ids is None and (self.from_ is None or self.to is None):
+            raise ValueError("Provide either appointment_ids or both 'from' and 'to'.")
+        return self
+
+
+class BulkCancelResult(BaseModel):
+    appointment_id: int
+    status_code: int
+    appointment: Optional[AppointmentOut] = None
+    detail: Optional[str] = None
+
+
+class LeadTimeDistribution(BaseModel):
+    p50_hours: Optional[float] = None
+    p90_hours: Optional[float] = None
+    # Lower edges of the histogram buckets in hours; the last bucket is open-ended.
+    bucket_edges_hours: List[float]
+    counts: List[int]
+
+
+class AppointmentReport(BaseModel):
+    """
+    Aggregates over the appointments of one doctor between `from` and `to`.
+    Rates are fractions of `total`, and hourly arrays are indexed by hour of day.
+    """
+    from_: datetime.date = Field(alias="from")
+    to: datetime.date
+    total: int
+    status_counts: Dict[AppointmentStatus, int]
+    cancellation_rate: Optional[float] = None
+    # Cancelled less than LATE_CANCELLATION_HOURS before the appointment.
+    late_cancellation_rate: Optional[float] = None
+    # Booked minutes over available minutes, against the current weekly availability.
+    utilization: Optional[float] = None
+    # Booked share of the available slots, by weekday (Monday first) and hour; null without slots.
+    occupancy: List[List[Optional[float]]]
+    status_by_hour: Dict[AppointmentStatus, List[int]]
+    lead_time: LeadTimeDistribution
@@ -1,5 +1,6 @@
 from enum import Enum
-from pydantic import BaseModel, ConfigDict, field_validator
+from typing import List
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 import datetime
 
 
@@ -13,12 +14,8 @@ class DayOfWeek(str, Enum):
     SUNDAY = "sunday"
 
 
-class AvailabilityBase(BaseModel):
-    day_of_week: DayOfWeek
-    start_time: datetime.time
-    end_time: datetime.time
-
-    @field_validator("start_time", "end_time", mode="before")
+class TimeWindowParsing(BaseModel):
+    @field_validator("start_time", "end_time", mode="before", check_fields=False)
     @classmethod
     def parse_time(cls, value: str) -> datetime.time:
         """
@@ -33,7 +30,32 @@ class AvailabilityBase(BaseModel):
         return value
 
 
+class AvailabilityBase(TimeWindowParsing):
+    day_of_week: DayOfWeek
+    start_time: datetime.time
+    end_time: datetime.time
+    slot_minutes: int = Field(30, ge=5, le=480, description="Length of the bookable slots cut from this window")
+
+
+class AvailabilityWindow(TimeWindowParsing):
+    start_time: datetime.time
+    end_time: datetime.time
+    slot_minutes: int = Field(30, ge=5, le=480, description="Length of the bookable slots cut from this window")
+
+
 class AvailabilityOut(AvailabilityBase):
     id: int
     doctor_id: int
-    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+
+class SlotOut(BaseModel):
+    start: datetime.datetime
+    end: datetime.datetime
+
+
+class AvailabilityExceptionOut(BaseModel):
+    """
+    The hours of one date that replace the weekly availability; no windows means a day off.
+    """
+    date: datetime.date
+    windows: List[AvailabilityWindow]
@@ -1,12 +1,28 @@
 from typing import Optional
 from pydantic import BaseModel
 
+from app.models.users import UserDto
+
 
 class Token(BaseModel):
     access_token: str
     token_type: str
 
 
+class FeedToken(BaseModel):
+    feed_token: str
+    # Seconds left to open the feed with it.
+    expires_in: int
+
+
 class TokenData(BaseModel):
     email: Optional[str] = None
-    role: Optional[str] = None
\ No newline at end of file
+    role: Optional[str] = None
+
+
+class Principal(UserDto):
+    """
+    The authenticated user as seen by the API layer.
+    Built from the token claims and a cached user lookup instead of a full ORM User.
+    """
+    token_version: int = 0
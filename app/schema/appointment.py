@@ -1,4 +1,6 @@
-from sqlalchemy import Column, Integer, ForeignKey, DateTime, Enum
+import datetime
+
+from sqlalchemy import Column, Integer, ForeignKey, DateTime, Enum, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 
 from app.db.base_class import Base
@@ -7,13 +9,48 @@ from app.models.appointment import AppointmentStatus
 
 class Appointment(Base):
     __tablename__ = "appointments"
+    __table_args__ = (
+        # Only one live appointment per doctor and time. Cancelled rows have a NULL
+        # active_slot, and NULLs never collide, so a freed slot can be booked again.
+        UniqueConstraint("doctor_id", "active_slot", name="uq_appointments_doctor_active_slot"),
+        # Serves the doctor listings and conflict lookups by time and status.
+        Index("ix_appointments_doctor_time_status", "doctor_id", "appointment_time", "status"),
+        # Lets the analytics report fetch only the rows changed since its last refresh.
+        Index("ix_appointments_doctor_updated_at", "doctor_id", "updated_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     appointment_time = Column(DateTime, nullable=False, index=True)
     status = Column(Enum(AppointmentStatus), nullable=False, default=AppointmentStatus.SCHEDULED)
+    # Mirrors appointment_time while the appointment holds its slot, NULL once cancelled.
+    active_slot = Column(DateTime, nullable=True)
+    # NULL for rows that predate these columns.
+    created_at = Column(DateTime, nullable=True, default=datetime.datetime.now)
+    updated_at = Column(DateTime, nullable=True, default=datetime.datetime.now, onupdate=datetime.datetime.now)
 
     doctor_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    patient_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    patient_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
 
     doctor = relationship("User", foreign_keys=[doctor_id], back_populates="appointments_as_doctor")
-    patient = relationship("User", foreign_keys=[patient_id], back_populates="appointments_as_patient")
\ No newline at end of file
+    patient = relationship("User", foreign_keys=[patient_id], back_populates="appointments_as_patient")
+
+class ArchivedAppointment(Base):
+    """
+    Appointments older than APPOINTMENT_ARCHIVE_AFTER_DAYS, moved here by the appointment
+    sweeper so the live table and its indexes only hold recent and upcoming appointments.
+    Rows keep their id and are never changed once archived.
+    """
+    __tablename__ = "appointments_archive"
+    __table_args__ = (
+        Index("ix_appointments_archive_doctor_time_status", "doctor_id", "appointment_time", "status"),
+        Index("ix_appointments_archive_doctor_updated_at", "doctor_id", "updated_at"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    appointment_time = Column(DateTime, nullable=False)
+    status = Column(Enum(AppointmentStatus), nullable=False)
+    created_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, nullable=True)
+
+    doctor_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    patient_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
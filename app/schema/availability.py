@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, ForeignKey, Enum, Time
+from sqlalchemy import Column, Date, Integer, ForeignKey, Enum, Index, Time
 from sqlalchemy.orm import relationship
 
 from app.db.base_class import Base
@@ -12,6 +12,25 @@ class Availability(Base):
     day_of_week = Column(Enum(DayOfWeek), nullable=False)
     start_time = Column(Time, nullable=False)
     end_time = Column(Time, nullable=False)
-    doctor_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    slot_minutes = Column(Integer, nullable=False, default=30, server_default="30")
+    doctor_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+
+    doctor = relationship("User", back_populates="availabilities")
+
 
-    doctor = relationship("User", back_populates="availabilities")
\ No newline at end of file
+class AvailabilityException(Base):
+    """
+    Replaces a doctor's weekly availability on one date. The rows of a date are its
+    windows; a single row without times marks the whole day off.
+    """
+    __tablename__ = "availability_exceptions"
+    __table_args__ = (
+        Index("ix_availability_exceptions_doctor_date", "doctor_id", "date"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    date = Column(Date, nullable=False)
+    start_time = Column(Time, nullable=True)
+    end_time = Column(Time, nullable=True)
+    slot_minutes = Column(Integer, nullable=True)
+    doctor_id = Column(Integer, ForeignKey("users.id"), nullable=False)
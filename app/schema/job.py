@@ -0,0 +1,30 @@
+from sqlalchemy import JSON, Column, DateTime, Enum, Index, Integer, String, Text
+
+from app.db.base_class import Base
+from app.models.job import JobStatus
+
+
+class Job(Base):
+    """
+    A unit of background work, written in the same transaction as the change
+    that caused it and picked up by app.services.jobs.JobWorker.
+    """
+    __tablename__ = "jobs"
+    __table_args__ = (
+        # The worker polls for due jobs by status and time.
+        Index("ix_jobs_status_run_at", "status", "run_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(100), nullable=False)
+    payload = Column(JSON, nullable=False)
+    # Enqueueing twice with the same key creates a single job.
+    idempotency_key = Column(String(255), nullable=True, unique=True)
+    status = Column(Enum(JobStatus), nullable=False, default=JobStatus.PENDING)
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    run_at = Column(DateTime, nullable=False)
+    # Set when a worker claims the job; a running job whose lease ran out is retried.
+    claimed_by = Column(String(36), nullable=True)
+    locked_until = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, nullable=False)
@@ -0,0 +1,21 @@
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, UniqueConstraint
+
+from app.db.base_class import Base
+
+
+class ScheduleSlot(Base):
+    """
+    One bookable slot of a doctor's calendar, materialized from the weekly availability
+    and its exceptions for the next SCHEDULE_HORIZON_WEEKS. A slot is free while no
+    appointment holds its start time (see Appointment.active_slot).
+    """
+    __tablename__ = "schedule_slots"
+    __table_args__ = (
+        # Serves both the booking check (one key lookup) and slot search (one range scan).
+        UniqueConstraint("doctor_id", "start_time", name="uq_schedule_slots_doctor_start"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    doctor_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    start_time = Column(DateTime, nullable=False)
+    end_time = Column(DateTime, nullable=False)
@@ -12,6 +12,8 @@ class User(Base):
     email = Column(String(100), unique=True, index=True, nullable=False)
     password = Column(String(255), nullable=False)
     role = Column(Enum(Role), nullable=False)
+    # Bumped on password reset to revoke previously issued access tokens.
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
 
     availabilities = relationship("Availability", back_populates="doctor", cascade="all, delete-orphan")
     appointments_as_doctor = relationship("Appointment", foreign_keys="[Appointment.doctor_id]", back_populates="doctor", cascade="all, delete-orphan")
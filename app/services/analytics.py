@@ -0,0 +1,267 @@
+import datetime
+from typing import Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.appointment import AppointmentStatus
+from app.schema.appointment import Appointment as AppointmentModel, ArchivedAppointment
+from app.schema.availability import Availability as AvailabilityModel
+from app.services.doctor_search import MINUTES_PER_DAY, WEEK_MINUTES, week_minute
+from app.util.ttl_cache import TTLCache
+
+STATUSES = list(AppointmentStatus)
+STATUS_CODES = {status: code for code, status in enumerate(STATUSES)}
+CANCELLED = STATUS_CODES[AppointmentStatus.CANCELLED]
+
+# Lower edges of the lead-time histogram buckets, in hours.
+LEAD_TIME_EDGES_HOURS = [0, 1, 6, 24, 72, 168, 336, 720]
+
+# (day of week, start, end, slot minutes) of every weekly availability window, in a stable order.
+Template = Tuple[tuple, ...]
+
+
+def _numpy():
+    # Imported on first use, so workers that never build a report do not load it at startup.
+    import numpy
+    return numpy
+
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+_UNITS = {"m": datetime.timedelta(minutes=1), "us": datetime.timedelta(microseconds=1)}
+
+
+def _datetimes(values, unit: str):
+    """
+    Naive datetimes as a datetime64 array in `unit`, with NaT for None. Counting units
+    from the epoch in Python is several times faster than numpy converting datetime objects.
+    """
+    np = _numpy()
+    step = _UNITS[unit]
+    # The smallest int64 is NaT's bit pattern; NaT compares false with everything.
+    nat = np.iinfo(np.int64).min
+    counts = [(value - _EPOCH) // step if value is not None else nat for value in values]
+    return np.array(counts, dtype=np.int64).view(f"datetime64[{unit}]")
+
+
+def _to_arrays(rows) -> tuple:
+    np = _numpy()
+    ids, times, created, updated, statuses = zip(*rows)
+    return (
+        np.array(ids, dtype=np.int64),
+        _datetimes(times, "m"),
+        # created_at and updated_at are NULL on rows older than the columns.
+        _datetimes(created, "m"),
+        # Full precision: the latest update time is part of the report's cache key.
+        _datetimes(updated, "us"),
+        np.fromiter((STATUS_CODES[status] for status in statuses), dtype=np.int8, count=len(statuses)),
+    )
+
+
+async def fetch_columns(
+    db: AsyncSession,
+    doctor_id: int,
+    updated_since: Optional[datetime.datetime] = None,
+    model: type = AppointmentModel,
+) -> Optional[tuple]:
+    """
+    Read a doctor's appointments (optionally only those updated since `updated_since`) into
+    (ids, times, created, updated, statuses) arrays ordered by id, a server-side batch at a time.
+    `model` selects the live table or the archive.
+    """
+    np = _numpy()
+    query = select(
+        model.id,
+        model.appointment_time,
+        model.created_at,
+        model.updated_at,
+        model.status,
+    ).where(model.doctor_id == doctor_id)
+    if updated_since is not None:
+        query = query.where(model.updated_at >= updated_since)
+    result = await db.stream(
+        query.order_by(model.id).execution_options(yield_per=settings.EXPORT_BATCH_SIZE)
+    )
+    chunks = [_to_arrays(rows) async for rows in result.partitions()]
+    if not chunks:
+        return None
+    return tuple(np.concatenate(column) for column in zip(*chunks))
+
+
+class AppointmentColumns:
+    """
+    One doctor's appointments as NumPy arrays ordered by id, kept current by merging in
+    the rows updated since the last refresh. The last report is kept along with the
+    state it was computed from: the last appointment id and the latest update time.
+    """
+
+    def __init__(self):
+        np = _numpy()
+        self.ids = np.empty(0, dtype=np.int64)
+        self.times = np.empty(0, dtype="datetime64[m]")
+        self.created = np.empty(0, dtype="datetime64[m]")
+        self.updated = np.empty(0, dtype="datetime64[us]")
+        self.statuses = np.empty(0, dtype=np.int8)
+        self.last_updated = None
+        self.refreshed_at: Optional[datetime.datetime] = None
+        self._report_key = None
+        self._report: Optional[dict] = None
+
+    @property
+    def state(self) -> tuple:
+        return (int(self.ids[-1]) if len(self.ids) else None, self.last_updated)
+
+    def merge(self, columns: Optional[tuple]) -> None:
+        """
+        Upsert rows by id: known ids are overwritten in place, new ones are inserted in order.
+        """
+        if columns is None:
+            return
+        np = _numpy()
+        ids, times, created, updated, statuses = columns
+        positions = np.searchsorted(self.ids, ids)
+        known = positions < len(self.ids)
+        known[known] = self.ids[positions[known]] == ids[known]
+        at = positions[known]
+        self.times[at] = times[known]
+        self.created[at] = created[known]
+        self.updated[at] = updated[known]
+        self.statuses[at] = statuses[known]
+
+        new = ~known
+        if new.any():
+            order = np.argsort(np.concatenate([self.ids, ids[new]]), kind="stable")
+            self.ids = np.concatenate([self.ids, ids[new]])[order]
+            self.times = np.concatenate([self.times, times[new]])[order]
+            self.created = np.concatenate([self.created, created[new]])[order]
+            self.updated = np.concatenate([self.updated, updated[new]])[order]
+            self.statuses = np.concatenate([self.statuses, statuses[new]])[order]
+
+        latest = updated.max()
+        if not np.isnat(latest) and (self.last_updated is None or latest > self.last_updated):
+            self.last_updated = latest
+
+    def report(self, start: datetime.date, end: datetime.date, template: Template) -> dict:
+        key = (start, end, self.state, template)
+        if self._report_key != key:
+            self._report = compute_report(self, start, end, template)
+            self._report_key = key
+        return self._report
+
+
+def _template_arrays(template: Template) -> tuple:
+    """
+    Per minute of the week, the length of the slot starting there (0 if none), and per
+    weekday and hour, the number of slots starting in it.
+    """
+    np = _numpy()
+    slot_minutes = np.zeros(WEEK_MINUTES, dtype=np.int64)
+    for day, start, end, minutes in template:
+        first, last = week_minute(day, start), week_minute(day, end)
+        # Same cut as the materialized schedule: a remainder too short for a slot is dropped.
+        slot_minutes[first:last - minutes + 1:minutes] = minutes
+    slots_per_hour = (slot_minutes > 0).reshape(7, 24, 60).sum(axis=2)
+    return slot_minutes, slots_per_hour
+
+
+def compute_report(columns: AppointmentColumns, start: datetime.date, end: datetime.date, template: Template) -> dict:
+    """
+    Aggregate the appointments in [start, end) with array operations only; the cost is a
+    few passes over the arrays regardless of how the statuses and hours are spread.
+    """
+    np = _numpy()
+    in_range = (columns.times >= np.datetime64(start, "m")) & (columns.times < np.datetime64(end, "m"))
+    times = columns.times[in_range]
+    statuses = columns.statuses[in_range].astype(np.int64)
+    total = int(in_range.sum())
+
+    minutes = times.astype(np.int64)
+    # 1970-01-01 was a Thursday, weekday 3 counting from Monday.
+    weekdays = (minutes // MINUTES_PER_DAY + 3) % 7
+    hours = (minutes % MINUTES_PER_DAY) // 60
+
+    status_counts = np.bincount(statuses, minlength=len(STATUSES))
+    status_by_hour = np.bincount(statuses * 24 + hours, minlength=len(STATUSES) * 24).reshape(len(STATUSES), 24)
+
+    cancelled = statuses == CANCELLED
+    notice = times[cancelled] - columns.updated[in_range][cancelled]
+    late_cancellations = int((notice < np.timedelta64(settings.LATE_CANCELLATION_HOURS * 60, "m")).sum())
+
+    # Occupancy and utilization are measured against the doctor's current weekly availability,
+    # repeated over every day of the range.
+    slot_minutes, slots_per_hour = _template_arrays(template)
+    days = np.arange(np.datetime64(start, "D"), np.datetime64(end, "D"))
+    occurrences = np.bincount((days.astype(np.int64) + 3) % 7, minlength=7)
+    booked = ~cancelled
+    booked_per_hour = np.bincount(weekdays[booked] * 24 + hours[booked], minlength=7 * 24).reshape(7, 24)
+    available_per_hour = slots_per_hour * occurrences[:, None]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        occupancy = np.where(available_per_hour > 0, booked_per_hour / available_per_hour, np.nan)
+    available_minutes = int((slot_minutes.reshape(7, MINUTES_PER_DAY).sum(axis=1) * occurrences).sum())
+    booked_minutes = int(slot_minutes[weekdays[booked] * MINUTES_PER_DAY + minutes[booked] % MINUTES_PER_DAY].sum())
+
+    lead = (times - columns.created[in_range]) / np.timedelta64(1, "h")
+    lead = lead[~np.isnan(lead)]
+    lead_buckets = np.searchsorted(LEAD_TIME_EDGES_HOURS[1:], lead, side="right")
+    p50, p90 = np.percentile(lead, [50, 90]).tolist() if len(lead) else (None, None)
+
+    return {
+        "from": start,
+        "to": end,
+        "total": total,
+        "status_counts": {status.value: int(count) for status, count in zip(STATUSES, status_counts)},
+        "cancellation_rate": float(cancelled.sum()) / total if total else None,
+        "late_cancellation_rate": late_cancellations / total if total else None,
+        "utilization": booked_minutes / available_minutes if available_minutes else None,
+        # NaN (no slots in that hour) is rendered as null.
+        "occupancy": occupancy.tolist(),
+        "status_by_hour": {status.value: row.tolist() for status, row in zip(STATUSES, status_by_hour)},
+        "lead_time": {
+            "p50_hours": p50,
+            "p90_hours": p90,
+            "bucket_edges_hours": LEAD_TIME_EDGES_HOURS,
+            "counts": np.bincount(lead_buckets, minlength=len(LEAD_TIME_EDGES_HOURS)).tolist(),
+        },
+    }
+
+
+# doctor id -> AppointmentColumns; a full reload after the TTL also picks up anything a refresh missed.
+_columns = TTLCache(maxsize=settings.ANALYTICS_CACHE_MAX_DOCTORS, ttl=settings.ANALYTICS_CACHE_TTL_SECONDS)
+
+
+async def appointment_report(db: AsyncSession, doctor_id: int, start: datetime.date, end: datetime.date) -> dict:
+    """
+    The appointment report of a doctor over [start, end), served from this worker's cached
+    columns after merging in the appointments updated since they were last refreshed.
+    """
+    columns: Optional[AppointmentColumns] = _columns.get(doctor_id)
+    refreshed_at = datetime.datetime.now()
+    since = None
+    if columns is None:
+        columns = AppointmentColumns()
+    else:
+        # updated_at is set when a row is written but only visible once committed, so the
+        # window reaches back far enough to catch transactions still open at the last refresh.
+        since = columns.refreshed_at - datetime.timedelta(seconds=settings.ANALYTICS_REFRESH_OVERLAP_SECONDS)
+    # Live table first: a row the sweeper archives in between is then read from the
+    # archive, at worst twice, which the merge by id absorbs. Rows keep their updated_at
+    # when archived, so one completed and archived since the last refresh is still read.
+    columns.merge(await fetch_columns(db, doctor_id, updated_since=since))
+    columns.merge(await fetch_columns(db, doctor_id, updated_since=since, model=ArchivedAppointment))
+    columns.refreshed_at = refreshed_at
+    if since is None:
+        _columns.set(doctor_id, columns)
+
+    template: Template = tuple(sorted(
+        (await db.execute(
+            select(
+                AvailabilityModel.day_of_week,
+                AvailabilityModel.start_time,
+                AvailabilityModel.end_time,
+                AvailabilityModel.slot_minutes,
+            ).where(AvailabilityModel.doctor_id == doctor_id)
+        )).tuples(),
+        key=lambda window: (week_minute(window[0], window[1]), window[2], window[3]),
+    ))
+    return columns.report(start, end, template)
@@ -0,0 +1,163 @@
+import csv
+import datetime
+import io
+from enum import Enum
+from typing import AsyncIterator, List, Optional, Tuple
+
+import orjson
+from sqlalchemy import Select, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from app.core.config import settings
+from app.models.appointment import AppointmentOut, AppointmentStatus
+from app.models.users import UserDto
+from app.schema.appointment import Appointment as AppointmentModel, ArchivedAppointment
+from app.schema.users import User as UserModel
+from app.services.lifecycle import archive_cutoff
+from app.util.datetimes import to_local_naive
+from app.util.pagination import keyset_after
+
+Doctor = aliased(UserModel, name="doctor")
+Patient = aliased(UserModel, name="patient")
+
+# Flat column names for CSV, derived from AppointmentOut so the two never drift apart:
+# nested UserDto fields become "<field>_<subfield>", e.g. "doctor_email".
+CSV_FIELDS: List[str] = [
+    f"{name}_{sub}" if field.annotation is UserDto else name
+    for name, field in AppointmentOut.model_fields.items()
+    for sub in (UserDto.model_fields if field.annotation is UserDto else [None])
+]
+
+
+def filter_appointments(
+    query: Select,
+    from_: Optional[datetime.datetime] = None,
+    to: Optional[datetime.datetime] = None,
+    status_: Optional[AppointmentStatus] = None,
+    model: type = AppointmentModel,
+) -> Select:
+    """
+    Apply the time-window and status filters shared by the listing and export endpoints.
+    """
+    if from_:
+        query = query.where(model.appointment_time >= from_)
+    if to:
+        query = query.where(model.appointment_time < to)
+    if status_:
+        query = query.where(model.status == status_)
+    return query
+
+
+def appointment_rows_query(doctor_id: int, model: type = AppointmentModel) -> Select:
+    """
+    Select the AppointmentOut fields as plain columns instead of ORM entities,
+    from the live appointments or, with `model=ArchivedAppointment`, the archive.
+    """
+    return (
+        select(
+            model.id,
+            model.appointment_time,
+            model.status,
+            Doctor.id.label("doctor_id"),
+            Doctor.email.label("doctor_email"),
+            Doctor.role.label("doctor_role"),
+            Patient.id.label("patient_id"),
+            Patient.email.label("patient_email"),
+            Patient.role.label("patient_role"),
+        )
+        .join(Doctor, model.doctor_id == Doctor.id)
+        .join(Patient, model.patient_id == Patient.id)
+        .where(model.doctor_id == doctor_id)
+    )
+
+
+def appointment_history_queries(
+    doctor_id: int,
+    from_: Optional[datetime.datetime] = None,
+    to: Optional[datetime.datetime] = None,
+    status_: Optional[AppointmentStatus] = None,
+    after: Optional[Tuple[datetime.datetime, int]] = None,
+) -> List[Select]:
+    """
+    The filtered appointment_rows_query of the archive and of the live table, in that
+    order, optionally only past the keyset `after` (appointment_time, id). The archive
+    holds the oldest appointments, so reading the queries one after the other, each
+    ordered by (appointment_time, id), reads the history in that order. The archive is
+    left out when the window starts after anything it can hold.
+    """
+    from_ = to_local_naive(from_)
+    to = to_local_naive(to)
+    start = max(filter(None, [from_, after[0] if after else None]), default=None)
+    models = [AppointmentModel]
+    if start is None or start < archive_cutoff():
+        models.insert(0, ArchivedAppointment)
+    queries = []
+    for model in models:
+        query = filter_appointments(appointment_rows_query(doctor_id, model), from_, to, status_, model)
+        if after is not None:
+            query = query.where(keyset_after((model.appointment_time, model.id), after))
+        queries.append(query)
+    return queries
+
+
+def row_to_appointment(row) -> dict:
+    """
+    Nest a row of appointment_rows_query into AppointmentOut's shape.
+    """
+    return {
+        "id": row.id,
+        "appointment_time": row.appointment_time,
+        "status": row.status,
+        "doctor": {"id": row.doctor_id, "email": row.doctor_email, "role": row.doctor_role},
+        "patient": {"id": row.patient_id, "email": row.patient_email, "role": row.patient_role},
+    }
+
+
+async def stream_rows(db: AsyncSession, queries: List[Select]) -> AsyncIterator[list]:
+    """
+    Yield batches of rows from a server-side cursor so memory stays flat, one query after the other.
+    """
+    for query in queries:
+        columns = query.selected_columns
+        result = await db.stream(
+            query.order_by(columns.appointment_time, columns.id)
+            .execution_options(yield_per=settings.EXPORT_BATCH_SIZE)
+        )
+        async for partition in result.partitions():
+            yield partition
+
+
+async def export_ndjson(db: AsyncSession, queries: List[Select]) -> AsyncIterator[bytes]:
+    async for rows in stream_rows(db, queries):
+        yield b"".join(orjson.dumps(row_to_appointment(row)) + b"\n" for row in rows)
+
+
+def _csv_value(value):
+    # Same representation as in the JSON output.
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return value
+
+
+def flatten_row(row) -> list:
+    """
+    Turn a row of appointment_rows_query into a CSV row. Its columns are
+    selected in AppointmentOut's field order, which is CSV_FIELDS order.
+    """
+    return [_csv_value(value) for value in row]
+
+
+async def export_csv(db: AsyncSession, queries: List[Select]) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_FIELDS)
+    async for rows in stream_rows(db, queries):
+        writer.writerows(flatten_row(row) for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
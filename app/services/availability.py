@@ -0,0 +1,86 @@
+import datetime
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+
+from app.models.availability import AvailabilityBase, DayOfWeek
+from app.schema.availability import Availability as AvailabilityModel
+
+DAY_ORDER: Dict[DayOfWeek, int] = {day: i for i, day in enumerate(DayOfWeek)}
+
+
+class Interval(NamedTuple):
+    day_of_week: DayOfWeek
+    start_time: datetime.time
+    end_time: datetime.time
+    slot_minutes: int
+
+
+class AvailabilityDiff(NamedTuple):
+    unchanged: List[AvailabilityModel]
+    updates: List[Tuple[AvailabilityModel, Interval]]
+    inserts: List[Interval]
+    deletes: List[AvailabilityModel]
+
+
+def normalize_intervals(items: Iterable[AvailabilityBase]) -> List[Interval]:
+    """
+    Validate submitted intervals and merge the ones that overlap or touch on the same day.
+    Raises ValueError for an interval that does not end after it starts, or that
+    overlaps another one with a different slot length.
+    """
+    intervals = []
+    for item in items:
+        if item.start_time >= item.end_time:
+            raise ValueError(
+                f"Availability on {item.day_of_week.value} must end after it starts "
+                f"({item.start_time} - {item.end_time})."
+            )
+        intervals.append(Interval(item.day_of_week, item.start_time, item.end_time, item.slot_minutes))
+    intervals.sort(key=lambda interval: (DAY_ORDER[interval.day_of_week], interval.start_time))
+
+    merged: List[Interval] = []
+    for interval in intervals:
+        last = merged[-1] if merged else None
+        same_day = last is not None and last.day_of_week == interval.day_of_week
+        if same_day and last.slot_minutes != interval.slot_minutes:
+            if interval.start_time < last.end_time:
+                raise ValueError(
+                    f"Availability on {interval.day_of_week.value} overlaps another interval "
+                    f"with a different slot length ({interval.start_time} - {interval.end_time})."
+                )
+            merged.append(interval)
+        elif same_day and interval.start_time <= last.end_time:
+            merged[-1] = last._replace(end_time=max(last.end_time, interval.end_time))
+        else:
+            merged.append(interval)
+    return merged
+
+
+def diff_intervals(existing: Iterable[AvailabilityModel], desired: List[Interval]) -> AvailabilityDiff:
+    """
+    Work out the smallest set of writes that turns the stored rows into `desired`.
+    Rows that already match are kept; leftover rows are reused for leftover intervals
+    (same day first) so ids stay stable, and only the remainder is inserted or deleted.
+    """
+    remaining = set(desired)
+    unchanged, stale = [], []
+    for row in existing:
+        key = Interval(row.day_of_week, row.start_time, row.end_time, row.slot_minutes)
+        if key in remaining:
+            remaining.remove(key)
+            unchanged.append(row)
+        else:
+            stale.append(row)
+
+    leftover = sorted(remaining, key=lambda interval: (DAY_ORDER[interval.day_of_week], interval.start_time))
+    updates = []
+    for same_day_only in (True, False):
+        for row in list(stale):
+            match = next(
+                (i for i in leftover if not same_day_only or i.day_of_week == row.day_of_week),
+                None,
+            )
+            if match is not None:
+                leftover.remove(match)
+                stale.remove(row)
+                updates.append((row, match))
+    return AvailabilityDiff(unchanged=unchanged, updates=updates, inserts=leftover, deletes=stale)
@@ -0,0 +1,153 @@
+from typing import Optional, Protocol, Tuple
+
+from app.core.config import settings
+from app.util.ttl_cache import TTLCache
+
+
+class CacheBackend(Protocol):
+    async def get(self, key: str) -> Optional[bytes]: ...
+
+    async def set(self, key: str, value: bytes, ttl: int) -> None: ...
+
+    async def delete(self, key: str) -> None: ...
+
+    async def incr(self, key: str) -> int: ...
+
+    async def close(self) -> None: ...
+
+
+class MemoryCache:
+    """
+    In-process LRU backend. Entries are private to the worker process.
+    """
+
+    def __init__(self, maxsize: int):
+        self._cache = TTLCache(maxsize=maxsize, ttl=float("inf"))
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return self._cache.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: int) -> None:
+        self._cache.set(key, value, ttl=ttl)
+
+    async def delete(self, key: str) -> None:
+        self._cache.pop(key)
+
+    async def incr(self, key: str) -> int:
+        value = int(self._cache.get(key) or b"0") + 1
+        self._cache.set(key, str(value).encode())
+        return value
+
+    async def close(self) -> None:
+        self._cache.clear()
+
+
+class RedisCache:
+    """
+    Shared backend for anything that speaks the redis.asyncio client API
+    (get, set with ex=, delete, incr), including an in-memory fake.
+    """
+
+    def __init__(self, client, prefix: str = "cache:"):
+        self.client = client
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.client.get(self.prefix + key)
+
+    async def set(self, key: str, value: bytes, ttl: int) -> None:
+        await self.client.set(self.prefix + key, value, ex=ttl)
+
+    async def delete(self, key: str) -> None:
+        await self.client.delete(self.prefix + key)
+
+    async def incr(self, key: str) -> int:
+        return await self.client.incr(self.prefix + key)
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+def create_cache() -> CacheBackend:
+    if settings.CACHE_BACKEND == "redis":
+        # Optional dependency, only needed when the shared backend is configured.
+        import redis.asyncio as redis
+
+        return RedisCache(redis.from_url(settings.CACHE_URL))
+    return MemoryCache(maxsize=settings.CACHE_MAX_ENTRIES)
+
+
+cache = create_cache()
+
+
+# --- Doctor profiles ---
+# Payloads are stored under a per-doctor version that writers bump after committing.
+# A reader that loaded stale rows before the bump can only write to the old version's
+# key, so nobody reads a stale schedule after the change is committed.
+
+def _doctor_version_key(doctor_id: int) -> str:
+    return f"doctor-version:{doctor_id}"
+
+
+async def get_doctor_payload(doctor_id: int) -> Tuple[Optional[bytes], str]:
+    """
+    Return the cached serialized DoctorOut (or None) and the key to store a fresh one under.
+    """
+    version = (await cache.get(_doctor_version_key(doctor_id)) or b"0").decode()
+    key = f"doctor:{doctor_id}:{version}"
+    return await cache.get(key), key
+
+
+async def set_doctor_payload(key: str, payload: bytes) -> None:
+    await cache.set(key, payload, settings.DOCTOR_CACHE_TTL_SECONDS)
+
+
+async def invalidate_doctor(doctor_id: int) -> None:
+    await cache.incr(_doctor_version_key(doctor_id))
+
+
+# --- Users ---
+# Each worker keeps resolved principals in its own memory. This shared counter is
+# bumped when a user's credentials change, so every worker drops its copy.
+
+def _user_version_key(email: str) -> str:
+    return f"user-version:{email}"
+
+
+async def get_user_version(email: str) -> Optional[bytes]:
+    return await cache.get(_user_version_key(email))
+
+
+async def invalidate_user_version(email: str) -> None:
+    await cache.incr(_user_version_key(email))
+
+
+# --- Read-your-writes ---
+# A client that just wrote is pinned to the primary database for a short while,
+# so its next reads do not hit a replica that has not caught up yet.
+
+def _primary_pin_key(client_key: str) -> str:
+    return f"primary-pin:{client_key}"
+
+
+async def pin_to_primary(client_key: str) -> None:
+    await cache.set(_primary_pin_key(client_key), b"1", settings.PRIMARY_STICKY_SECONDS)
+
+
+async def is_pinned_to_primary(client_key: str) -> bool:
+    return await cache.get(_primary_pin_key(client_key)) is not None
+
+
+# --- Doctor search ---
+# Each worker keeps its own bitmap of the doctors' weekly availability. This counter
+# is bumped whenever any doctor's availability changes, so every worker rebuilds it.
+
+AVAILABILITY_VERSION_KEY = "availability-version"
+
+
+async def get_availability_version() -> Optional[bytes]:
+    return await cache.get(AVAILABILITY_VERSION_KEY)
+
+
+async def bump_availability_version() -> int:
+    return await cache.incr(AVAILABILITY_VERSION_KEY)
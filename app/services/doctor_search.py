@@ -0,0 +1,192 @@
+import asyncio
+import bisect
+import datetime
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.db.database import session
+from app.models.availability import DayOfWeek
+from app.schema.availability import Availability as AvailabilityModel
+from app.services.availability import DAY_ORDER
+from app.services.cache import bump_availability_version, get_availability_version
+
+MINUTES_PER_DAY = 24 * 60
+WEEK_MINUTES = 7 * MINUTES_PER_DAY
+
+
+def week_minute(day: DayOfWeek, at: datetime.time) -> int:
+    return DAY_ORDER[day] * MINUTES_PER_DAY + at.hour * 60 + at.minute
+
+
+def _week_ranges(intervals: Iterable[Tuple[DayOfWeek, datetime.time, datetime.time]]) -> List[Tuple[int, int]]:
+    # [first, last) minutes of the week; availability windows never cross midnight.
+    return [(week_minute(day, start), week_minute(day, end)) for day, start, end in intervals]
+
+
+class AvailabilityBitmap:
+    """
+    Bitmap index of the doctors' weekly availability, at minute resolution.
+
+    Every doctor owns one bit position, and every minute of the week holds an int
+    whose set bits are the doctors available during that minute. "Who works on
+    Monday at 10:30" is a list lookup, and combining conditions is a bitwise AND.
+    Runs of minutes with the same doctors share one int, so memory grows with the
+    number of distinct window edges rather than with minutes times doctors.
+    """
+
+    def __init__(self):
+        self.positions: Dict[int, int] = {}  # doctor id -> bit position
+        self.doctor_ids: List[int] = []  # bit position -> doctor id
+        self.minutes: List[int] = [0] * WEEK_MINUTES
+        self.days: List[int] = [0] * 7
+        self._ranges: Dict[int, List[Tuple[int, int]]] = {}
+        # Whether bit positions follow doctor ids, which lets a page be read off the low bits.
+        self._ordered = True
+
+    def _bit(self, doctor_id: int) -> int:
+        position = self.positions.get(doctor_id)
+        if position is None:
+            if self.doctor_ids and doctor_id < self.doctor_ids[-1]:
+                self._ordered = False
+            position = self.positions[doctor_id] = len(self.doctor_ids)
+            self.doctor_ids.append(doctor_id)
+        return 1 << position
+
+    @classmethod
+    def build(cls, rows: Iterable[Tuple[int, DayOfWeek, datetime.time, datetime.time]]) -> "AvailabilityBitmap":
+        bitmap = cls()
+        for doctor_id, day, start, end in rows:
+            bitmap._ranges.setdefault(doctor_id, []).append((week_minute(day, start), week_minute(day, end)))
+
+        # Sweep the week once: a doctor's bit turns on where one of their windows
+        # starts and off where it ends, instead of being set minute by minute.
+        starts: Dict[int, int] = {}
+        ends: Dict[int, int] = {}
+        for doctor_id, ranges in sorted(bitmap._ranges.items()):
+            bit = bitmap._bit(doctor_id)
+            for first, last in ranges:
+                starts[first] = starts.get(first, 0) | bit
+                ends[last] = ends.get(last, 0) | bit
+                bitmap.days[first // MINUTES_PER_DAY] |= bit
+        current = 0
+        for minute in range(WEEK_MINUTES):
+            if minute in ends or minute in starts:
+                # Ends first, so back-to-back windows of one doctor leave the bit on.
+                current = (current & ~ends.get(minute, 0)) | starts.get(minute, 0)
+            bitmap.minutes[minute] = current
+        return bitmap
+
+    def set_doctor(self, doctor_id: int, intervals: Iterable[Tuple[DayOfWeek, datetime.time, datetime.time]]) -> None:
+        """
+        Replace one doctor's windows, touching only the minutes whose state changes.
+        """
+        bit = self._bit(doctor_id)
+        ranges = _week_ranges(intervals)
+        before = {minute for first, last in self._ranges.get(doctor_id, []) for minute in range(first, last)}
+        after = {minute for first, last in ranges for minute in range(first, last)}
+        self._ranges[doctor_id] = ranges
+
+        # Minutes that shared a mask keep sharing the updated one.
+        updated: Dict[int, int] = {}
+        for minute in before ^ after:
+            mask = self.minutes[minute]
+            new_mask = updated.get(mask)
+            if new_mask is None:
+                new_mask = updated[mask] = mask ^ bit
+            self.minutes[minute] = new_mask
+
+        working_days = {first // MINUTES_PER_DAY for first, _ in ranges}
+        for day in range(7):
+            self.days[day] = self.days[day] | bit if day in working_days else self.days[day] & ~bit
+
+    def available_at(self, day: DayOfWeek, at: datetime.time) -> int:
+        return self.minutes[week_minute(day, at)]
+
+    def available_on(self, day: DayOfWeek) -> int:
+        return self.days[DAY_ORDER[day]]
+
+    def doctors(self, mask: int, after_id: Optional[int] = None, limit: Optional[int] = None) -> List[int]:
+        """
+        The doctor ids whose bits are set in `mask`, in id order, after `after_id` and at most `limit` of them.
+        """
+        if limit is not None and self._ordered:
+            # Only the lowest set bits past the cursor are needed for one page.
+            start = bisect.bisect_right(self.doctor_ids, after_id) if after_id is not None else 0
+            mask >>= start
+            ids = []
+            while mask and len(ids) < limit:
+                low = mask & -mask
+                ids.append(self.doctor_ids[start + low.bit_length() - 1])
+                mask ^= low
+            return ids
+        # bin() walks the int in C, which beats peeling off one bit at a time.
+        bits = bin(mask)[:1:-1]
+        ids = sorted(self.doctor_ids[position] for position, bit in enumerate(bits) if bit == "1")
+        if after_id is not None:
+            ids = ids[bisect.bisect_right(ids, after_id):]
+        return ids if limit is None else ids[:limit]
+
+
+class DoctorSearchIndex:
+    """
+    Holds this worker's AvailabilityBitmap. It is built on the first search and kept
+    current by `set_doctor` for changes made through this worker; changes made through
+    other workers bump a shared version that makes the next search rebuild it.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._bitmap: Optional[AvailabilityBitmap] = None
+        self._version: Optional[bytes] = None
+        self._built_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def _is_current(self, version: Optional[bytes]) -> bool:
+        return (
+            self._bitmap is not None
+            and self._version == version
+            and time.monotonic() - self._built_at < self.ttl
+        )
+
+    async def get(self) -> AvailabilityBitmap:
+        version = await get_availability_version()
+        if self._is_current(version):
+            return self._bitmap
+        async with self._lock:
+            # Another search may have rebuilt it while this one waited.
+            if not self._is_current(version):
+                # Read from the primary, after the version: a change committed in between
+                # leaves the bitmap marked stale rather than missing that change.
+                async with session() as db:
+                    rows = await db.execute(
+                        select(
+                            AvailabilityModel.doctor_id,
+                            AvailabilityModel.day_of_week,
+                            AvailabilityModel.start_time,
+                            AvailabilityModel.end_time,
+                        )
+                    )
+                    self._bitmap = AvailabilityBitmap.build(rows.tuples())
+                self._version = version
+                self._built_at = time.monotonic()
+        return self._bitmap
+
+    async def set_doctor(
+        self, doctor_id: int, intervals: Iterable[Tuple[DayOfWeek, datetime.time, datetime.time]]
+    ) -> None:
+        """
+        Apply a committed availability change and tell the other workers about it.
+        """
+        version = await bump_availability_version()
+        if self._bitmap is None or self._version != (str(version - 1).encode() if version > 1 else None):
+            # Already behind on some other change; the next search rebuilds anyway.
+            return
+        self._bitmap.set_doctor(doctor_id, intervals)
+        self._version = str(version).encode()
+
+
+doctor_search_index = DoctorSearchIndex(ttl=settings.DOCTOR_SEARCH_INDEX_TTL_SECONDS)
+
@@ -0,0 +1,260 @@
+import asyncio
+import datetime
+import logging
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Protocol, Set, Tuple
+
+import orjson
+
+from app.core import metrics
+from app.core.config import settings
+
+logger = logging.getLogger("app.events")
+
+# Sent in place of the backlog of a subscriber that fell behind, or after events may
+# have been lost between workers: the client should fetch the doctor's slots again.
+RESYNC = orjson.dumps({"op": "resync"})
+# Sent to WebSocket subscribers while there is nothing else to send.
+HEARTBEAT = orjson.dumps({"op": "heartbeat"})
+
+
+def group_by_doctor(slots: Iterable[Tuple[int, datetime.datetime]]) -> Dict[int, List[datetime.datetime]]:
+    """
+    (doctor_id, start) pairs grouped into one list of starts per doctor, e.g. for one event per doctor.
+    """
+    grouped: Dict[int, List[datetime.datetime]] = {}
+    for doctor_id, start in slots:
+        grouped.setdefault(doctor_id, []).append(start)
+    return grouped
+
+
+class SlotFeedFull(Exception):
+    """Raised when the worker already serves SLOT_FEED_MAX_SUBSCRIBERS subscriptions."""
+
+
+class Subscription:
+    """
+    One client's feed of a doctor's slot events. Publishers never wait for it: events
+    are buffered up to `maxsize`, and a subscriber that falls further behind has its
+    backlog replaced by a single resync event.
+    """
+
+    def __init__(self, doctor_id: int, maxsize: int):
+        self.doctor_id = doctor_id
+        self.maxsize = maxsize
+        self.closed = False
+        self._queue: Deque[bytes] = deque()
+        self._ready = asyncio.Event()
+
+    def put(self, payload: bytes) -> None:
+        if len(self._queue) >= self.maxsize:
+            self._queue.clear()
+            payload = RESYNC
+            metrics.slot_feed_resyncs_total.inc()
+        self._queue.append(payload)
+        self._ready.set()
+
+    def close(self) -> None:
+        self.closed = True
+        self._ready.set()
+
+    async def get(self, timeout: float) -> Optional[bytes]:
+        """
+        The next event, or None if there was none for `timeout` seconds (time for a
+        heartbeat) or the subscription was closed.
+        """
+        if not self._queue and not self.closed:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self._queue.popleft() if self._queue and not self.closed else None
+
+
+class SlotEventBroadcaster(Protocol):
+    def deliver(self, doctor_id: int, payload: bytes) -> None: ...
+
+    def resync_all(self) -> None: ...
+
+
+class EventBackend(Protocol):
+    async def publish(self, doctor_id: int, payload: bytes) -> None: ...
+
+    async def start(self, broadcaster: SlotEventBroadcaster) -> None: ...
+
+    async def close(self) -> None: ...
+
+
+class MemoryEventBackend:
+    """
+    Delivers events to the subscribers of the publishing worker only.
+    """
+
+    def __init__(self):
+        self._broadcaster: Optional[SlotEventBroadcaster] = None
+
+    async def publish(self, doctor_id: int, payload: bytes) -> None:
+        if self._broadcaster is not None:
+            self._broadcaster.deliver(doctor_id, payload)
+
+    async def start(self, broadcaster: SlotEventBroadcaster) -> None:
+        self._broadcaster = broadcaster
+
+    async def close(self) -> None:
+        self._broadcaster = None
+
+
+class RedisEventBackend:
+    """
+    Fans events out to every worker through Redis pub/sub (or anything that speaks the
+    redis.asyncio client API). Each worker listens on all doctors' channels with one
+    pattern subscription and hands the events to its own subscribers.
+    """
+
+    def __init__(self, client, prefix: str = "slots:"):
+        self.client = client
+        self.prefix = prefix
+        self._pubsub = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def publish(self, doctor_id: int, payload: bytes) -> None:
+        await self.client.publish(f"{self.prefix}{doctor_id}", payload)
+
+    async def start(self, broadcaster: SlotEventBroadcaster) -> None:
+        self._pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        await self._pubsub.psubscribe(f"{self.prefix}*")
+        self._task = asyncio.create_task(self._listen(broadcaster))
+
+    async def _listen(self, broadcaster: SlotEventBroadcaster) -> None:
+        while True:
+            try:
+                message = await self._pubsub.get_message(timeout=None)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # The client reconnects and subscribes again on the next read, but
+                # whatever was published meanwhile is gone.
+                logger.exception("Slot event subscription failed")
+                broadcaster.resync_all()
+                await asyncio.sleep(1)
+                continue
+            if message is None or message["type"] != "pmessage":
+                continue
+            channel = message["channel"]
+            if isinstance(channel, bytes):
+                channel = channel.decode()
+            broadcaster.deliver(int(channel[len(self.prefix):]), message["data"])
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+            self._pubsub = None
+        await self.client.aclose()
+
+
+def create_event_backend() -> EventBackend:
+    if settings.EVENT_BACKEND == "redis":
+        # Optional dependency, only needed when the shared backend is configured.
+        import redis.asyncio as redis
+
+        return RedisEventBackend(redis.from_url(settings.CACHE_URL))
+    return MemoryEventBackend()
+
+
+class SlotEvents:
+    """
+    Publishes slot changes and keeps this worker's subscriptions, by doctor.
+
+    Events are compact deltas, serialized once and sent as is to every subscriber:
+
+      {"doctor_id": 1, "op": "booked", "slots": ["2030-01-07T09:00:00"]}
+      {"doctor_id": 1, "op": "freed", "slots": ["2030-01-07T09:00:00"]}
+      {"doctor_id": 1, "op": "schedule", "dates": ["2030-01-07"]}   (fetch these dates again)
+      {"op": "resync"}                                              (fetch everything again)
+    """
+
+    def __init__(self, backend: EventBackend, queue_size: int, max_subscribers: int):
+        self.backend = backend
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._subscriptions: Dict[int, Set[Subscription]] = {}
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    async def start(self) -> None:
+        await self.backend.start(self)
+
+    def close_subscriptions(self) -> None:
+        """
+        End every open feed. Called as soon as the server is told to stop: it waits for
+        open connections before shutting down, and feeds never finish on their own.
+        """
+        for subscriptions in self._subscriptions.values():
+            for subscription in subscriptions:
+                subscription.close()
+
+    async def close(self) -> None:
+        self.close_subscriptions()
+        await self.backend.close()
+
+    def subscribe(self, doctor_id: int) -> Subscription:
+        if self._count >= self.max_subscribers:
+            raise SlotFeedFull()
+        subscription = Subscription(doctor_id, self.queue_size)
+        self._subscriptions.setdefault(doctor_id, set()).add(subscription)
+        self._count += 1
+        metrics.slot_feed_subscribers.inc()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscriptions = self._subscriptions.get(subscription.doctor_id)
+        if subscriptions is None or subscription not in subscriptions:
+            return
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del self._subscriptions[subscription.doctor_id]
+        self._count -= 1
+        metrics.slot_feed_subscribers.dec()
+        subscription.close()
+
+    def deliver(self, doctor_id: int, payload: bytes) -> None:
+        for subscription in self._subscriptions.get(doctor_id, ()):
+            subscription.put(payload)
+
+    def resync_all(self) -> None:
+        for subscriptions in self._subscriptions.values():
+            for subscription in subscriptions:
+                subscription.put(RESYNC)
+
+    async def _publish(self, doctor_id: int, event: dict) -> None:
+        # Called after the change is committed; a lost event must not fail the request.
+        try:
+            await self.backend.publish(doctor_id, orjson.dumps({"doctor_id": doctor_id, **event}))
+        except Exception:
+            logger.exception("Publishing a slot event for doctor %s failed", doctor_id)
+
+    async def booked(self, doctor_id: int, slots: Iterable[datetime.datetime]) -> None:
+        await self._publish(doctor_id, {"op": "booked", "slots": sorted(slots)})
+
+    async def freed(self, doctor_id: int, slots: Iterable[datetime.datetime]) -> None:
+        await self._publish(doctor_id, {"op": "freed", "slots": sorted(slots)})
+
+    async def schedule_changed(self, doctor_id: int, dates: Iterable[datetime.date]) -> None:
+        await self._publish(doctor_id, {"op": "schedule", "dates": sorted(dates)})
+
+
+slot_events = SlotEvents(
+    create_event_backend(),
+    queue_size=settings.SLOT_FEED_QUEUE_SIZE,
+    max_subscribers=settings.SLOT_FEED_MAX_SUBSCRIBERS,
+)
@@ -0,0 +1,279 @@
+import asyncio
+import datetime
+import logging
+import random
+import uuid
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import and_, delete, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import settings
+from app.db.database import session
+from app.models.job import JobStatus
+from app.schema.job import Job
+
+logger = logging.getLogger("app.jobs")
+
+# A handler receives the payloads of one or more jobs of its kind. It runs
+# outside the request and opens its own database session if it needs one.
+JobHandler = Callable[[List[dict]], Awaitable[None]]
+
+# kind -> (handler, batched)
+_handlers: Dict[str, Tuple[JobHandler, bool]] = {}
+
+
+def job_handler(kind: str, batched: bool = False):
+    """
+    Register a handler for a job kind. A batched handler gets every due job of
+    its kind from one poll in a single call, otherwise jobs are handled one by one.
+    """
+    def register(handler: JobHandler) -> JobHandler:
+        _handlers[kind] = (handler, batched)
+        return handler
+    return register
+
+
+def now() -> datetime.datetime:
+    # Naive local time, like the appointment times that reminders are scheduled against.
+    return datetime.datetime.now()
+
+
+class JobRequest(NamedTuple):
+    kind: str
+    payload: dict
+    idempotency_key: Optional[str] = None
+    run_at: Optional[datetime.datetime] = None
+
+
+async def enqueue_many(db: AsyncSession, requests: List[JobRequest]) -> List[Job]:
+    """
+    Add jobs to `db`'s transaction, so they are only queued if the caller commits.
+    Requests whose idempotency key is already queued are skipped.
+    """
+    keys = [request.idempotency_key for request in requests if request.idempotency_key is not None]
+    # Jobs added to this session but not flushed yet count as queued too.
+    existing = {job.idempotency_key for job in db.new if isinstance(job, Job)}
+    if keys:
+        existing.update((await db.scalars(select(Job.idempotency_key).where(Job.idempotency_key.in_(keys)))).all())
+
+    created = now()
+    jobs = []
+    for request in requests:
+        if request.idempotency_key is not None:
+            if request.idempotency_key in existing:
+                continue
+            existing.add(request.idempotency_key)
+        jobs.append(Job(
+            kind=request.kind,
+            payload=request.payload,
+            idempotency_key=request.idempotency_key,
+            status=JobStatus.PENDING,
+            attempts=0,
+            run_at=request.run_at or created,
+            created_at=created,
+        ))
+    db.add_all(jobs)
+    return jobs
+
+
+async def enqueue(db: AsyncSession, kind: str, payload: dict, idempotency_key: Optional[str] = None,
+                  run_at: Optional[datetime.datetime] = None) -> Optional[Job]:
+    jobs = await enqueue_many(db, [JobRequest(kind, payload, idempotency_key, run_at)])
+    return jobs[0] if jobs else None
+
+
+def retry_delay(attempts: int) -> float:
+    """
+    Seconds to wait before retrying a job that has failed `attempts` times.
+    """
+    delay = min(settings.JOB_RETRY_MAX_SECONDS, settings.JOB_RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+    # Jitter keeps jobs that failed together from being retried together.
+    return delay * random.uniform(0.5, 1.0)
+
+
+class JobWorker:
+    """
+    Polls the jobs table from the event loop and runs due jobs through their handlers.
+
+    Several workers (e.g. one per gunicorn process) can poll the same table: a job
+    is claimed with a conditional UPDATE, so only one of them runs it. A claimed
+    job carries a lease, renewed before each handler call, and one whose worker died
+    is picked up again once the lease runs out, which makes delivery at-least-once.
+    A worker records an outcome only for jobs it still holds the claim on.
+    """
+
+    def __init__(self, session_factory: async_sessionmaker, batch_size: int, poll_interval: float):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.worker_id = str(uuid.uuid4())
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = asyncio.Event()
+        self._next_purge: Optional[datetime.datetime] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._stopping.clear()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Stop polling; a batch that is being handled is finished first.
+        """
+        if self._task is not None:
+            self._stopping.set()
+            await self._task
+            self._task = None
+
+    async def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                processed = await self.run_once()
+                if self._next_purge is None or now() >= self._next_purge:
+                    self._next_purge = now() + datetime.timedelta(seconds=settings.JOB_PURGE_INTERVAL_SECONDS)
+                    await self.purge()
+            except Exception:
+                logger.exception("Job worker poll failed")
+                processed = 0
+            if not processed:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    def _lease(self) -> datetime.datetime:
+        return now() + datetime.timedelta(seconds=settings.JOB_LEASE_SECONDS)
+
+    async def _claim(self, db: AsyncSession) -> List[Job]:
+        current = now()
+        due = or_(
+            and_(Job.status == JobStatus.PENDING, Job.run_at <= current),
+            and_(Job.status == JobStatus.RUNNING, Job.locked_until < current),
+        )
+        # SKIP LOCKED keeps MySQL workers off each other's rows; backends without
+        # row locks (SQLite) still only claim a job once thanks to the `due` re-check.
+        ids = (await db.scalars(
+            select(Job.id).where(due).order_by(Job.run_at).limit(self.batch_size).with_for_update(skip_locked=True)
+        )).all()
+        if not ids:
+            await db.commit()
+            return []
+        await db.execute(
+            update(Job)
+            .where(Job.id.in_(ids), due)
+            .values(status=JobStatus.RUNNING, claimed_by=self.worker_id, locked_until=self._lease())
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        return (await db.scalars(
+            select(Job).where(Job.id.in_(ids), Job.claimed_by == self.worker_id, Job.status == JobStatus.RUNNING)
+        )).all()
+
+    def _held(self, jobs: List[Job]):
+        # The jobs of `jobs` this worker still holds the claim on.
+        return and_(
+            Job.id.in_([job.id for job in jobs]),
+            Job.claimed_by == self.worker_id,
+            Job.status == JobStatus.RUNNING,
+        )
+
+    async def _renew(self, db: AsyncSession, jobs: List[Job]) -> List[Job]:
+        """
+        Give `jobs` a fresh lease before they are handled. Returns the ones still held:
+        a job whose lease ran out may already have been claimed by another worker.
+        """
+        await db.execute(
+            update(Job).where(self._held(jobs)).values(locked_until=self._lease())
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        held = set((await db.scalars(select(Job.id).where(self._held(jobs)))).all())
+        return [job for job in jobs if job.id in held]
+
+    async def _finish(self, db: AsyncSession, jobs: List[Job], error: Optional[str] = None) -> None:
+        """
+        Record the outcome of `jobs` and release them, unless another worker has claimed
+        them since, in which case its outcome is the one that counts.
+        """
+        released = dict(attempts=Job.attempts + 1, claimed_by=None, locked_until=None, last_error=error)
+        if error is None:
+            result = await db.execute(
+                update(Job).where(self._held(jobs)).values(status=JobStatus.DONE, **released)
+                .execution_options(synchronize_session=False)
+            )
+            lost = len(jobs) - result.rowcount
+        else:
+            lost = 0
+            for job in jobs:
+                attempts = job.attempts + 1
+                if attempts >= settings.JOB_MAX_ATTEMPTS:
+                    values = dict(status=JobStatus.FAILED)
+                else:
+                    values = dict(
+                        status=JobStatus.PENDING,
+                        run_at=now() + datetime.timedelta(seconds=retry_delay(attempts)),
+                    )
+                result = await db.execute(
+                    update(Job).where(self._held([job])).values(**values, **released)
+                    .execution_options(synchronize_session=False)
+                )
+                lost += 1 - result.rowcount
+        # Record each batch's outcome before running the next one.
+        await db.commit()
+        if lost:
+            logger.warning("%s job(s) were claimed by another worker before they finished", lost)
+
+    async def run_once(self) -> int:
+        """
+        Claim and handle one batch of due jobs; return how many were claimed.
+        """
+        async with self.session_factory() as db:
+            jobs = await self._claim(db)
+            by_kind: Dict[str, List[Job]] = {}
+            for job in jobs:
+                by_kind.setdefault(job.kind, []).append(job)
+
+            for kind, kind_jobs in by_kind.items():
+                if kind not in _handlers:
+                    await self._finish(db, kind_jobs, error=f"No handler registered for job kind {kind!r}")
+                    continue
+                handler, batched = _handlers[kind]
+                for batch in [kind_jobs] if batched else [[job] for job in kind_jobs]:
+                    # Earlier handler calls may have used up much of the lease taken at claim time.
+                    batch = await self._renew(db, batch)
+                    if not batch:
+                        continue
+                    try:
+                        await handler([job.payload for job in batch])
+                    except Exception as exc:
+                        logger.exception("Job %s failed for ids %s", kind, [job.id for job in batch])
+                        await self._finish(db, batch, error=f"{type(exc).__name__}: {exc}")
+                    else:
+                        await self._finish(db, batch)
+            return len(jobs)
+
+    async def purge(self) -> int:
+        """
+        Delete done jobs that ran more than JOB_RETENTION_DAYS ago, a batch per
+        transaction, so the table does not grow forever. Returns how many were deleted.
+        """
+        cutoff = now() - datetime.timedelta(days=settings.JOB_RETENTION_DAYS)
+        purged = 0
+        async with self.session_factory() as db:
+            while True:
+                ids = (await db.scalars(
+                    select(Job.id)
+                    .where(Job.status == JobStatus.DONE, Job.run_at < cutoff)
+                    .limit(self.batch_size)
+                )).all()
+                if not ids:
+                    return purged
+                await db.execute(
+                    delete(Job).where(Job.id.in_(ids)).execution_options(synchronize_session=False)
+                )
+                await db.commit()
+                purged += len(ids)
+
+
+job_worker = JobWorker(session, batch_size=settings.JOB_BATCH_SIZE, poll_interval=settings.JOB_POLL_INTERVAL_SECONDS)
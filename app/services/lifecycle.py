@@ -0,0 +1,109 @@
+import datetime
+from typing import List
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.database import session
+from app.models.appointment import AppointmentStatus
+from app.schema.appointment import Appointment as AppointmentModel, ArchivedAppointment
+from app.services.jobs import enqueue, job_handler, now
+
+SWEEP_APPOINTMENTS = "appointments.sweep"
+
+# Copied as is into the archive; the archive has no active_slot, since archived appointments are long past.
+ARCHIVED_COLUMNS = ["id", "appointment_time", "status", "created_at", "updated_at", "doctor_id", "patient_id"]
+
+
+def archive_cutoff() -> datetime.datetime:
+    """
+    Appointments before this time may have been moved to the archive, none after it have.
+    """
+    return now() - datetime.timedelta(days=settings.APPOINTMENT_ARCHIVE_AFTER_DAYS)
+
+
+async def complete_past_appointments(db: AsyncSession) -> int:
+    """
+    Mark scheduled appointments whose time has passed as completed, one batch per
+    transaction so no lock is held on many rows at once. Returns how many were updated.
+    """
+    current = now()
+    completed = 0
+    while True:
+        ids = (await db.scalars(
+            select(AppointmentModel.id)
+            .where(AppointmentModel.status == AppointmentStatus.SCHEDULED, AppointmentModel.appointment_time < current)
+            .order_by(AppointmentModel.id)
+            .limit(settings.APPOINTMENT_SWEEP_BATCH_SIZE)
+        )).all()
+        if not ids:
+            return completed
+        # Re-checks the status, so an appointment cancelled in between stays cancelled.
+        result = await db.execute(
+            update(AppointmentModel)
+            .where(AppointmentModel.id.in_(ids), AppointmentModel.status == AppointmentStatus.SCHEDULED)
+            .values(status=AppointmentStatus.COMPLETED)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        completed += result.rowcount
+
+
+async def archive_old_appointments(db: AsyncSession) -> int:
+    """
+    Move appointments before the archive cutoff to the archive, oldest first and one
+    batch per transaction. The archive therefore always holds a prefix of all
+    appointments in (appointment_time, id) order. Returns how many were moved.
+    """
+    cutoff = archive_cutoff()
+    archived = 0
+    while True:
+        ids = (await db.scalars(
+            select(AppointmentModel.id)
+            .where(AppointmentModel.appointment_time < cutoff)
+            .order_by(AppointmentModel.appointment_time, AppointmentModel.id)
+            .limit(settings.APPOINTMENT_SWEEP_BATCH_SIZE)
+        )).all()
+        if not ids:
+            return archived
+        columns = [getattr(AppointmentModel, name) for name in ARCHIVED_COLUMNS]
+        await db.execute(
+            insert(ArchivedAppointment).from_select(ARCHIVED_COLUMNS, select(*columns).where(AppointmentModel.id.in_(ids)))
+        )
+        await db.execute(
+            delete(AppointmentModel).where(AppointmentModel.id.in_(ids)).execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        archived += len(ids)
+
+
+async def enqueue_appointment_sweep(db: AsyncSession) -> None:
+    """
+    Queue the next sweep at the next multiple of APPOINTMENT_SWEEP_INTERVAL_MINUTES
+    past midnight, unless it is already queued.
+    """
+    current = now()
+    midnight = datetime.datetime.combine(current.date(), datetime.time.min)
+    interval = datetime.timedelta(minutes=settings.APPOINTMENT_SWEEP_INTERVAL_MINUTES)
+    run_at = midnight + ((current - midnight) // interval + 1) * interval
+    await enqueue(
+        db,
+        SWEEP_APPOINTMENTS,
+        {},
+        idempotency_key=f"appointment-sweep:{run_at.isoformat(timespec='minutes')}",
+        run_at=run_at,
+    )
+
+
+@job_handler(SWEEP_APPOINTMENTS)
+async def sweep_appointments(payloads: List[dict]) -> None:
+    """
+    Completes past appointments, then archives old ones. The next run is queued first,
+    so a sweep that keeps failing does not stop the ones after it.
+    """
+    async with session() as db:
+        await enqueue_appointment_sweep(db)
+        await db.commit()
+        await complete_past_appointments(db)
+        await archive_old_appointments(db)
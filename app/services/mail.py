@@ -0,0 +1,88 @@
+import asyncio
+import json
+import pathlib
+import smtplib
+from dataclasses import asdict, dataclass
+from email.message import EmailMessage
+from typing import List, Protocol
+
+from app.core.config import settings
+
+
+@dataclass
+class Message:
+    to: str
+    subject: str
+    body: str
+
+
+class MailTransport(Protocol):
+    async def send(self, messages: List[Message]) -> None:
+        """Deliver every message or raise; a batch shares one connection where possible."""
+        ...
+
+
+class FileTransport:
+    """
+    Local stub: appends each message as a JSON line to a file instead of sending it.
+    """
+
+    def __init__(self, path: str, sender: str):
+        self.path = pathlib.Path(path)
+        self.sender = sender
+
+    def _write(self, messages: List[Message]) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("a") as f:
+            for message in messages:
+                f.write(json.dumps({"from": self.sender, **asdict(message)}) + "\n")
+
+    async def send(self, messages: List[Message]) -> None:
+        await asyncio.to_thread(self._write, messages)
+
+
+class SmtpTransport:
+    """
+    Sends a batch over a single SMTP connection, in a thread since smtplib blocks.
+    """
+
+    def __init__(self, host: str, port: int, sender: str, username=None, password=None, starttls: bool = True):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+
+    def _send(self, messages: List[Message]) -> None:
+        with smtplib.SMTP(self.host, self.port, timeout=30) as smtp:
+            if self.starttls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password)
+            for message in messages:
+                email = EmailMessage()
+                email["From"] = self.sender
+                email["To"] = message.to
+                email["Subject"] = message.subject
+                email.set_content(message.body)
+                smtp.send_message(email)
+
+    async def send(self, messages: List[Message]) -> None:
+        await asyncio.to_thread(self._send, messages)
+
+
+def create_transport() -> MailTransport:
+    if settings.MAIL_TRANSPORT == "smtp":
+        return SmtpTransport(
+            settings.SMTP_HOST,
+            settings.SMTP_PORT,
+            settings.MAIL_FROM,
+            username=settings.SMTP_USERNAME,
+            password=settings.SMTP_PASSWORD,
+            starttls=settings.SMTP_STARTTLS,
+        )
+    return FileTransport(settings.MAIL_FILE_PATH, settings.MAIL_FROM)
+
+
+mail_transport = create_transport()
@@ -0,0 +1,116 @@
+import datetime
+from typing import List
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+
+from app.core.config import settings
+from app.core.security import create_password_reset_token
+from app.db.database import session
+from app.models.appointment import AppointmentStatus
+from app.schema.appointment import Appointment as AppointmentModel
+from app.schema.users import User as UserModel
+from app.services.jobs import JobRequest, enqueue, enqueue_many, job_handler, now
+from app.services.mail import Message, mail_transport
+
+PASSWORD_RESET_EMAIL = "email.password_reset"
+APPOINTMENT_CONFIRMATION_EMAIL = "email.appointment_confirmation"
+APPOINTMENT_REMINDER_EMAIL = "email.appointment_reminder"
+
+
+# --- Enqueueing, called inside the request's transaction ---
+
+async def enqueue_password_reset(db: AsyncSession, email: str) -> None:
+    await enqueue(db, PASSWORD_RESET_EMAIL, {"email": email})
+
+
+async def enqueue_booking_notifications(db: AsyncSession, appointments: List[AppointmentModel]) -> None:
+    """
+    Queue a confirmation for each new appointment and a reminder
+    APPOINTMENT_REMINDER_HOURS before it. The appointments must be flushed so they have ids.
+    """
+    requests = []
+    lead = datetime.timedelta(hours=settings.APPOINTMENT_REMINDER_HOURS)
+    current = now()
+    for appointment in appointments:
+        payload = {"appointment_id": appointment.id}
+        requests.append(JobRequest(
+            APPOINTMENT_CONFIRMATION_EMAIL, payload, idempotency_key=f"appointment-confirmation:{appointment.id}"
+        ))
+        if appointment.appointment_time - lead > current:
+            requests.append(JobRequest(
+                APPOINTMENT_REMINDER_EMAIL,
+                payload,
+                idempotency_key=f"appointment-reminder:{appointment.id}",
+                run_at=appointment.appointment_time - lead,
+            ))
+    await enqueue_many(db, requests)
+
+
+# --- Handlers, run by the job worker ---
+
+async def _scheduled_appointments(payloads: List[dict]) -> List[AppointmentModel]:
+    # Appointments cancelled since the job was queued get no mail.
+    async with session() as db:
+        return (await db.scalars(
+            select(AppointmentModel)
+            .options(joinedload(AppointmentModel.doctor), joinedload(AppointmentModel.patient))
+            .where(
+                AppointmentModel.id.in_([payload["appointment_id"] for payload in payloads]),
+                AppointmentModel.status == AppointmentStatus.SCHEDULED,
+            )
+        )).all()
+
+
+@job_handler(PASSWORD_RESET_EMAIL)
+async def send_password_reset(payloads: List[dict]) -> None:
+    emails = [payload["email"] for payload in payloads]
+    async with session() as db:
+        # Queued for any address so the endpoint does not reveal which accounts exist.
+        known = set((await db.scalars(select(UserModel.email).where(UserModel.email.in_(emails)))).all())
+    messages = []
+    for email in emails:
+        if email not in known:
+            continue
+        # The token is made at send time, so its lifetime starts when the mail goes out.
+        link = settings.PASSWORD_RESET_URL.format(token=create_password_reset_token(email=email))
+        messages.append(Message(
+            to=email,
+            subject="Reset your password",
+            body=(
+                f"Use this link to choose a new password:\n\n{link}\n\n"
+                f"It expires in {settings.PASSWORD_RESET_TOKEN_EXPIRE_MINUTES} minutes."
+            ),
+        ))
+    if messages:
+        await mail_transport.send(messages)
+
+
+@job_handler(APPOINTMENT_CONFIRMATION_EMAIL)
+async def send_appointment_confirmation(payloads: List[dict]) -> None:
+    messages = [
+        Message(
+            to=appointment.patient.email,
+            subject="Your appointment is booked",
+            body=f"Your appointment with {appointment.doctor.email} on {appointment.appointment_time:%Y-%m-%d %H:%M} is confirmed.",
+        )
+        for appointment in await _scheduled_appointments(payloads)
+    ]
+    if messages:
+        await mail_transport.send(messages)
+
+
+@job_handler(APPOINTMENT_REMINDER_EMAIL, batched=True)
+async def send_appointment_reminders(payloads: List[dict]) -> None:
+    # Batched: all reminders due in one poll are loaded with one query and sent over one connection.
+    messages = [
+        Message(
+            to=appointment.patient.email,
+            subject="Appointment reminder",
+            body=f"Reminder: you have an appointment with {appointment.doctor.email} on {appointment.appointment_time:%Y-%m-%d %H:%M}.",
+        )
+        for appointment in await _scheduled_appointments(payloads)
+    ]
+    if messages:
+        await mail_transport.send(messages)
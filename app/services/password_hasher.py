@@ -0,0 +1,80 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Optional, Tuple
+
+from app.core.config import settings
+from app.core.security import hash_password, pwd_context, verify_password
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when too many hash/verify calls are already waiting for a worker."""
+
+
+def _verify_and_update(plain_text: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    # Runs in a worker process, so it has to be a picklable module-level function.
+    return pwd_context.verify_and_update(plain_text, hashed_password)
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt off the event loop.
+
+    With `workers > 0` calls go to a ProcessPoolExecutor so hashing can use every
+    core; with `workers == 0` they fall back to the default threadpool. At most
+    `max_pending` calls may be in flight, anything beyond that raises
+    PasswordHasherBusy, which the app turns into a 503.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor: Optional[Executor] = None
+        self._pending = 0
+
+    def start(self) -> None:
+        if self.workers > 0 and self._executor is None:
+            # "spawn" avoids forking a process that already runs an event loop and threads.
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    async def _run(self, fn, *args):
+        if self._pending >= self.max_pending:
+            raise PasswordHasherBusy()
+        self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password)
+
+    async def verify(self, plain_text: str, hashed_password: str) -> bool:
+        return await self._run(verify_password, plain_text, hashed_password)
+
+    async def verify_and_update(self, plain_text: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """
+        Verify a password and, if the stored hash uses outdated settings
+        (e.g. a lower bcrypt cost), also return a fresh hash to store.
+        """
+        return await self._run(_verify_and_update, plain_text, hashed_password)
+
+
+def default_hash_workers() -> int:
+    # Every server worker gets its own pool, so share the CPUs between them.
+    return max(1, (os.cpu_count() or 1) // settings.WEB_CONCURRENCY)
+
+
+password_hasher = PasswordHasher(
+    workers=settings.PASSWORD_HASH_WORKERS if settings.PASSWORD_HASH_WORKERS is not None else default_hash_workers(),
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING,
+)
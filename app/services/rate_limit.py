@@ -0,0 +1,155 @@
+import time
+from dataclasses import dataclass
+from typing import Optional, Protocol
+
+from app.core import metrics
+from app.core.config import settings
+from app.util.ttl_cache import TTLCache
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+class RateLimited(Exception):
+    """Raised when a token bucket is empty; the app turns it into a 429."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(retry_after)
+        self.retry_after = retry_after
+
+
+@dataclass(frozen=True)
+class Rate:
+    """
+    Bucket of `capacity` tokens, refilled evenly over `period` seconds.
+    """
+    capacity: int
+    period: float
+
+    @property
+    def refill_per_second(self) -> float:
+        return self.capacity / self.period
+
+    @classmethod
+    def parse(cls, value: str) -> "Rate":
+        """
+        Parse "<requests>/<second|minute|hour|day>", e.g. "5/minute".
+        """
+        count, _, unit = value.partition("/")
+        if unit.strip() not in PERIODS or not count.strip().isdigit() or int(count) < 1:
+            raise ValueError(f"Invalid rate {value!r}, expected e.g. '5/minute'")
+        return cls(capacity=int(count), period=PERIODS[unit.strip()])
+
+
+class RateLimitBackend(Protocol):
+    async def hit(self, key: str, rate: Rate) -> float:
+        """Take a token; return 0 if one was available, else the seconds until one is."""
+        ...
+
+    async def close(self) -> None: ...
+
+
+class MemoryRateLimitBackend:
+    """
+    Buckets private to the worker process. With N workers a client can get up to
+    N times the configured rate.
+    """
+
+    def __init__(self, maxsize: int):
+        # key -> (tokens, last refill); an idle bucket is full again and can be dropped.
+        self._buckets = TTLCache(maxsize=maxsize, ttl=float("inf"))
+
+    async def hit(self, key: str, rate: Rate) -> float:
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key) or (rate.capacity, now)
+        tokens = min(rate.capacity, tokens + (now - updated) * rate.refill_per_second)
+        retry_after = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            retry_after = (1 - tokens) / rate.refill_per_second
+        self._buckets.set(key, (tokens, now), ttl=rate.period)
+        return retry_after
+
+    async def close(self) -> None:
+        self._buckets.clear()
+
+
+# Refill and take atomically on the server, using its clock so workers agree.
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    retry_after = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate))
+return tostring(retry_after)
+"""
+
+
+class RedisRateLimitBackend:
+    """
+    Buckets shared by every worker, kept in Redis (or anything that speaks the
+    redis.asyncio client API, including scripting).
+    """
+
+    def __init__(self, client, prefix: str = "rate:"):
+        self.client = client
+        self.prefix = prefix
+        self._script = client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    async def hit(self, key: str, rate: Rate) -> float:
+        result = await self._script(keys=[self.prefix + key], args=[rate.capacity, rate.refill_per_second])
+        return float(result)
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+def create_rate_limit_backend() -> RateLimitBackend:
+    if settings.RATE_LIMIT_BACKEND == "redis":
+        # Optional dependency, only needed when the shared backend is configured.
+        import redis.asyncio as redis
+
+        return RedisRateLimitBackend(redis.from_url(settings.CACHE_URL))
+    return MemoryRateLimitBackend(maxsize=settings.RATE_LIMIT_MAX_KEYS)
+
+
+rate_limit_backend = create_rate_limit_backend()
+
+# Parsed once at import so a malformed setting fails at startup, not on the first request.
+LIMITS = {
+    "login": (Rate.parse(settings.LOGIN_RATE_LIMIT_PER_IP), Rate.parse(settings.LOGIN_RATE_LIMIT_PER_EMAIL)),
+    "register": (Rate.parse(settings.REGISTER_RATE_LIMIT_PER_IP), None),
+    "forgot-password": (
+        Rate.parse(settings.FORGOT_PASSWORD_RATE_LIMIT_PER_IP),
+        Rate.parse(settings.FORGOT_PASSWORD_RATE_LIMIT_PER_EMAIL),
+    ),
+}
+
+
+async def enforce_rate_limit(scope: str, client_ip: Optional[str], email: Optional[str] = None) -> None:
+    """
+    Take a token from the per-IP and per-email buckets of `scope`, raising
+    RateLimited if either is empty. Call it before any database or bcrypt work.
+    """
+    if not settings.RATE_LIMIT_ENABLED:
+        return
+    per_ip, per_email = LIMITS[scope]
+    checks = [(f"{scope}:ip:{client_ip or 'unknown'}", per_ip)]
+    if per_email is not None and email:
+        checks.append((f"{scope}:email:{email.lower()}", per_email))
+    for key, rate in checks:
+        retry_after = await rate_limit_backend.hit(key, rate)
+        if retry_after > 0:
+            metrics.rate_limited_total.inc(scope)
+            raise RateLimited(retry_after)
@@ -0,0 +1,265 @@
+import bisect
+import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import and_, delete, insert, select, union
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.database import session
+from app.models.availability import DayOfWeek
+from app.schema.appointment import Appointment as AppointmentModel
+from app.schema.availability import Availability as AvailabilityModel, AvailabilityException
+from app.schema.schedule import ScheduleSlot
+from app.services.jobs import enqueue, job_handler, now
+
+EXTEND_SCHEDULES = "schedule.extend"
+
+# datetime.weekday() -> DayOfWeek, so a date can be mapped to its weekly windows.
+WEEKDAYS = list(DayOfWeek)
+
+# (start, end, slot minutes)
+Window = Tuple[datetime.time, datetime.time, int]
+Slot = Tuple[datetime.datetime, datetime.datetime]
+
+
+def horizon_dates(weekdays: Optional[Iterable[DayOfWeek]] = None) -> List[datetime.date]:
+    """
+    The dates from today to the end of the schedule horizon, optionally only those falling on `weekdays`.
+    """
+    today = now().date()
+    dates = [today + datetime.timedelta(days=i) for i in range(settings.SCHEDULE_HORIZON_WEEKS * 7)]
+    if weekdays is not None:
+        weekdays = set(weekdays)
+        dates = [day for day in dates if WEEKDAYS[day.weekday()] in weekdays]
+    return dates
+
+
+def cut_slots(day: datetime.date, windows: Iterable[Window]) -> List[Slot]:
+    """
+    Cut each window into back-to-back slots of its slot length; a remainder too short for a slot is dropped.
+    """
+    slots = []
+    for start, end, minutes in windows:
+        length = datetime.timedelta(minutes=minutes)
+        slot_start = datetime.datetime.combine(day, start)
+        close = datetime.datetime.combine(day, end)
+        while slot_start + length <= close:
+            slots.append((slot_start, slot_start + length))
+            slot_start += length
+    return slots
+
+
+async def regenerate_schedule(db: AsyncSession, doctor_id: int, dates: Iterable[datetime.date]) -> None:
+    """
+    Bring the doctor's materialized slots on `dates` (clamped to the horizon) in line with
+    their weekly availability and exceptions. Only slots that changed are deleted or
+    inserted, and nothing is committed. Pending availability changes must be flushed first.
+    """
+    horizon = set(horizon_dates())
+    dates = sorted(day for day in set(dates) if day in horizon)
+    if not dates:
+        return
+    first = datetime.datetime.combine(dates[0], datetime.time.min)
+    last = datetime.datetime.combine(dates[-1] + datetime.timedelta(days=1), datetime.time.min)
+
+    weekly: Dict[DayOfWeek, List[Window]] = {}
+    for day_of_week, start, end, minutes in await db.execute(
+        select(
+            AvailabilityModel.day_of_week,
+            AvailabilityModel.start_time,
+            AvailabilityModel.end_time,
+            AvailabilityModel.slot_minutes,
+        ).where(AvailabilityModel.doctor_id == doctor_id)
+    ):
+        weekly.setdefault(day_of_week, []).append((start, end, minutes))
+
+    exceptions: Dict[datetime.date, List[Window]] = {}
+    for day, start, end, minutes in await db.execute(
+        select(
+            AvailabilityException.date,
+            AvailabilityException.start_time,
+            AvailabilityException.end_time,
+            AvailabilityException.slot_minutes,
+        ).where(
+            AvailabilityException.doctor_id == doctor_id,
+            AvailabilityException.date >= dates[0],
+            AvailabilityException.date <= dates[-1],
+        )
+    ):
+        windows = exceptions.setdefault(day, [])
+        if start is not None:
+            windows.append((start, end, minutes))
+
+    # An appointment that does not start on a slot boundary (e.g. booked before the
+    # slot length changed) keeps the slot around it from being offered.
+    booked = sorted((await db.scalars(
+        select(AppointmentModel.active_slot).where(
+            AppointmentModel.doctor_id == doctor_id,
+            AppointmentModel.active_slot >= first,
+            AppointmentModel.active_slot < last,
+        )
+    )).all())
+
+    desired: Set[Slot] = set()
+    for day in dates:
+        windows = exceptions[day] if day in exceptions else weekly.get(WEEKDAYS[day.weekday()], [])
+        for slot_start, slot_end in cut_slots(day, windows):
+            i = bisect.bisect_right(booked, slot_start)
+            if i == len(booked) or booked[i] >= slot_end:
+                desired.add((slot_start, slot_end))
+
+    wanted_days = set(dates)
+    existing = {
+        (start, end): slot_id
+        for slot_id, start, end in await db.execute(
+            select(ScheduleSlot.id, ScheduleSlot.start_time, ScheduleSlot.end_time).where(
+                ScheduleSlot.doctor_id == doctor_id,
+                ScheduleSlot.start_time >= first,
+                ScheduleSlot.start_time < last,
+            )
+        )
+        if start.date() in wanted_days
+    }
+    stale = [slot_id for slot, slot_id in existing.items() if slot not in desired]
+    if stale:
+        await db.execute(delete(ScheduleSlot).where(ScheduleSlot.id.in_(stale)))
+    new = sorted(desired - existing.keys())
+    if new:
+        await db.execute(
+            insert(ScheduleSlot),
+            [{"doctor_id": doctor_id, "start_time": start, "end_time": end} for start, end in new],
+        )
+
+
+async def scheduled_starts(
+    db: AsyncSession, doctor_ids: Iterable[int], times: Iterable[datetime.datetime]
+) -> Set[Tuple[int, datetime.datetime]]:
+    """
+    Return the (doctor_id, start) pairs among `doctor_ids` x `times` that are materialized slots.
+    """
+    return set(
+        (await db.execute(
+            select(ScheduleSlot.doctor_id, ScheduleSlot.start_time).where(
+                ScheduleSlot.doctor_id.in_(list(doctor_ids)),
+                ScheduleSlot.start_time.in_(list(times)),
+            )
+        )).tuples()
+    )
+
+
+async def free_slots(
+    db: AsyncSession, doctor_id: int, start: datetime.datetime, end: datetime.datetime
+) -> List[Slot]:
+    """
+    The doctor's slots that lie within [start, end) and that no appointment holds.
+    """
+    rows = await db.execute(
+        select(ScheduleSlot.start_time, ScheduleSlot.end_time)
+        .outerjoin(
+            AppointmentModel,
+            and_(
+                AppointmentModel.doctor_id == ScheduleSlot.doctor_id,
+                AppointmentModel.active_slot == ScheduleSlot.start_time,
+            ),
+        )
+        .where(
+            ScheduleSlot.doctor_id == doctor_id,
+            ScheduleSlot.start_time >= start,
+            ScheduleSlot.end_time <= end,
+            AppointmentModel.id.is_(None),
+        )
+        .order_by(ScheduleSlot.start_time)
+    )
+    return [tuple(row) for row in rows]
+
+
+def covering_runs(slots: List[Slot], length: datetime.timedelta) -> List[Slot]:
+    """
+    The (start, start + length) spans covered by back-to-back slots of `slots` (sorted by
+    start), one per slot that starts such a run, e.g. for appointments longer than a slot.
+    """
+    runs = []
+    run_end = next_start = None
+    # Walking backwards, run_end is where the back-to-back run starting at each slot ends.
+    for slot_start, slot_end in reversed(slots):
+        if slot_end != next_start:
+            run_end = slot_end
+        next_start = slot_start
+        if run_end - slot_start >= length:
+            runs.append((slot_start, slot_start + length))
+    runs.reverse()
+    return runs
+
+
+async def doctors_with_free_slot(
+    db: AsyncSession, doctor_ids: Iterable[int], day: datetime.date, at: Optional[datetime.time] = None
+) -> Set[int]:
+    """
+    The doctors among `doctor_ids` with a free slot on `day`, or with one that covers `at` on that day.
+    """
+    if at is not None:
+        moment = datetime.datetime.combine(day, at)
+        window = and_(ScheduleSlot.start_time <= moment, ScheduleSlot.end_time > moment)
+    else:
+        window = and_(
+            ScheduleSlot.start_time >= datetime.datetime.combine(day, datetime.time.min),
+            ScheduleSlot.start_time < datetime.datetime.combine(day + datetime.timedelta(days=1), datetime.time.min),
+        )
+    return set((await db.scalars(
+        select(ScheduleSlot.doctor_id)
+        .distinct()
+        .outerjoin(
+            AppointmentModel,
+            and_(
+                AppointmentModel.doctor_id == ScheduleSlot.doctor_id,
+                AppointmentModel.active_slot == ScheduleSlot.start_time,
+            ),
+        )
+        .where(ScheduleSlot.doctor_id.in_(list(doctor_ids)), window, AppointmentModel.id.is_(None))
+    )).all())
+
+
+async def enqueue_schedule_extension(db: AsyncSession) -> None:
+    """
+    Queue the daily schedule extension for the coming midnight, unless it is already queued.
+    """
+    tomorrow = now().date() + datetime.timedelta(days=1)
+    await enqueue(
+        db,
+        EXTEND_SCHEDULES,
+        {},
+        idempotency_key=f"schedule-extension:{tomorrow}",
+        run_at=datetime.datetime.combine(tomorrow, datetime.time.min),
+    )
+
+
+@job_handler(EXTEND_SCHEDULES)
+async def extend_schedules(payloads: List[dict]) -> None:
+    """
+    Runs daily: queues the next run, then drops slots of past days and materializes the
+    day that entered the horizon for every doctor. The next run is queued first, so a run
+    that keeps failing does not stop the ones after it; nothing else queues them. The whole
+    horizon is regenerated, which only writes what changed and fills any days a missed run left out.
+    """
+    dates = horizon_dates()
+    async with session() as db:
+        await enqueue_schedule_extension(db)
+        await db.commit()
+        await db.execute(
+            delete(ScheduleSlot).where(ScheduleSlot.start_time < datetime.datetime.combine(dates[0], datetime.time.min))
+        )
+        doctor_ids = (await db.scalars(
+            union(select(AvailabilityModel.doctor_id), select(AvailabilityException.doctor_id))
+        )).all()
+        await db.commit()
+
+        for doctor_id in doctor_ids:
+            try:
+                await regenerate_schedule(db, doctor_id, dates)
+                # One short transaction per doctor.
+                await db.commit()
+            except IntegrityError:
+                # The doctor changed their availability meanwhile, which regenerated the schedule anyway.
+                await db.rollback()
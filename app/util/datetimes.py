@@ -0,0 +1,13 @@
+import datetime
+from typing import Optional
+
+
+def to_local_naive(value: Optional[datetime.datetime]) -> Optional[datetime.datetime]:
+    """
+    Appointment times are stored as naive server-local datetimes (see app.services.jobs.now).
+    A timezone-aware value is converted to that time before its offset is dropped, so
+    "09:00+05:00" and "04:00Z" mean the same moment. Naive values are taken as local already.
+    """
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone().replace(tzinfo=None)
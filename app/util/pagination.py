@@ -0,0 +1,47 @@
+import base64
+import datetime
+import json
+from typing import Any, List, Sequence
+
+from sqlalchemy import and_, or_
+from sqlalchemy.sql import ColumnElement
+
+
+def encode_cursor(*values: Any) -> str:
+    """
+    Encode the sort key of the last row of a page into an opaque cursor.
+    """
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime.datetime) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> List[Any]:
+    """
+    Inverse of encode_cursor. Raises ValueError for anything that was not produced by it.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list):
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def is_id(value: Any) -> bool:
+    """
+    Whether a value decoded from a cursor is a row id. JSON booleans decode to bool, which is an int too.
+    """
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def keyset_after(columns: Sequence[ColumnElement], values: Sequence[Any]) -> ColumnElement:
+    """
+    Build `(c1, c2, ...) > (v1, v2, ...)` spelled out as OR/AND terms,
+    which MySQL can turn into an index range scan.
+    """
+    terms = []
+    for i, (column, value) in enumerate(zip(columns, values)):
+        equal_prefix = [c == v for c, v in zip(columns[:i], values[:i])]
+        terms.append(and_(*equal_prefix, column > value))
+    return or_(*terms)
@@ -0,0 +1,131 @@
+"""
+Micro-benchmark of the appointment report aggregation.
+
+Generates one doctor's appointment history and computes the report's counts two
+ways, reporting the best time of several repeats:
+
+  * loops:  one Python pass over the row tuples, which is what paging through
+            /appointments and aggregating on the client amounts to
+  * numpy:  compute_report over the AppointmentColumns arrays, which is what
+            GET /appointments/report does on a cache hit with new rows
+
+It also times loading the rows into arrays and merging a refresh of --changed rows.
+
+    python -m benchmarks.analytics --appointments 1000000
+"""
+import argparse
+import bisect
+import datetime
+import random
+import statistics
+import time
+
+from app.core.config import settings
+from app.models.appointment import AppointmentStatus
+from app.models.availability import DayOfWeek
+from app.services.analytics import LEAD_TIME_EDGES_HOURS, STATUSES, AppointmentColumns, _to_arrays, compute_report
+
+START = datetime.date(2030, 1, 7)
+# Monday to Friday, 9 to 17, in 30 minute slots.
+TEMPLATE = tuple((day, datetime.time(9), datetime.time(17), 30) for day in list(DayOfWeek)[:5])
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--appointments", type=int, default=1000000)
+    parser.add_argument("--weeks", type=int, default=52)
+    parser.add_argument("--changed", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args()
+
+
+def build_rows(count: int, weeks: int, rng: random.Random):
+    rows = []
+    for i in range(count):
+        day = START + datetime.timedelta(days=rng.randrange(weeks * 7))
+        appointment_time = datetime.datetime.combine(day, datetime.time(rng.randrange(8, 18), rng.choice([0, 30])))
+        created = appointment_time - datetime.timedelta(minutes=rng.randrange(10, 60 * 24 * 40))
+        appointment_status = rng.choice(STATUSES)
+        updated = created
+        if appointment_status == AppointmentStatus.CANCELLED:
+            updated = created + (appointment_time - created) * rng.random()
+        rows.append((i + 1, appointment_time, created, updated, appointment_status))
+    return rows
+
+
+def loops(rows, start: datetime.date, end: datetime.date) -> dict:
+    first = datetime.datetime.combine(start, datetime.time.min)
+    last = datetime.datetime.combine(end, datetime.time.min)
+    late = datetime.timedelta(hours=settings.LATE_CANCELLATION_HOURS)
+    status_counts = {status: 0 for status in STATUSES}
+    status_by_hour = {status: [0] * 24 for status in STATUSES}
+    booked = [[0] * 24 for _ in range(7)]
+    late_cancellations = 0
+    leads = []
+    for _, appointment_time, created, updated, appointment_status in rows:
+        if not first <= appointment_time < last:
+            continue
+        status_counts[appointment_status] += 1
+        status_by_hour[appointment_status][appointment_time.hour] += 1
+        if appointment_status == AppointmentStatus.CANCELLED:
+            late_cancellations += appointment_time - updated < late
+        else:
+            booked[appointment_time.weekday()][appointment_time.hour] += 1
+        leads.append((appointment_time - created).total_seconds() / 3600)
+    lead_counts = [0] * len(LEAD_TIME_EDGES_HOURS)
+    for lead in leads:
+        lead_counts[bisect.bisect_right(LEAD_TIME_EDGES_HOURS, lead) - 1] += 1
+    return {
+        "status_counts": {status.value: count for status, count in status_counts.items()},
+        "status_by_hour": {status.value: hours for status, hours in status_by_hour.items()},
+        "late_cancellations": late_cancellations,
+        "booked": booked,
+        "lead_counts": lead_counts,
+        "p50": statistics.median(leads),
+    }
+
+
+def best_of(repeat: int, fn, *args) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(*args)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+    rows = build_rows(args.appointments, args.weeks, rng)
+    start, end = START, START + datetime.timedelta(weeks=args.weeks)
+
+    columns = AppointmentColumns()
+    columns.merge(_to_arrays(rows))
+    expected = loops(rows, start, end)
+    report = compute_report(columns, start, end, TEMPLATE)
+    assert report["status_counts"] == expected["status_counts"], "status counts differ"
+    assert report["status_by_hour"] == expected["status_by_hour"], "hourly counts differ"
+    assert round(report["late_cancellation_rate"] * report["total"]) == expected["late_cancellations"], \
+        "late cancellations differ"
+    assert report["lead_time"]["counts"] == expected["lead_counts"], "lead-time histogram differs"
+    assert abs(report["lead_time"]["p50_hours"] - expected["p50"]) < 1 / 60, "median lead time differs"
+
+    print(f"{args.appointments} appointments over {args.weeks} weeks, best of {args.repeat}\n")
+    print(f"{'path':<10}{'ms':>10}{'speedup':>10}")
+    baseline = best_of(args.repeat, loops, rows, start, end)
+    print(f"{'loops':<10}{baseline * 1000:>10.1f}{1:>9.1f}x")
+    elapsed = best_of(args.repeat, compute_report, columns, start, end, TEMPLATE)
+    print(f"{'numpy':<10}{elapsed * 1000:>10.1f}{baseline / elapsed:>9.1f}x")
+
+    load = best_of(args.repeat, lambda: AppointmentColumns().merge(_to_arrays(rows)))
+    changed = _to_arrays(rng.sample(rows, args.changed) + [
+        (args.appointments + i + 1, *rows[i][1:]) for i in range(args.changed)
+    ])
+    refresh = best_of(args.repeat, columns.merge, changed)
+    print(f"\nload {load * 1000:.1f} ms, refresh of {2 * args.changed} rows {refresh * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
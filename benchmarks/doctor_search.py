@@ -0,0 +1,107 @@
+"""
+Micro-benchmark of the "who is available at day/time" doctor search.
+
+Generates weekly availability for a number of doctors and answers the same
+queries three ways, reporting the best time of several repeats:
+
+  * scan:    check every doctor's availability rows, which is what the front end
+             did through one /doctors/{id} call per doctor
+  * bitmap:  AvailabilityBitmap lookup plus turning the whole mask into doctor ids
+  * page:    AvailabilityBitmap lookup plus reading one page (--limit) of doctor ids,
+             which is what GET /doctors?day=&time= does
+
+It also times building the bitmap and updating a single doctor in it.
+
+    python -m benchmarks.doctor_search --doctors 10000
+"""
+import argparse
+import datetime
+import random
+import time
+
+from app.models.availability import DayOfWeek
+from app.services.doctor_search import AvailabilityBitmap
+
+WORKDAYS = list(DayOfWeek)[:6]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--doctors", type=int, default=10000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args()
+
+
+def build_rows(doctors: int, rng: random.Random):
+    rows = []
+    for doctor_id in range(1, doctors + 1):
+        for day in rng.sample(WORKDAYS, 5):
+            start = rng.choice([7, 8, 9, 10, 12])
+            end = min(23, start + rng.choice([3, 4, 6, 8]))
+            rows.append((doctor_id, day, datetime.time(start, rng.choice([0, 30])), datetime.time(end)))
+    return rows
+
+
+def scan(rows, queries):
+    return [
+        sorted({doctor_id for doctor_id, row_day, start, end in rows if row_day == day and start <= at < end})
+        for day, at in queries
+    ]
+
+
+def bitmap_search(bitmap, queries):
+    return [bitmap.doctors(bitmap.available_at(day, at)) for day, at in queries]
+
+
+def bitmap_page(bitmap, queries, limit):
+    return [bitmap.doctors(bitmap.available_at(day, at), limit=limit) for day, at in queries]
+
+
+def best_of(repeat: int, fn, *args) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(*args)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+    rows = build_rows(args.doctors, rng)
+    queries = [
+        (rng.choice(WORKDAYS), datetime.time(rng.randrange(7, 20), rng.choice([0, 15, 30, 45])))
+        for _ in range(args.queries)
+    ]
+
+    build = best_of(args.repeat, AvailabilityBitmap.build, rows)
+    bitmap = AvailabilityBitmap.build(rows)
+    expected = scan(rows, queries)
+    assert bitmap_search(bitmap, queries) == expected, "bitmap results differ from the scan"
+    assert bitmap_page(bitmap, queries, args.limit) == [ids[:args.limit] for ids in expected], "pages differ from the scan"
+
+    print(f"{args.doctors} doctors ({len(rows)} availability rows), {args.queries} queries, best of {args.repeat}\n")
+    scan_time = best_of(args.repeat, scan, rows, queries)
+    print(f"{'path':<10}{'ms/query':>12}{'speedup':>10}")
+    for name, fn, fn_args in [
+        ("scan", scan, (rows, queries)),
+        ("bitmap", bitmap_search, (bitmap, queries)),
+        ("page", bitmap_page, (bitmap, queries, args.limit)),
+    ]:
+        elapsed = scan_time if fn is scan else best_of(args.repeat, fn, *fn_args)
+        print(f"{name:<10}{elapsed * 1000 / args.queries:>12.3f}{scan_time / elapsed:>9.1f}x")
+
+    new_hours = [(DayOfWeek.MONDAY, datetime.time(9), datetime.time(17)), (DayOfWeek.FRIDAY, datetime.time(9), datetime.time(13))]
+    started = time.perf_counter()
+    for _ in range(args.queries):
+        bitmap.set_doctor(rng.randint(1, args.doctors), new_hours)
+    update = (time.perf_counter() - started) / args.queries
+    print(f"\nbuild {build * 1000:.1f} ms, single-doctor update {update * 1000:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,353 @@
+"""
+Load test for the Doctor Appointment API.
+
+Seeds doctors, patients and availability through the public API, then replays a
+weighted mix of operations (benchmarks/workload.jsonl) with concurrent clients.
+Reports p50/p95/p99 latency, throughput and DB queries per operation and writes
+the numbers to benchmarks/results/ so runs can be compared between commits.
+
+    # In-process through an ASGI client, against a throwaway SQLite file
+    python -m benchmarks.load_test --mode inprocess --requests 2000 --concurrency 20
+
+    # Over HTTP against a running server (e.g. docker-compose up)
+    python -m benchmarks.load_test --mode http --base-url http://localhost:8000
+
+    # Fail if any operation's p95 got more than 20% slower than a stored run
+    python -m benchmarks.load_test --baseline benchmarks/results/<previous>.json
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import pathlib
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter, defaultdict
+
+import httpx
+
+BENCH_DIR = pathlib.Path(__file__).resolve().parent
+PASSWORD = "benchmark-password"
+API = "/api/v1"
+
+# Statuses that are a normal outcome for an operation, e.g. a 409 when two
+# simulated patients race for the same slot. Anything else counts as an error.
+EXPECTED_STATUSES = {
+    "login": {200},
+    "register": {201},
+    "list_doctors": {200},
+    "doctor_details": {200, 304},
+    "doctor_slots": {200},
+    "book": {201, 400, 409},
+    "cancel": {200, 400},
+    "list_appointments": {200},
+}
+
+# The API reports per-request DB work in its Server-Timing header.
+SERVER_TIMING_QUERIES = re.compile(r'db;dur=[\d.]+;desc="(\d+) queries"')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["inprocess", "http"], default="inprocess")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--database-url", help="In-process mode only; defaults to a temporary SQLite file.")
+    parser.add_argument("--workload", default=str(BENCH_DIR / "workload.jsonl"))
+    parser.add_argument("--doctors", type=int, default=20)
+    parser.add_argument("--patients", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output-dir", default=str(BENCH_DIR / "results"))
+    parser.add_argument("--baseline", help="Earlier results file to compare p95 latency against.")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Allowed p95 slowdown, as a fraction.")
+    return parser.parse_args()
+
+
+def load_workload(path: str):
+    ops, weights = [], []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                if entry["op"] not in EXPECTED_STATUSES:
+                    raise SystemExit(f"Unknown operation in workload: {entry['op']}")
+                ops.append(entry["op"])
+                weights.append(entry["weight"])
+    return ops, weights
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class Harness:
+    def __init__(self, client: httpx.AsyncClient, rng: random.Random):
+        self.client = client
+        self.rng = rng
+        self.run_id = uuid.uuid4().hex[:8]
+        self.doctor_ids = []
+        self.doctor_headers = []
+        self.patients = []  # (email, headers)
+        self.booked = defaultdict(list)  # patient index -> appointment ids
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.queries = defaultdict(list)
+
+    # --- Seeding ---
+
+    async def _register(self, email: str, role: str) -> dict:
+        response = await self.client.post(f"{API}/auth/register", json={"email": email, "password": PASSWORD, "role": role})
+        response.raise_for_status()
+        return response.json()
+
+    async def _token_headers(self, email: str) -> dict:
+        response = await self.client.post(f"{API}/auth/login", json={"email": email, "password": PASSWORD})
+        response.raise_for_status()
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    async def seed(self, doctors: int, patients: int, concurrency: int):
+        semaphore = asyncio.Semaphore(concurrency)
+        weekdays = ["monday", "tuesday", "wednesday", "thursday", "friday"]
+
+        async def seed_doctor(i):
+            async with semaphore:
+                email = f"doctor{i}-{self.run_id}@bench.io"
+                user = await self._register(email, "doctor")
+                headers = await self._token_headers(email)
+                response = await self.client.post(
+                    f"{API}/availability",
+                    json=[{"day_of_week": day, "start_time": "08:00:00", "end_time": "18:00:00"} for day in weekdays],
+                    headers=headers,
+                )
+                response.raise_for_status()
+                return user["id"], headers
+
+        async def seed_patient(i):
+            async with semaphore:
+                email = f"patient{i}-{self.run_id}@bench.io"
+                await self._register(email, "patient")
+                return email, await self._token_headers(email)
+
+        for doctor_id, headers in await asyncio.gather(*(seed_doctor(i) for i in range(doctors))):
+            self.doctor_ids.append(doctor_id)
+            self.doctor_headers.append(headers)
+        self.patients = list(await asyncio.gather(*(seed_patient(i) for i in range(patients))))
+
+    # --- Operations ---
+
+    def _random_slot(self) -> datetime.datetime:
+        # Stays inside the default 8-week schedule horizon, also after skipping a weekend.
+        day = datetime.date.today() + datetime.timedelta(days=self.rng.randint(1, 52))
+        while day.weekday() >= 5:
+            day += datetime.timedelta(days=1)
+        minutes = 8 * 60 + 30 * self.rng.randrange(20)
+        return datetime.datetime.combine(day, datetime.time(minutes // 60, minutes % 60))
+
+    async def run_op(self, op: str):
+        rng = self.rng
+        patient_index = rng.randrange(len(self.patients))
+        patient_email, patient_headers = self.patients[patient_index]
+        doctor_index = rng.randrange(len(self.doctor_ids))
+        doctor_id = self.doctor_ids[doctor_index]
+
+        if op == "login":
+            request = self.client.post(f"{API}/auth/login", json={"email": patient_email, "password": PASSWORD})
+        elif op == "register":
+            email = f"new-{uuid.uuid4().hex[:12]}@bench.io"
+            request = self.client.post(f"{API}/auth/register", json={"email": email, "password": PASSWORD, "role": "patient"})
+        elif op == "list_doctors":
+            request = self.client.get(f"{API}/doctors", headers=patient_headers)
+        elif op == "doctor_details":
+            request = self.client.get(f"{API}/doctors/{doctor_id}", headers=patient_headers)
+        elif op == "doctor_slots":
+            start = self._random_slot().replace(hour=0, minute=0)
+            request = self.client.get(
+                f"{API}/doctors/{doctor_id}/slots",
+                params={"from": start.isoformat(), "to": (start + datetime.timedelta(days=7)).isoformat()},
+                headers=patient_headers,
+            )
+        elif op == "book":
+            request = self.client.post(
+                f"{API}/book-appointments",
+                json={"doctor_id": doctor_id, "appointment_time": self._random_slot().isoformat()},
+                headers=patient_headers,
+            )
+        elif op == "cancel":
+            if not self.booked[patient_index]:
+                return await self.run_op("book")
+            appointment_id = self.booked[patient_index].pop()
+            request = self.client.patch(f"{API}/appointments/{appointment_id}/cancel", headers=patient_headers)
+        else:  # list_appointments
+            request = self.client.get(f"{API}/appointments", headers=self.doctor_headers[doctor_index])
+
+        started = time.perf_counter()
+        try:
+            response = await request
+        except httpx.HTTPError:
+            self.statuses[op]["exception"] += 1
+            return
+        self.latencies[op].append(time.perf_counter() - started)
+        self.statuses[op][response.status_code] += 1
+
+        match = SERVER_TIMING_QUERIES.search(response.headers.get("server-timing", ""))
+        if match:
+            self.queries[op].append(int(match.group(1)))
+        if op == "book" and response.status_code == 201:
+            self.booked[patient_index].append(response.json()["id"])
+
+    async def replay(self, ops, weights, total: int, concurrency: int) -> float:
+        plan = self.rng.choices(ops, weights=weights, k=total)
+        queue = asyncio.Queue()
+        for op in plan:
+            queue.put_nowait(op)
+
+        async def worker():
+            while not queue.empty():
+                await self.run_op(queue.get_nowait())
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return time.perf_counter() - started
+
+    def report(self, duration: float) -> dict:
+        operations = {}
+        for op in sorted(self.statuses):
+            latencies = sorted(self.latencies[op])
+            statuses = self.statuses[op]
+            operations[op] = {
+                "count": sum(statuses.values()),
+                "errors": sum(n for code, n in statuses.items() if code not in EXPECTED_STATUSES[op]),
+                "statuses": {str(code): n for code, n in statuses.items()},
+                "mean_ms": round(1000 * sum(latencies) / len(latencies), 2) if latencies else None,
+                "p50_ms": round(1000 * percentile(latencies, 0.50), 2) if latencies else None,
+                "p95_ms": round(1000 * percentile(latencies, 0.95), 2) if latencies else None,
+                "p99_ms": round(1000 * percentile(latencies, 0.99), 2) if latencies else None,
+                "queries_per_request": (
+                    round(sum(self.queries[op]) / len(self.queries[op]), 2) if self.queries[op] else None
+                ),
+            }
+        total = sum(op["count"] for op in operations.values())
+        return {
+            "operations": operations,
+            "total": {
+                "requests": total,
+                "errors": sum(op["errors"] for op in operations.values()),
+                "duration_s": round(duration, 3),
+                "throughput_rps": round(total / duration, 1) if duration else None,
+            },
+        }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_report(report: dict):
+    print(f"{'operation':<20}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}")
+    for op, row in report["operations"].items():
+        print(
+            f"{op:<20}{row['count']:>7}{row['errors']:>8}"
+            f"{row['p50_ms'] or '-':>10}{row['p95_ms'] or '-':>10}{row['p99_ms'] or '-':>10}"
+            f"{row['queries_per_request'] if row['queries_per_request'] is not None else '-':>9}"
+        )
+    total = report["total"]
+    print(f"\n{total['requests']} requests, {total['errors']} errors in {total['duration_s']}s "
+          f"({total['throughput_rps']} req/s)")
+
+
+def compare_with_baseline(report: dict, baseline_path: str, max_regression: float) -> bool:
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    ok = True
+    print(f"\nCompared with {baseline_path} ({baseline.get('commit')}):")
+    for op, row in report["operations"].items():
+        before = baseline["operations"].get(op, {}).get("p95_ms")
+        if not before or row["p95_ms"] is None:
+            continue
+        change = (row["p95_ms"] - before) / before
+        flag = "REGRESSION" if change > max_regression else ""
+        ok = ok and not flag
+        print(f"  {op:<20} p95 {before:>8} -> {row['p95_ms']:>8} ms ({change:+.0%}) {flag}")
+    return ok
+
+
+async def run(args) -> dict:
+    ops, weights = load_workload(args.workload)
+    rng = random.Random(args.seed)
+
+    if args.mode == "http":
+        async with httpx.AsyncClient(base_url=args.base_url, timeout=60) as client:
+            harness = Harness(client, rng)
+            await harness.seed(args.doctors, args.patients, args.concurrency)
+            duration = await harness.replay(ops, weights, args.requests, args.concurrency)
+            return harness.report(duration)
+
+    # The app reads DATABASE_URL at import time, so import it only now.
+    from app.db.base import Base
+    from app.db.database import engine
+    from app.main import app
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            harness = Harness(client, rng)
+            await harness.seed(args.doctors, args.patients, args.concurrency)
+            duration = await harness.replay(ops, weights, args.requests, args.concurrency)
+            return harness.report(duration)
+
+
+def main():
+    args = parse_args()
+    if args.mode == "inprocess":
+        workdir = tempfile.mkdtemp()
+        os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{workdir}/bench.db"
+        os.environ.setdefault("MAIL_FILE_PATH", f"{workdir}/outbox.jsonl")
+        # Every simulated client shares one address, which the auth rate limits would throttle.
+        os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+    report = asyncio.run(run(args))
+    report.update({
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "mode": args.mode,
+        "config": {
+            "doctors": args.doctors,
+            "patients": args.patients,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "workload": os.path.relpath(args.workload, BENCH_DIR.parent),
+        },
+    })
+    print_report(report)
+
+    output_dir = pathlib.Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    output = output_dir / f"{stamp}-{report['commit']}-{args.mode}.json"
+    output.write_text(json.dumps(report, indent=2))
+    print(f"Results written to {output}")
+
+    if args.baseline and not compare_with_baseline(report, args.baseline, args.max_regression):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
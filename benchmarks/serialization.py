@@ -0,0 +1,112 @@
+"""
+Micro-benchmark of the appointment listing serialization paths.
+
+Renders the same page of appointments three ways and reports the best time of
+several repeats:
+
+  * orm+stdlib:      ORM entities validated into Page[AppointmentOut] (from_attributes),
+                     dumped to JSON-able data and encoded with the stdlib, which is what
+                     FastAPI does with a response_model and the default JSONResponse
+  * adapter+orjson:  the same validated page rendered by FastJSONResponse, i.e. a cached
+                     TypeAdapter and orjson
+  * rows+orjson:     row tuples as selected by appointment_rows_query, nested with
+                     row_to_appointment and rendered by FastJSONResponse without validation
+
+    python -m benchmarks.serialization --appointments 10000
+"""
+import argparse
+import datetime
+import json
+import time
+from collections import namedtuple
+
+from fastapi.responses import JSONResponse
+
+from app.api.responses import FastJSONResponse, type_adapter
+# Imports every model, so the mappers can be configured.
+from app.db.base import Appointment as AppointmentModel, User as UserModel
+from app.models.appointment import AppointmentOut, AppointmentStatus
+from app.models.pagination import Page
+from app.models.roles import Role
+from app.services.appointments import appointment_rows_query, row_to_appointment
+
+AppointmentRow = namedtuple("AppointmentRow", appointment_rows_query(0).selected_columns.keys())
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--appointments", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    return parser.parse_args()
+
+
+def build_data(count: int):
+    doctor = UserModel(id=1, email="doctor@example.com", password="x", role=Role.DOCTOR)
+    patients = [
+        UserModel(id=2 + i, email=f"patient{i}@example.com", password="x", role=Role.PATIENT) for i in range(100)
+    ]
+    start = datetime.datetime(2030, 1, 7, 9, 0)
+    appointments, rows = [], []
+    for i in range(count):
+        patient = patients[i % len(patients)]
+        appointment_time = start + datetime.timedelta(minutes=30 * i)
+        appointment_status = AppointmentStatus.SCHEDULED if i % 5 else AppointmentStatus.CANCELLED
+        # Not added to a session; the relationships are only read.
+        appointment = AppointmentModel(id=i + 1, appointment_time=appointment_time, status=appointment_status)
+        appointment.doctor, appointment.patient = doctor, patient
+        appointments.append(appointment)
+        rows.append(AppointmentRow(
+            i + 1, appointment_time, appointment_status,
+            doctor.id, doctor.email, doctor.role, patient.id, patient.email, patient.role,
+        ))
+    return appointments, rows
+
+
+def orm_stdlib(appointments) -> bytes:
+    page = Page[AppointmentOut](items=appointments, next_cursor=None)
+    return JSONResponse(page.model_dump(mode="json")).body
+
+
+def adapter_orjson(appointments) -> bytes:
+    page = type_adapter(Page[AppointmentOut]).validate_python({"items": appointments, "next_cursor": None}, from_attributes=True)
+    return FastJSONResponse(page).body
+
+
+def rows_orjson(rows) -> bytes:
+    return FastJSONResponse({"items": [row_to_appointment(row) for row in rows], "next_cursor": None}).body
+
+
+def best_of(repeat: int, fn, data) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(data)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    args = parse_args()
+    appointments, rows = build_data(args.appointments)
+
+    paths = [
+        ("orm+stdlib", orm_stdlib, appointments),
+        ("adapter+orjson", adapter_orjson, appointments),
+        ("rows+orjson", rows_orjson, rows),
+    ]
+    # All paths must render the same document.
+    expected = json.loads(orm_stdlib(appointments))
+    for name, fn, data in paths[1:]:
+        assert json.loads(fn(data)) == expected, f"{name} output differs"
+
+    print(f"{args.appointments} appointments, best of {args.repeat}\n")
+    print(f"{'path':<18}{'ms':>10}{'speedup':>10}")
+    baseline = None
+    for name, fn, data in paths:
+        elapsed = best_of(args.repeat, fn, data)
+        baseline = baseline or elapsed
+        print(f"{name:<18}{elapsed * 1000:>10.1f}{baseline / elapsed:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
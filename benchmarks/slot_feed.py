@@ -0,0 +1,294 @@
+"""
+Load test of the slot change feed with many idle subscribers on one worker.
+
+Starts a server against a throwaway SQLite file, opens --subscribers event streams
+(the last --websockets of them as WebSockets) on one doctor's feed and measures:
+
+  * memory:    growth of the server's resident set per open subscription
+  * fan-out:   time from sending a booking until each subscriber has its event,
+               over --events bookings --interval seconds apart (p50/p99/max across
+               all deliveries)
+  * heartbeat: whether every subscriber got a heartbeat while the feed was idle
+
+Results are written to benchmarks/results/ like the other benchmarks'.
+
+    python -m benchmarks.slot_feed --subscribers 5000 --websockets 500
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import pathlib
+import resource
+import shlex
+import statistics
+import subprocess
+import tempfile
+import time
+
+import httpx
+import websockets
+
+from benchmarks.load_test import git_commit
+from benchmarks.startup import DEFAULT_COMMAND, free_port
+
+BENCH_DIR = pathlib.Path(__file__).resolve().parent
+ROOT_DIR = BENCH_DIR.parent
+PASSWORD = "benchmark-password"
+API = "/api/v1"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscribers", type=int, default=2000)
+    parser.add_argument("--websockets", type=int, default=200, help="How many of the subscribers use a WebSocket.")
+    parser.add_argument("--events", type=int, default=20)
+    parser.add_argument("--interval", type=float, default=1.0, help="Seconds between bookings.")
+    parser.add_argument("--heartbeat", type=float, default=2.0, help="SLOT_FEED_HEARTBEAT_SECONDS for the server.")
+    parser.add_argument("--concurrency", type=int, default=200, help="Subscriptions opened at a time.")
+    parser.add_argument("--command", default=DEFAULT_COMMAND, help="Server command line; {port} is substituted.")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--output-dir", default=str(BENCH_DIR / "results"))
+    return parser.parse_args()
+
+
+def rss_kib(pid: int):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def percentile(samples, fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Subscriber:
+    """
+    One client on the feed, recording when each booked slot reached it and how many
+    heartbeats it got.
+    """
+
+    def __init__(self):
+        self.received = {}  # slot -> perf_counter() when its event arrived
+        self.heartbeats = 0
+
+    def on_event(self, payload: str) -> None:
+        event = json.loads(payload)
+        if event["op"] == "heartbeat":
+            self.heartbeats += 1
+        elif event["op"] == "booked":
+            for slot in event["slots"]:
+                self.received[slot] = time.perf_counter()
+
+    async def stream(self, port: int, path: str, token: str, ready: asyncio.Event) -> None:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(
+            f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nAccept: text/event-stream\r\n"
+            f"Authorization: Bearer {token}\r\n\r\n".encode()
+        )
+        status_line = await reader.readline()
+        if b" 200 " not in status_line:
+            raise RuntimeError(f"Subscribing failed: {status_line.decode().strip()}")
+        try:
+            # Each event arrives as one chunk of the chunked body; the chunk-size lines
+            # and the blank lines between events are skipped.
+            while line := await reader.readline():
+                if line.startswith(b"retry:"):
+                    ready.set()
+                elif line.startswith(b"data: "):
+                    self.on_event(line[6:].decode())
+                elif line.startswith(b": heartbeat"):
+                    self.heartbeats += 1
+        finally:
+            writer.close()
+
+    async def websocket(self, port: int, path: str, token: str, ready: asyncio.Event) -> None:
+        async with websockets.connect(
+            f"ws://127.0.0.1:{port}{path}", additional_headers={"Authorization": f"Bearer {token}"}
+        ) as websocket:
+            ready.set()
+            async for message in websocket:
+                self.on_event(message)
+
+
+async def seed(client: httpx.AsyncClient) -> tuple:
+    tokens, ids = {}, {}
+    for role in ("doctor", "patient"):
+        email = f"{role}@bench.io"
+        response = await client.post(f"{API}/auth/register", json={"email": email, "password": PASSWORD, "role": role})
+        response.raise_for_status()
+        ids[role] = response.json()["id"]
+        response = await client.post(f"{API}/auth/login", json={"email": email, "password": PASSWORD})
+        response.raise_for_status()
+        tokens[role] = response.json()["access_token"]
+    days = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+    response = await client.post(
+        f"{API}/availability",
+        json=[{"day_of_week": day, "start_time": "00:00:00", "end_time": "23:30:00"} for day in days],
+        headers={"Authorization": f"Bearer {tokens['doctor']}"},
+    )
+    response.raise_for_status()
+    return ids["doctor"], tokens["patient"]
+
+
+async def run(args, port: int, server: subprocess.Popen) -> dict:
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=60) as client:
+        doctor_id, token = await seed(client)
+        path = f"{API}/doctors/{doctor_id}/slots"
+
+        rss_before = rss_kib(server.pid)
+        subscribers = [Subscriber() for _ in range(args.subscribers)]
+        semaphore = asyncio.Semaphore(args.concurrency)
+        tasks = []
+        started = time.perf_counter()
+
+        async def subscribe(i: int, subscriber: Subscriber) -> None:
+            ready = asyncio.Event()
+            async with semaphore:
+                if i >= args.subscribers - args.websockets:
+                    task = asyncio.create_task(subscriber.websocket(port, f"{path}/ws", token, ready))
+                else:
+                    task = asyncio.create_task(subscriber.stream(port, f"{path}/events", token, ready))
+                tasks.append(task)
+                subscribed = asyncio.ensure_future(ready.wait())
+                # Whichever finishes first: subscribed, or failed trying.
+                await asyncio.wait([task, subscribed], return_when=asyncio.FIRST_COMPLETED)
+                subscribed.cancel()
+            if task.done():
+                task.result()
+
+        await asyncio.gather(*(subscribe(i, subscriber) for i, subscriber in enumerate(subscribers)))
+        subscribe_seconds = time.perf_counter() - started
+        await asyncio.sleep(1)
+        rss_after = rss_kib(server.pid)
+
+        # Idle for a little over a heartbeat interval, then check that everyone got one.
+        await asyncio.sleep(args.heartbeat * 1.5)
+        missed_heartbeats = sum(1 for subscriber in subscribers if not subscriber.heartbeats)
+
+        today = datetime.date.today()
+        first = datetime.datetime.combine(today + datetime.timedelta(days=1), datetime.time())
+        sent, booking_latencies = {}, []
+        for i in range(args.events):
+            slot = (first + datetime.timedelta(minutes=30 * i)).isoformat()
+            sent[slot] = time.perf_counter()
+            response = await client.post(
+                f"{API}/book-appointments",
+                json={"doctor_id": doctor_id, "appointment_time": slot},
+                headers={"Authorization": f"Bearer {token}"},
+            )
+            response.raise_for_status()
+            booking_latencies.append(time.perf_counter() - sent[slot])
+            await asyncio.sleep(args.interval)
+        await asyncio.sleep(2)
+
+        fan_out = [
+            subscriber.received[slot] - at
+            for subscriber in subscribers
+            for slot, at in sent.items()
+            if slot in subscriber.received
+        ]
+        expected = len(subscribers) * len(sent)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    per_subscriber = (rss_after - rss_before) / len(subscribers) if rss_before and rss_after else None
+    return {
+        "subscribers": args.subscribers,
+        "websockets": args.websockets,
+        "subscribe_seconds": round(subscribe_seconds, 2),
+        "rss_before_mib": round(rss_before / 1024, 1) if rss_before else None,
+        "rss_after_mib": round(rss_after / 1024, 1) if rss_after else None,
+        "rss_per_subscriber_kib": round(per_subscriber, 1) if per_subscriber is not None else None,
+        "missed_heartbeats": missed_heartbeats,
+        "events": len(sent),
+        "delivered": len(fan_out),
+        "lost": expected - len(fan_out),
+        "booking_p50_ms": round(statistics.median(booking_latencies) * 1000, 1),
+        "fan_out_p50_ms": round(percentile(fan_out, 0.5) * 1000, 1) if fan_out else None,
+        "fan_out_p99_ms": round(percentile(fan_out, 0.99) * 1000, 1) if fan_out else None,
+        "fan_out_max_ms": round(max(fan_out) * 1000, 1) if fan_out else None,
+    }
+
+
+def start_server(command: str, env: dict, timeout: float) -> tuple:
+    port = free_port()
+    server = subprocess.Popen(
+        shlex.split(command.format(port=port)),
+        cwd=ROOT_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited with code {server.returncode} before becoming ready")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/readyz", timeout=1).status_code == 200:
+                return port, server
+        except httpx.TransportError:
+            pass
+        time.sleep(0.05)
+    server.kill()
+    raise RuntimeError(f"Server was not ready after {timeout}s")
+
+
+def main():
+    args = parse_args()
+    # Both ends need a descriptor per subscription; the server inherits the raised limit.
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = args.subscribers + 1024
+    if soft != resource.RLIM_INFINITY and soft < wanted:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (wanted if hard == resource.RLIM_INFINITY else min(wanted, hard), hard))
+
+    workdir = tempfile.mkdtemp()
+    env = dict(os.environ)
+    env["DATABASE_URL"] = f"sqlite:///{workdir}/slot_feed.db"
+    env["MAIL_FILE_PATH"] = f"{workdir}/outbox.jsonl"
+    env["RATE_LIMIT_ENABLED"] = "false"
+    env["SLOT_FEED_HEARTBEAT_SECONDS"] = str(args.heartbeat)
+    env["SLOT_FEED_MAX_SUBSCRIBERS"] = str(args.subscribers)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(ROOT_DIR), env.get("PYTHONPATH")]))
+    subprocess.run(["alembic", "upgrade", "head"], cwd=ROOT_DIR, env=env, check=True, capture_output=True)
+
+    port, server = start_server(args.command, env, args.timeout)
+    try:
+        report = asyncio.run(run(args, port, server))
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+    report.update({
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "command": args.command,
+    })
+    print(f"{report['subscribers']} subscribers ({report['websockets']} WebSockets), "
+          f"opened in {report['subscribe_seconds']} s")
+    print(f"server RSS {report['rss_before_mib']} -> {report['rss_after_mib']} MiB, "
+          f"{report['rss_per_subscriber_kib']} KiB per subscriber")
+    print(f"missed heartbeats: {report['missed_heartbeats']}")
+    print(f"{report['events']} bookings (p50 {report['booking_p50_ms']} ms), {report['delivered']} deliveries, "
+          f"{report['lost']} lost")
+    print(f"fan-out p50 {report['fan_out_p50_ms']} ms, p99 {report['fan_out_p99_ms']} ms, "
+          f"max {report['fan_out_max_ms']} ms")
+
+    output_dir = pathlib.Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    output = output_dir / f"{stamp}-{report['commit']}-slot-feed.json"
+    output.write_text(json.dumps(report, indent=2))
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Cold-start benchmark for the Doctor Appointment API.
+
+Each run starts a fresh server process and measures two things:
+
+  * import:  time to `import app.main` in a new interpreter
+  * ready:   time from spawning the server until it answers its first request
+
+Results are written to benchmarks/results/ like the load test's, so cold start
+can be tracked between commits.
+
+    # uvicorn against a throwaway SQLite file
+    python -m benchmarks.startup --runs 5
+
+    # Any other server command; {port} is substituted
+    python -m benchmarks.startup --command "gunicorn -c gunicorn.conf.py -b 127.0.0.1:{port} app.main:app"
+
+    # Fail if median time-to-ready got more than 20% slower than a stored run
+    python -m benchmarks.startup --baseline benchmarks/results/<previous>-startup.json
+"""
+import argparse
+import datetime
+import json
+import os
+import pathlib
+import shlex
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.load_test import git_commit
+
+BENCH_DIR = pathlib.Path(__file__).resolve().parent
+ROOT_DIR = BENCH_DIR.parent
+DEFAULT_COMMAND = f"{sys.executable} -m uvicorn app.main:app --host 127.0.0.1 --port {{port}}"
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--command", default=DEFAULT_COMMAND, help="Server command line; {port} is substituted.")
+    parser.add_argument("--ready-path", default="/readyz", help="Path polled until it returns 200.")
+    parser.add_argument("--database-url", help="Defaults to a temporary SQLite file.")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--output-dir", default=str(BENCH_DIR / "results"))
+    parser.add_argument("--baseline", help="Earlier startup results file to compare against.")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Allowed slowdown, as a fraction.")
+    return parser.parse_args()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_import(env: dict) -> float:
+    output = subprocess.check_output([sys.executable, "-c", IMPORT_SNIPPET], cwd=ROOT_DIR, env=env, text=True)
+    return float(output.strip().splitlines()[-1])
+
+
+def measure_ready(command: str, ready_path: str, env: dict, timeout: float) -> float:
+    port = free_port()
+    url = f"http://127.0.0.1:{port}{ready_path}"
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        shlex.split(command.format(port=port)),
+        cwd=ROOT_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            if server.poll() is not None:
+                raise RuntimeError(f"Server exited with code {server.returncode} before becoming ready")
+            try:
+                if httpx.get(url, timeout=1).status_code == 200:
+                    return time.perf_counter() - started
+            except httpx.TransportError:
+                pass
+            time.sleep(0.01)
+        raise RuntimeError(f"Server was not ready after {timeout}s")
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+def summarize(samples) -> dict:
+    return {
+        "min_ms": round(min(samples) * 1000, 1),
+        "median_ms": round(statistics.median(samples) * 1000, 1),
+        "max_ms": round(max(samples) * 1000, 1),
+    }
+
+
+def compare_with_baseline(report: dict, baseline_path: str, max_regression: float) -> bool:
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    ok = True
+    print(f"\nCompared with {baseline_path} ({baseline.get('commit')}):")
+    for phase in ("import", "ready"):
+        before = baseline.get(phase, {}).get("median_ms")
+        if not before:
+            continue
+        after = report[phase]["median_ms"]
+        change = (after - before) / before
+        flag = "REGRESSION" if change > max_regression else ""
+        ok = ok and not flag
+        print(f"  {phase:<8} median {before:>8} -> {after:>8} ms ({change:+.0%}) {flag}")
+    return ok
+
+
+def main():
+    args = parse_args()
+    env = dict(os.environ)
+    env["DATABASE_URL"] = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/startup.db"
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(ROOT_DIR), env.get("PYTHONPATH")]))
+
+    import_samples, ready_samples = [], []
+    for run in range(1, args.runs + 1):
+        import_samples.append(measure_import(env))
+        ready_samples.append(measure_ready(args.command, args.ready_path, env, args.timeout))
+        print(f"run {run}: import {import_samples[-1] * 1000:.1f} ms, ready {ready_samples[-1] * 1000:.1f} ms")
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "command": args.command,
+        "runs": args.runs,
+        "import": summarize(import_samples),
+        "ready": summarize(ready_samples),
+    }
+    print(f"\n{'phase':<8}{'min ms':>10}{'median ms':>12}{'max ms':>10}")
+    for phase in ("import", "ready"):
+        row = report[phase]
+        print(f"{phase:<8}{row['min_ms']:>10}{row['median_ms']:>12}{row['max_ms']:>10}")
+
+    output_dir = pathlib.Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    output = output_dir / f"{stamp}-{report['commit']}-startup.json"
+    output.write_text(json.dumps(report, indent=2))
+    print(f"Results written to {output}")
+
+    if args.baseline and not compare_with_baseline(report, args.baseline, args.max_regression):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
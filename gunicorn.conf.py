@@ -0,0 +1,34 @@
+"""
+Production server configuration: gunicorn managing uvicorn workers.
+
+    gunicorn -c gunicorn.conf.py app.main:app
+
+Every setting can be overridden from the environment (WEB_CONCURRENCY, BIND,
+GRACEFUL_TIMEOUT, ...). Workers share nothing but the database and, with
+CACHE_BACKEND=redis, the cache.
+"""
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+
+# One worker per core by default. The app splits DB_MAX_CONNECTIONS and the
+# bcrypt process pool between workers, so it needs to know how many there are.
+workers = int(os.environ.get("WEB_CONCURRENCY") or os.cpu_count() or 1)
+os.environ["WEB_CONCURRENCY"] = str(workers)
+
+worker_class = "uvicorn_worker.UvicornWorker"
+
+# On SIGTERM, workers stop accepting connections and get this long to finish
+# in-flight requests and run the lifespan shutdown before they are killed.
+graceful_timeout = int(os.environ.get("GRACEFUL_TIMEOUT", "30"))
+# A worker that stops heartbeating for this long is restarted.
+timeout = int(os.environ.get("WORKER_TIMEOUT", "60"))
+keepalive = int(os.environ.get("KEEPALIVE", "5"))
+
+# Not preloaded: each worker imports the app itself, so engines, pools and
+# caches are created after the fork and never shared between processes.
+preload_app = False
+
+accesslog = os.environ.get("ACCESS_LOG", "-")
+errorlog = "-"
+loglevel = os.environ.get("LOG_LEVEL", "info")
@@ -0,0 +1,72 @@
+"""initial schema
+
+The schema as `Base.metadata.create_all` built it before migrations were introduced.
+Databases created that way are brought under Alembic with `alembic stamp 0001`.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 14:08:04.298855
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'users',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('email', sa.String(length=100), nullable=False),
+        sa.Column('password', sa.String(length=255), nullable=False),
+        sa.Column('role', sa.Enum('DOCTOR', 'PATIENT', name='role'), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_users_email', 'users', ['email'], unique=True)
+    op.create_index('ix_users_id', 'users', ['id'], unique=False)
+
+    op.create_table(
+        'availabilities',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column(
+            'day_of_week',
+            sa.Enum('MONDAY', 'TUESDAY', 'WEDNESDAY', 'THURSDAY', 'FRIDAY', 'SATURDAY', 'SUNDAY', name='dayofweek'),
+            nullable=False,
+        ),
+        sa.Column('start_time', sa.Time(), nullable=False),
+        sa.Column('end_time', sa.Time(), nullable=False),
+        sa.Column('doctor_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['doctor_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_availabilities_id', 'availabilities', ['id'], unique=False)
+
+    op.create_table(
+        'appointments',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('appointment_time', sa.DateTime(), nullable=False),
+        sa.Column('status', sa.Enum('SCHEDULED', 'CANCELLED', 'COMPLETED', name='appointmentstatus'), nullable=False),
+        sa.Column('doctor_id', sa.Integer(), nullable=False),
+        sa.Column('patient_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['doctor_id'], ['users.id']),
+        sa.ForeignKeyConstraint(['patient_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_appointments_appointment_time', 'appointments', ['appointment_time'], unique=False)
+    op.create_index('ix_appointments_id', 'appointments', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('appointments')
+    op.drop_table('availabilities')
+    op.drop_table('users')
@@ -0,0 +1,65 @@
+"""token version, active slot and listing indexes
+
+Revision ID: 0001a
+Revises: 0001
+Create Date: 2026-10-18 16:02:11.508214
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001a'
+down_revision: Union[str, Sequence[str], None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('token_version', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('appointments', sa.Column('active_slot', sa.DateTime(), nullable=True))
+    # Existing bookings must hold their slots before the constraint exists, or they could be
+    # booked a second time. Where a slot was already double-booked, the oldest booking keeps it.
+    # (MySQL cannot select from the table it updates, hence the derived table.)
+    op.execute(
+        "UPDATE appointments SET active_slot = appointment_time "
+        "WHERE id IN (SELECT id FROM ("
+        "SELECT MIN(id) AS id FROM appointments WHERE status = 'SCHEDULED' GROUP BY doctor_id, appointment_time"
+        ") AS first_bookings)"
+    )
+    with op.batch_alter_table('appointments') as batch_op:
+        batch_op.create_unique_constraint('uq_appointments_doctor_active_slot', ['doctor_id', 'active_slot'])
+    op.create_index(
+        'ix_appointments_doctor_time_status', 'appointments', ['doctor_id', 'appointment_time', 'status'], unique=False
+    )
+    op.create_index('ix_appointments_patient_id', 'appointments', ['patient_id'], unique=False)
+    op.create_index('ix_availabilities_doctor_id', 'availabilities', ['doctor_id'], unique=False)
+
+
+def _restore_foreign_key_index(table: str, column: str) -> None:
+    # MySQL drops the index it created for a foreign key once another index can serve it,
+    # and refuses to drop the last one, so put back the one the original tables had.
+    bind = op.get_bind()
+    if bind.dialect.name != 'mysql':
+        return
+    if column not in {index['name'] for index in sa.inspect(bind).get_indexes(table)}:
+        op.create_index(column, table, [column], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _restore_foreign_key_index('availabilities', 'doctor_id')
+    _restore_foreign_key_index('appointments', 'doctor_id')
+    _restore_foreign_key_index('appointments', 'patient_id')
+    op.drop_index('ix_availabilities_doctor_id', table_name='availabilities')
+    op.drop_index('ix_appointments_patient_id', table_name='appointments')
+    op.drop_index('ix_appointments_doctor_time_status', table_name='appointments')
+    with op.batch_alter_table('appointments') as batch_op:
+        batch_op.drop_constraint('uq_appointments_doctor_active_slot', type_='unique')
+        batch_op.drop_column('active_slot')
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('token_version')
@@ -0,0 +1,83 @@
+"""materialized schedule
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 14:37:31.486762
+
+"""
+from typing import Sequence, Union
+
+import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, Sequence[str], None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('availabilities', sa.Column('slot_minutes', sa.Integer(), server_default='30', nullable=False))
+
+    op.create_table(
+        'availability_exceptions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('date', sa.Date(), nullable=False),
+        sa.Column('start_time', sa.Time(), nullable=True),
+        sa.Column('end_time', sa.Time(), nullable=True),
+        sa.Column('slot_minutes', sa.Integer(), nullable=True),
+        sa.Column('doctor_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['doctor_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(
+        'ix_availability_exceptions_doctor_date', 'availability_exceptions', ['doctor_id', 'date'], unique=False
+    )
+
+    op.create_table(
+        'schedule_slots',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('doctor_id', sa.Integer(), nullable=False),
+        sa.Column('start_time', sa.DateTime(), nullable=False),
+        sa.Column('end_time', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['doctor_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('doctor_id', 'start_time', name='uq_schedule_slots_doctor_start'),
+    )
+
+    # Materialize the existing availability: the job worker picks this up and then
+    # reschedules it every midnight.
+    jobs = sa.table(
+        'jobs',
+        sa.column('kind', sa.String),
+        sa.column('payload', sa.JSON),
+        sa.column('idempotency_key', sa.String),
+        sa.column('status', sa.String),
+        sa.column('attempts', sa.Integer),
+        sa.column('run_at', sa.DateTime),
+        sa.column('created_at', sa.DateTime),
+    )
+    created = datetime.datetime.now()
+    op.bulk_insert(jobs, [{
+        'kind': 'schedule.extend',
+        'payload': {},
+        'idempotency_key': 'schedule-extension:initial',
+        'status': 'PENDING',
+        'attempts': 0,
+        'run_at': created,
+        'created_at': created,
+    }])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DELETE FROM jobs WHERE kind = 'schedule.extend'")
+    op.drop_table('schedule_slots')
+    op.drop_table('availability_exceptions')
+    with op.batch_alter_table('availabilities') as batch_op:
+        batch_op.drop_column('slot_minutes')
@@ -0,0 +1,33 @@
+"""appointment timestamps
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 14:44:46.452348
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, Sequence[str], None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('appointments', sa.Column('created_at', sa.DateTime(), nullable=True))
+    op.add_column('appointments', sa.Column('updated_at', sa.DateTime(), nullable=True))
+    op.create_index('ix_appointments_doctor_updated_at', 'appointments', ['doctor_id', 'updated_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_appointments_doctor_updated_at', table_name='appointments')
+    with op.batch_alter_table('appointments') as batch_op:
+        batch_op.drop_column('updated_at')
+        batch_op.drop_column('created_at')
@@ -0,0 +1,86 @@
+"""appointment archive
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 14:52:59.697507
+
+"""
+from typing import Sequence, Union
+
+import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, Sequence[str], None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'appointments_archive',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('appointment_time', sa.DateTime(), nullable=False),
+        sa.Column('status', sa.Enum('SCHEDULED', 'CANCELLED', 'COMPLETED', name='appointmentstatus'), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('doctor_id', sa.Integer(), nullable=False),
+        sa.Column('patient_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['doctor_id'], ['users.id']),
+        sa.ForeignKeyConstraint(['patient_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(
+        'ix_appointments_archive_doctor_time_status',
+        'appointments_archive',
+        ['doctor_id', 'appointment_time', 'status'],
+        unique=False,
+    )
+    op.create_index(
+        'ix_appointments_archive_doctor_updated_at', 'appointments_archive', ['doctor_id', 'updated_at'], unique=False
+    )
+    op.create_index(
+        op.f('ix_appointments_archive_patient_id'), 'appointments_archive', ['patient_id'], unique=False
+    )
+
+    # Complete and archive the existing appointments: the job worker picks this up
+    # and then reschedules it every APPOINTMENT_SWEEP_INTERVAL_MINUTES.
+    jobs = sa.table(
+        'jobs',
+        sa.column('kind', sa.String),
+        sa.column('payload', sa.JSON),
+        sa.column('idempotency_key', sa.String),
+        sa.column('status', sa.String),
+        sa.column('attempts', sa.Integer),
+        sa.column('run_at', sa.DateTime),
+        sa.column('created_at', sa.DateTime),
+    )
+    created = datetime.datetime.now()
+    op.bulk_insert(jobs, [{
+        'kind': 'appointments.sweep',
+        'payload': {},
+        'idempotency_key': 'appointment-sweep:initial',
+        'status': 'PENDING',
+        'attempts': 0,
+        'run_at': created,
+        'created_at': created,
+    }])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Archived appointments go back to the live table, without a slot since they are past.
+    op.execute(
+        "INSERT INTO appointments (id, appointment_time, status, created_at, updated_at, doctor_id, patient_id) "
+        "SELECT id, appointment_time, status, created_at, updated_at, doctor_id, patient_id FROM appointments_archive"
+    )
+    op.execute("DELETE FROM jobs WHERE kind = 'appointments.sweep'")
+    op.drop_index(op.f('ix_appointments_archive_patient_id'), table_name='appointments_archive')
+    op.drop_index('ix_appointments_archive_doctor_updated_at', table_name='appointments_archive')
+    op.drop_index('ix_appointments_archive_doctor_time_status', table_name='appointments_archive')
+    op.drop_table('appointments_archive')
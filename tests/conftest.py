@@ -0,0 +1,122 @@
+"""
+Tests run the app in-process through an ASGI client, against a throwaway SQLite file.
+
+    pip install -r tests/requirements.txt
+    python -m pytest
+"""
+import contextlib
+import datetime
+import os
+import tempfile
+import uuid
+
+import httpx
+import pytest
+
+# The app reads its settings at import time, so they are set before anything imports it.
+_workdir = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{_workdir}/test.db"
+os.environ["MAIL_FILE_PATH"] = f"{_workdir}/outbox.jsonl"
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ["JOB_WORKER_ENABLED"] = "false"
+
+API = "/api/v1"
+PASSWORD = "test-password"
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday"]
+
+
+@pytest.fixture(scope="session")
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(scope="session")
+async def client():
+    from app.db.base import Base
+    from app.db.database import engine
+    from app.main import app
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=60) as client:
+            yield client
+
+
+@contextlib.contextmanager
+def count_queries():
+    """
+    Collect the SQL statements sent to the primary database while the block runs.
+    """
+    from sqlalchemy import event
+
+    from app.db.database import engine
+
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+
+
+class FakeClock:
+    """
+    A clock that only moves when advance() is called. Patch a module's time source with
+    `clock.now` (naive local datetimes, like app.services.jobs.now) or with the clock
+    itself, which stands in for the `time` module through monotonic().
+    """
+
+    def __init__(self, start: datetime.datetime = None):
+        self.start = start or datetime.datetime.now()
+        self.elapsed = 0.0
+
+    def now(self) -> datetime.datetime:
+        return self.start + datetime.timedelta(seconds=self.elapsed)
+
+    def monotonic(self) -> float:
+        return self.elapsed
+
+    def advance(self, seconds: float) -> None:
+        self.elapsed += seconds
+
+
+async def register(client: httpx.AsyncClient, role: str) -> tuple:
+    """
+    Register a user with a unique email; returns (id, auth headers). The database is shared
+    by all tests, so every test works with users of its own.
+    """
+    email = f"{role}-{uuid.uuid4().hex}@test.io"
+    response = await client.post(f"{API}/auth/register", json={"email": email, "password": PASSWORD, "role": role})
+    assert response.status_code == 201, response.text
+    user_id = response.json()["id"]
+    response = await client.post(f"{API}/auth/login", json={"email": email, "password": PASSWORD})
+    assert response.status_code == 200, response.text
+    return user_id, {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def set_weekday_hours(client: httpx.AsyncClient, headers: dict, days=WEEKDAYS) -> None:
+    response = await client.post(
+        f"{API}/availability",
+        json=[{"day_of_week": day, "start_time": "09:00:00", "end_time": "17:00:00"} for day in days],
+        headers=headers,
+    )
+    assert response.status_code == 201, response.text
+
+
+async def book(client: httpx.AsyncClient, doctor_id: int, headers: dict, slot: datetime.datetime) -> int:
+    response = await client.post(
+        f"{API}/book-appointments", json={"doctor_id": doctor_id, "appointment_time": slot.isoformat()}, headers=headers
+    )
+    assert response.status_code == 201, response.text
+    return response.json()["id"]
+
+
+def next_monday(at: datetime.time = datetime.time(9)) -> datetime.datetime:
+    today = datetime.date.today()
+    return datetime.datetime.combine(today + datetime.timedelta(days=7 - today.weekday()), at)
@@ -0,0 +1,110 @@
+import datetime
+
+import pytest
+from sqlalchemy import func, select
+
+from app.db.database import session
+from app.models.appointment import AppointmentStatus
+from app.schema.appointment import Appointment as AppointmentModel, ArchivedAppointment
+from tests.conftest import API, register, set_weekday_hours
+
+pytestmark = pytest.mark.anyio
+
+# A past Monday, so the week holds five 09:00-17:00 days of 30-minute slots: 2400 available
+# minutes. Every update time is in the past too, as the report's refresh relies on.
+WEEK = datetime.datetime(2025, 1, 6)
+HOUR = datetime.timedelta(hours=1)
+DAY = datetime.timedelta(days=1)
+
+
+async def add_history(doctor_id: int, patient_id: int) -> dict:
+    """
+    Write a known week of appointments straight to the live table and the archive;
+    returns the live ones by name.
+    """
+    def live(at, status_, updated_before):
+        return AppointmentModel(
+            appointment_time=at,
+            active_slot=at if status_ == AppointmentStatus.SCHEDULED else None,
+            status=status_,
+            created_at=at - 10 * DAY,
+            updated_at=at - updated_before,
+            doctor_id=doctor_id,
+            patient_id=patient_id,
+        )
+
+    appointments = {
+        "booked": live(WEEK + 9 * HOUR, AppointmentStatus.SCHEDULED, 10 * DAY),
+        # Cancelled two hours ahead, which is late.
+        "late": live(WEEK + 10 * HOUR, AppointmentStatus.CANCELLED, 2 * HOUR),
+        "early": live(WEEK + DAY + 9 * HOUR, AppointmentStatus.CANCELLED, 3 * DAY),
+        # Outside the report's week.
+        "next_week": live(WEEK + 7 * DAY + 9 * HOUR, AppointmentStatus.SCHEDULED, 10 * DAY),
+    }
+    async with session() as db:
+        db.add_all(appointments.values())
+        await db.flush()
+        # Archived rows keep their ids; these are past anything the live table has handed out.
+        first_id = max(
+            await db.scalar(select(func.max(AppointmentModel.id))),
+            await db.scalar(select(func.max(ArchivedAppointment.id))) or 0,
+        ) + 1000
+        db.add_all([
+            ArchivedAppointment(
+                id=first_id + i,
+                appointment_time=at,
+                status=AppointmentStatus.COMPLETED,
+                created_at=at - DAY,
+                updated_at=at + HOUR,
+                doctor_id=doctor_id,
+                patient_id=patient_id,
+            )
+            for i, at in enumerate([WEEK + 2 * DAY + 9 * HOUR, WEEK + 3 * DAY + 14 * HOUR])
+        ])
+        await db.commit()
+    return appointments
+
+
+async def get_report(client, headers: dict) -> dict:
+    response = await client.get(
+        f"{API}/appointments/report",
+        params={"from": WEEK.date().isoformat(), "to": (WEEK + 7 * DAY).date().isoformat()},
+        headers=headers,
+    )
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+async def test_report_combines_the_live_table_and_the_archive(client):
+    doctor_id, doctor_headers = await register(client, "doctor")
+    await set_weekday_hours(client, doctor_headers)
+    patient_id, _ = await register(client, "patient")
+    appointments = await add_history(doctor_id, patient_id)
+
+    report = await get_report(client, doctor_headers)
+    assert report["total"] == 5
+    assert report["status_counts"] == {"scheduled": 1, "cancelled": 2, "completed": 2}
+    assert report["cancellation_rate"] == pytest.approx(2 / 5)
+    assert report["late_cancellation_rate"] == pytest.approx(1 / 5)
+    # Three booked 30-minute slots out of 2400 available minutes.
+    assert report["utilization"] == pytest.approx(90 / 2400)
+    # One of Monday's two 09:00-10:00 slots is booked; Saturday has no slots.
+    assert report["occupancy"][0][9] == pytest.approx(0.5)
+    assert report["occupancy"][0][10] == 0
+    assert report["occupancy"][5][9] is None
+    assert report["lead_time"]["counts"][3] == 2  # the archived rows, booked a day ahead
+    assert report["lead_time"]["counts"][5] == 3  # the live rows, booked ten days ahead
+
+    # A cancellation made after the report was cached is merged into the next one.
+    response = await client.post(
+        f"{API}/appointments/bulk-cancel",
+        json={"appointment_ids": [appointments["booked"].id]},
+        headers=doctor_headers,
+    )
+    assert [result["status_code"] for result in response.json()] == [200]
+    report = await get_report(client, doctor_headers)
+    assert report["total"] == 5
+    assert report["status_counts"] == {"scheduled": 0, "cancelled": 3, "completed": 2}
+    # Cancelled after the appointment's time, so late.
+    assert report["late_cancellation_rate"] == pytest.approx(2 / 5)
+    assert report["utilization"] == pytest.approx(60 / 2400)
@@ -0,0 +1,78 @@
+import datetime
+import json
+
+import pytest
+
+from tests.conftest import API, next_monday, register, set_weekday_hours
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.mark.parametrize("path", ["/appointments", "/appointments/export"])
+async def test_history_accepts_a_timezone_aware_window(client, path):
+    doctor_id, doctor_headers = await register(client, "doctor")
+    await set_weekday_hours(client, doctor_headers)
+    _, patient_headers = await register(client, "patient")
+    start = next_monday()
+    response = await client.post(
+        f"{API}/book-appointments",
+        json={"doctor_id": doctor_id, "appointment_time": start.isoformat()},
+        headers=patient_headers,
+    )
+    assert response.status_code == 201, response.text
+
+    # Naive times are server-local; the window names the same moments in UTC.
+    utc_start = start.astimezone(datetime.timezone.utc)
+    window = {"from": utc_start.isoformat(), "to": (utc_start + datetime.timedelta(days=1)).isoformat()}
+    response = await client.get(f"{API}{path}", params=window, headers=doctor_headers)
+    assert response.status_code == 200, response.text
+    if path.endswith("export"):
+        items = [json.loads(line) for line in response.text.splitlines()]
+    else:
+        items = response.json()["items"]
+    assert [item["appointment_time"] for item in items] == [start.isoformat()]
+
+
+async def test_offsets_are_converted_rather_than_dropped(client):
+    doctor_id, doctor_headers = await register(client, "doctor")
+    await set_weekday_hours(client, doctor_headers)
+    _, patient_headers = await register(client, "patient")
+    start = next_monday()
+    # The same moment as `start`, written with a non-zero offset.
+    plus_five = datetime.timezone(datetime.timedelta(hours=5))
+    aware = start.astimezone(plus_five)
+    window = {"from": aware.isoformat(), "to": (aware + datetime.timedelta(hours=1)).isoformat()}
+
+    response = await client.get(f"{API}/doctors/{doctor_id}/slots", params=window, headers=patient_headers)
+    assert response.status_code == 200, response.text
+    assert [slot["start"] for slot in response.json()] == [start.isoformat(), (start + datetime.timedelta(minutes=30)).isoformat()]
+
+    response = await client.post(
+        f"{API}/book-appointments",
+        json={"doctor_id": doctor_id, "appointment_time": aware.isoformat()},
+        headers=patient_headers,
+    )
+    assert response.status_code == 201, response.text
+    assert response.json()["appointment_time"] == start.isoformat()
+    response = await client.post(
+        f"{API}/book-appointments/bulk",
+        json=[{"doctor_id": doctor_id, "appointment_time": (aware + datetime.timedelta(minutes=30)).isoformat()}],
+        headers=patient_headers,
+    )
+    assert [item["appointment"]["appointment_time"] for item in response.json()] == [
+        (start + datetime.timedelta(minutes=30)).isoformat()
+    ]
+
+    response = await client.get(f"{API}/appointments", params=window, headers=doctor_headers)
+    assert [item["appointment_time"] for item in response.json()["items"]] == [
+        start.isoformat(), (start + datetime.timedelta(minutes=30)).isoformat()
+    ]
+    # The local wall-clock time with the offset attached is another moment, and matches nothing.
+    wall_clock = start.replace(tzinfo=plus_five)
+    shifted = {"from": wall_clock.isoformat(), "to": (wall_clock + datetime.timedelta(hours=1)).isoformat()}
+    if wall_clock != aware:
+        response = await client.get(f"{API}/appointments", params=shifted, headers=doctor_headers)
+        assert response.json()["items"] == []
+
+    response = await client.post(f"{API}/appointments/bulk-cancel", json=window, headers=patient_headers)
+    assert [result["status_code"] for result in response.json()] == [200, 200]
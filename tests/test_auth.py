@@ -0,0 +1,88 @@
+import uuid
+
+import pytest
+
+from app.api.v1.auth import principal_cache
+from app.core.security import create_password_reset_token
+from tests.conftest import API, PASSWORD, count_queries
+
+pytestmark = pytest.mark.anyio
+
+# A doctor-only endpoint that reads nothing about the user itself.
+PROTECTED = f"{API}/availability/exceptions"
+
+
+def user_lookups(statements) -> list:
+    # The lookup in authenticate() is the only query that reads token_version.
+    return [statement for statement in statements if "token_version" in statement]
+
+
+async def register_doctor(client) -> str:
+    email = f"doctor-{uuid.uuid4().hex}@test.io"
+    response = await client.post(f"{API}/auth/register", json={"email": email, "password": PASSWORD, "role": "doctor"})
+    assert response.status_code == 201, response.text
+    return email
+
+
+async def login(client, email: str, password: str = PASSWORD) -> dict:
+    response = await client.post(f"{API}/auth/login", json={"email": email, "password": password})
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def reset_password(client, email: str, new_password: str) -> None:
+    response = await client.post(
+        f"{API}/auth/reset-password",
+        json={"token": create_password_reset_token(email), "new_password": new_password},
+    )
+    assert response.status_code == 200, response.text
+
+
+async def test_cached_principal_skips_the_user_lookup(client):
+    headers = await login(client, await register_doctor(client))
+
+    with count_queries() as statements:
+        response = await client.get(PROTECTED, headers=headers)
+    assert response.status_code == 200
+    assert len(user_lookups(statements)) == 1
+
+    # Within AUTH_CACHE_TTL_SECONDS the token resolves from the cache.
+    with count_queries() as statements:
+        response = await client.get(PROTECTED, headers=headers)
+    assert response.status_code == 200
+    assert user_lookups(statements) == []
+
+
+async def test_password_reset_revokes_old_tokens_on_this_worker(client):
+    email = await register_doctor(client)
+    old_headers = await login(client, email)
+    assert (await client.get(PROTECTED, headers=old_headers)).status_code == 200
+    assert principal_cache.get(email) is not None
+
+    await reset_password(client, email, "new-password")
+    assert (await client.get(PROTECTED, headers=old_headers)).status_code == 401
+    new_headers = await login(client, email, "new-password")
+    assert (await client.get(PROTECTED, headers=new_headers)).status_code == 200
+
+
+async def test_password_reset_revokes_old_tokens_cached_by_other_workers(client):
+    email = await register_doctor(client)
+    old_headers = await login(client, email)
+    assert (await client.get(PROTECTED, headers=old_headers)).status_code == 200
+    # What another worker holds: it cached the user, but only the shared version key
+    # tells it about the reset handled here.
+    stale = principal_cache.get(email)
+
+    await reset_password(client, email, "new-password")
+    principal_cache.set(email, stale)
+    with count_queries() as statements:
+        response = await client.get(PROTECTED, headers=old_headers)
+    assert response.status_code == 401
+    assert len(user_lookups(statements)) == 1
+
+    # Without the shared version bump (e.g. a per-worker cache), a token newer than the
+    # cached user still makes the worker look the user up again instead of refusing it.
+    new_headers = await login(client, email, "new-password")
+    principal_cache.set(email, (stale[0], principal_cache.get(email)[1]))
+    assert (await client.get(PROTECTED, headers=new_headers)).status_code == 200
+    assert (await client.get(PROTECTED, headers=old_headers)).status_code == 401
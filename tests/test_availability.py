@@ -0,0 +1,122 @@
+import asyncio
+import datetime
+
+import pytest
+from sqlalchemy import func, select
+
+from app.db.database import session
+from app.schema.availability import Availability as AvailabilityModel
+from app.schema.job import Job
+from app.schema.schedule import ScheduleSlot
+from tests.conftest import API, WEEKDAYS, register, set_weekday_hours
+
+pytestmark = pytest.mark.anyio
+
+
+async def count_jobs() -> int:
+    async with session() as db:
+        return await db.scalar(select(func.count()).select_from(Job))
+
+
+async def test_doctors_can_save_availability_at_the_same_time(client):
+    doctors = [await register(client, "doctor") for _ in range(10)]
+    jobs = await count_jobs()
+    responses = await asyncio.gather(*(
+        client.post(
+            f"{API}/availability",
+            json=[{"day_of_week": day, "start_time": "09:00:00", "end_time": "17:00:00"} for day in WEEKDAYS],
+            headers=headers,
+        )
+        for _, headers in doctors
+    ))
+    assert [response.status_code for response in responses] == [201] * len(doctors)
+    # The daily extension queues itself; a request that queued it too could collide with
+    # another doctor's request on the shared idempotency key.
+    assert await count_jobs() == jobs
+
+
+async def save_availability(client, headers: dict, windows: list):
+    return await client.post(
+        f"{API}/availability",
+        json=[
+            {"day_of_week": day, "start_time": start, "end_time": end, "slot_minutes": minutes}
+            for day, start, end, minutes in windows
+        ],
+        headers=headers,
+    )
+
+
+async def test_overlapping_windows_with_the_same_slot_length_are_merged(client):
+    _, headers = await register(client, "doctor")
+    response = await save_availability(client, headers, [
+        ("monday", "09:00:00", "12:00:00", 30),
+        ("monday", "11:00:00", "14:00:00", 30),
+        # Touching windows merge too.
+        ("monday", "14:00:00", "15:00:00", 30),
+        ("tuesday", "09:00:00", "10:00:00", 30),
+    ])
+    assert response.status_code == 201, response.text
+    assert [(row["day_of_week"], row["start_time"], row["end_time"]) for row in response.json()] == [
+        ("monday", "09:00:00", "15:00:00"),
+        ("tuesday", "09:00:00", "10:00:00"),
+    ]
+
+
+async def test_overlapping_windows_with_different_slot_lengths_are_rejected(client):
+    _, headers = await register(client, "doctor")
+    response = await save_availability(client, headers, [
+        ("monday", "09:00:00", "12:00:00", 30),
+        ("monday", "11:00:00", "14:00:00", 20),
+    ])
+    assert response.status_code == 400
+    assert "different slot length" in response.json()["detail"]
+    # Back to back is fine, each window keeps its own slot length.
+    response = await save_availability(client, headers, [
+        ("monday", "09:00:00", "12:00:00", 30),
+        ("monday", "12:00:00", "14:00:00", 20),
+    ])
+    assert response.status_code == 201, response.text
+    assert [row["slot_minutes"] for row in response.json()] == [30, 20]
+
+
+async def stored_schedule(doctor_id: int) -> tuple:
+    """
+    The doctor's availability rows by id and materialized slots by id.
+    """
+    async with session() as db:
+        rows = {
+            row.id: (row.day_of_week.value, row.start_time, row.end_time)
+            for row in await db.scalars(select(AvailabilityModel).where(AvailabilityModel.doctor_id == doctor_id))
+        }
+        slots = dict((await db.execute(
+            select(ScheduleSlot.id, ScheduleSlot.start_time).where(ScheduleSlot.doctor_id == doctor_id)
+        )).tuples().all())
+    return rows, slots
+
+
+async def test_changing_one_weekday_only_rewrites_that_weekday(client):
+    doctor_id, headers = await register(client, "doctor")
+    await set_weekday_hours(client, headers)
+    rows, slots = await stored_schedule(doctor_id)
+
+    response = await client.post(
+        f"{API}/availability",
+        json=[
+            {"day_of_week": day, "start_time": "09:00:00", "end_time": "12:00:00" if day == "tuesday" else "17:00:00"}
+            for day in WEEKDAYS
+        ],
+        headers=headers,
+    )
+    assert response.status_code == 201, response.text
+    new_rows, new_slots = await stored_schedule(doctor_id)
+
+    # Every row keeps its id; only Tuesday's was updated.
+    assert new_rows.keys() == rows.keys()
+    assert {row_id for row_id in rows if rows[row_id] != new_rows[row_id]} == {
+        row_id for row_id, (day, _, _) in rows.items() if day == "tuesday"
+    }
+    # Tuesday afternoons lost their slots; every other slot is the same row as before.
+    is_tuesday_afternoon = lambda start: start.weekday() == 1 and start.time() >= datetime.time(12)
+    removed = {slot_id for slot_id, start in slots.items() if is_tuesday_afternoon(start)}
+    assert removed
+    assert new_slots == {slot_id: start for slot_id, start in slots.items() if slot_id not in removed}
@@ -0,0 +1,88 @@
+import asyncio
+import datetime
+import sqlite3
+
+import pytest
+from sqlalchemy import event, func, select
+from sqlalchemy.engine import make_url
+
+from app.core.config import settings
+from app.db.database import engine, session
+from app.models.appointment import AppointmentStatus
+from app.schema.appointment import Appointment as AppointmentModel
+from tests.conftest import API, next_monday, register, set_weekday_hours
+
+pytestmark = pytest.mark.anyio
+
+CONCURRENT_BOOKINGS = 200
+
+
+async def test_simultaneous_bookings_of_one_slot_book_it_once(client):
+    doctor_id, doctor_headers = await register(client, "doctor")
+    await set_weekday_hours(client, doctor_headers)
+    patients = [await register(client, "patient") for _ in range(5)]
+    slot = next_monday()
+
+    responses = await asyncio.gather(*(
+        client.post(
+            f"{API}/book-appointments",
+            json={"doctor_id": doctor_id, "appointment_time": slot.isoformat()},
+            headers=patients[i % len(patients)][1],
+        )
+        for i in range(CONCURRENT_BOOKINGS)
+    ))
+
+    statuses = sorted(response.status_code for response in responses)
+    assert statuses == [201] + [409] * (CONCURRENT_BOOKINGS - 1)
+    async with session() as db:
+        booked = await db.scalar(
+            select(func.count()).select_from(AppointmentModel).where(
+                AppointmentModel.doctor_id == doctor_id,
+                AppointmentModel.appointment_time == slot,
+                AppointmentModel.status == AppointmentStatus.SCHEDULED,
+            )
+        )
+    assert booked == 1
+
+
+async def test_bulk_booking_only_fails_the_slot_taken_concurrently(client):
+    doctor_id, doctor_headers = await register(client, "doctor")
+    await set_weekday_hours(client, doctor_headers)
+    other_id, _ = await register(client, "patient")
+    patient_id, patient_headers = await register(client, "patient")
+    slots = [next_monday() + datetime.timedelta(minutes=30 * i) for i in range(3)]
+    taken = slots[1].strftime("%Y-%m-%d %H:%M:%S.%f")
+    inserts = []
+
+    def book_concurrently(conn, cursor, statement, parameters, context, executemany):
+        # Another request books the middle slot after the bulk booking checked it was free.
+        if statement.startswith("INSERT INTO appointments") and not inserts:
+            inserts.append(statement)
+            other = sqlite3.connect(make_url(settings.DATABASE_URL).database)
+            with other:
+                other.execute(
+                    "INSERT INTO appointments (appointment_time, active_slot, status, doctor_id, patient_id)"
+                    " VALUES (?, ?, 'SCHEDULED', ?, ?)",
+                    (taken, taken, doctor_id, other_id),
+                )
+            other.close()
+
+    event.listen(engine.sync_engine, "before_cursor_execute", book_concurrently)
+    try:
+        response = await client.post(
+            f"{API}/book-appointments/bulk",
+            json=[{"doctor_id": doctor_id, "appointment_time": slot.isoformat()} for slot in slots],
+            headers=patient_headers,
+        )
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", book_concurrently)
+
+    assert response.status_code == 200
+    assert [result["status_code"] for result in response.json()] == [201, 409, 201]
+    async with session() as db:
+        bookings = (await db.execute(
+            select(AppointmentModel.appointment_time, AppointmentModel.patient_id)
+            .where(AppointmentModel.doctor_id == doctor_id)
+            .order_by(AppointmentModel.appointment_time)
+        )).all()
+    assert bookings == [(slots[0], patient_id), (slots[1], other_id), (slots[2], patient_id)]
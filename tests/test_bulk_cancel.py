@@ -0,0 +1,108 @@
+import datetime
+
+import pytest
+from sqlalchemy import event
+
+from app.core.config import settings
+from app.db.database import engine
+from tests.conftest import API, next_monday, register, set_weekday_hours
+
+pytestmark = pytest.mark.anyio
+
+
+async def book_series(client, count: int) -> tuple:
+    doctor_id, doctor_headers = await register(client, "doctor")
+    await set_weekday_hours(client, doctor_headers)
+    _, patient_headers = await register(client, "patient")
+    start = next_monday()
+    response = await client.post(
+        f"{API}/book-appointments/bulk",
+        json=[
+            {"doctor_id": doctor_id, "appointment_time": (start + datetime.timedelta(minutes=30 * i)).isoformat()}
+            for i in range(count)
+        ],
+        headers=patient_headers,
+    )
+    assert [result["status_code"] for result in response.json()] == [201] * count
+    return doctor_headers, start
+
+
+async def test_range_cancel_returns_the_cancelled_appointments(client):
+    doctor_headers, start = await book_series(client, 3)
+    response = await client.post(
+        f"{API}/appointments/bulk-cancel",
+        json={"from": start.isoformat(), "to": (start + datetime.timedelta(days=1)).isoformat()},
+        headers=doctor_headers,
+    )
+    assert response.status_code == 200
+    results = response.json()
+    assert [result["status_code"] for result in results] == [200] * 3
+    assert [result["appointment"]["status"] for result in results] == ["cancelled"] * 3
+    assert [result["appointment"]["appointment_time"] for result in results] == sorted(
+        result["appointment"]["appointment_time"] for result in results
+    )
+
+
+async def test_range_cancel_refuses_more_than_the_bulk_limit(client, monkeypatch):
+    doctor_headers, start = await book_series(client, 3)
+    monkeypatch.setattr(settings, "BULK_MAX_ITEMS", 2)
+    window = {"from": start.isoformat(), "to": (start + datetime.timedelta(days=1)).isoformat()}
+    response = await client.post(f"{API}/appointments/bulk-cancel", json=window, headers=doctor_headers)
+    assert response.status_code == 400
+
+    # Nothing was cancelled.
+    response = await client.get(f"{API}/appointments", params={"status": "scheduled", **window}, headers=doctor_headers)
+    assert len(response.json()["items"]) == 3
+
+
+async def test_cancel_leaves_appointments_completed_in_between_alone(client):
+    doctor_headers, start = await book_series(client, 2)
+    window = {"from": start.isoformat(), "to": (start + datetime.timedelta(days=1)).isoformat()}
+    listed = (await client.get(f"{API}/appointments", params=window, headers=doctor_headers)).json()["items"]
+    completed_id = listed[0]["id"]
+
+    def sweep_first(conn, cursor, statement, parameters, context, executemany):
+        # Plays the sweeper completing an appointment between the bulk cancel's read and its UPDATE.
+        if statement.startswith("UPDATE appointments SET status"):
+            cursor.execute("UPDATE appointments SET status = 'COMPLETED' WHERE id = ?", (completed_id,))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", sweep_first)
+    try:
+        response = await client.post(f"{API}/appointments/bulk-cancel", json=window, headers=doctor_headers)
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", sweep_first)
+
+    results = {result["appointment_id"]: result for result in response.json()}
+    assert results[completed_id]["status_code"] == 400
+    assert results[listed[1]["id"]]["status_code"] == 200
+    listed = (await client.get(f"{API}/appointments", params=window, headers=doctor_headers)).json()["items"]
+    assert [appointment["status"] for appointment in listed] == ["completed", "cancelled"]
+
+
+async def test_cancel_answers_a_repeated_id_once(client):
+    doctor_headers, start = await book_series(client, 2)
+    window = {"from": start.isoformat(), "to": (start + datetime.timedelta(days=1)).isoformat()}
+    listed = (await client.get(f"{API}/appointments", params=window, headers=doctor_headers)).json()["items"]
+    first, second = [appointment["id"] for appointment in listed]
+    updates = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("UPDATE appointments"):
+            updates.append(parameters)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    try:
+        response = await client.post(
+            f"{API}/appointments/bulk-cancel", json={"appointment_ids": [first, second, first]}, headers=doctor_headers
+        )
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", record)
+
+    assert response.status_code == 200
+    results = response.json()
+    assert [(result["appointment_id"], result["status_code"]) for result in results] == [
+        (first, 200), (second, 200), (first, 400)
+    ]
+    assert results[2]["detail"] == "This appointment is listed more than once."
+    # The repeat is not cancelled a second time.
+    assert [list(parameters).count(first) for parameters in updates] == [1]
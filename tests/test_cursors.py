@@ -0,0 +1,31 @@
+import pytest
+
+from app.util.pagination import encode_cursor
+from tests.conftest import API, register, set_weekday_hours
+
+pytestmark = pytest.mark.anyio
+
+BAD_CURSORS = ["not-a-cursor", encode_cursor("x"), encode_cursor(True), encode_cursor(1, 2), encode_cursor(None)]
+
+
+@pytest.mark.parametrize("cursor", BAD_CURSORS)
+@pytest.mark.parametrize("search", [{}, {"day": "monday"}, {"date": "2030-01-07", "time": "10:00:00"}])
+async def test_doctor_directory_rejects_malformed_cursors(client, cursor, search):
+    _, doctor_headers = await register(client, "doctor")
+    await set_weekday_hours(client, doctor_headers)
+    _, patient_headers = await register(client, "patient")
+    response = await client.get(f"{API}/doctors", params={"cursor": cursor, **search}, headers=patient_headers)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor."
+
+
+@pytest.mark.parametrize("cursor", BAD_CURSORS + [
+    encode_cursor("2030-01-07T09:00:00", "x"),
+    encode_cursor("2030-01-07T09:00:00", False),
+    encode_cursor(1, 1),
+])
+async def test_appointment_listing_rejects_malformed_cursors(client, cursor):
+    _, doctor_headers = await register(client, "doctor")
+    response = await client.get(f"{API}/appointments", params={"cursor": cursor}, headers=doctor_headers)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor."
@@ -0,0 +1,92 @@
+import fakeredis
+import pytest
+
+from app.core.security import create_password_reset_token
+from app.services import cache as cache_module
+from app.services.cache import RedisCache
+from tests.conftest import API, register, set_weekday_hours
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def redis_cache(monkeypatch):
+    """
+    Route the shared cache through RedisCache, backed by an in-memory fake server.
+    """
+    backend = RedisCache(fakeredis.FakeAsyncRedis())
+    monkeypatch.setattr(cache_module, "cache", backend)
+    yield backend
+    await backend.close()
+
+
+async def test_redis_cache_round_trip(redis_cache):
+    assert await redis_cache.get("key") is None
+    await redis_cache.set("key", b"value", ttl=60)
+    assert await redis_cache.get("key") == b"value"
+    assert await redis_cache.client.ttl("cache:key") == 60
+
+    await redis_cache.delete("key")
+    assert await redis_cache.get("key") is None
+
+    assert await redis_cache.incr("counter") == 1
+    assert await redis_cache.incr("counter") == 2
+    assert await redis_cache.get("counter") == b"2"
+
+
+async def get_profile(client, doctor_id: int, headers: dict, etag: str = None):
+    if etag is not None:
+        headers = {**headers, "If-None-Match": etag}
+    return await client.get(f"{API}/doctors/{doctor_id}", headers=headers)
+
+
+async def test_doctor_profile_revalidates_until_the_availability_changes(client, redis_cache):
+    doctor_id, doctor_headers = await register(client, "doctor")
+    await set_weekday_hours(client, doctor_headers)
+    _, patient_headers = await register(client, "patient")
+
+    response = await get_profile(client, doctor_id, patient_headers)
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert len(response.json()["availabilities"]) == 5
+    # Setting the first hours already bumped the version once.
+    assert await redis_cache.get(f"doctor-version:{doctor_id}") == b"1"
+    assert await redis_cache.client.exists(f"cache:doctor:{doctor_id}:1")
+
+    response = await get_profile(client, doctor_id, patient_headers, etag)
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert not response.content
+    response = await get_profile(client, doctor_id, patient_headers, f'"other", {etag}')
+    assert response.status_code == 304
+
+    await set_weekday_hours(client, doctor_headers, days=["monday"])
+    assert await redis_cache.get(f"doctor-version:{doctor_id}") == b"2"
+
+    response = await get_profile(client, doctor_id, patient_headers, etag)
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert [row["day_of_week"] for row in response.json()["availabilities"]] == ["monday"]
+    response = await get_profile(client, doctor_id, patient_headers, response.headers["ETag"])
+    assert response.status_code == 304
+
+
+async def test_password_reset_invalidates_the_cached_profile(client, redis_cache):
+    doctor_id, _ = await register(client, "doctor")
+    _, patient_headers = await register(client, "patient")
+    response = await get_profile(client, doctor_id, patient_headers)
+    assert response.status_code == 200
+    email = response.json()["email"]
+    assert await redis_cache.client.exists(f"cache:doctor:{doctor_id}:0")
+
+    response = await client.post(
+        f"{API}/auth/reset-password",
+        json={"token": create_password_reset_token(email), "new_password": "new-test-password"},
+    )
+    assert response.status_code == 200, response.text
+    assert await redis_cache.get(f"doctor-version:{doctor_id}") == b"1"
+
+    # The next read misses the old entry and fills the new version's key.
+    response = await get_profile(client, doctor_id, patient_headers)
+    assert response.status_code == 200
+    assert await redis_cache.client.exists(f"cache:doctor:{doctor_id}:1")
@@ -0,0 +1,107 @@
+import datetime
+
+import pytest
+
+from app.services.doctor_search import doctor_search_index
+from tests.conftest import API, book, register
+
+pytestmark = pytest.mark.anyio
+
+
+def next_sunday() -> datetime.date:
+    # Early Sunday hours, which the other tests' doctors do not use.
+    today = datetime.date.today()
+    return today + datetime.timedelta(days=6 - today.weekday() or 7)
+
+
+async def save_hours(client, headers: dict, windows: list) -> None:
+    response = await client.post(
+        f"{API}/availability",
+        json=[{"day_of_week": day, "start_time": start, "end_time": end} for day, start, end in windows],
+        headers=headers,
+    )
+    assert response.status_code == 201, response.text
+
+
+async def search(client, headers: dict, among: set, **params) -> set:
+    """
+    The doctors of `among` that the directory search returns, across all pages.
+    """
+    found, cursor = set(), None
+    while True:
+        page = {"limit": 200, **params, **({"cursor": cursor} if cursor else {})}
+        response = await client.get(f"{API}/doctors", params=page, headers=headers)
+        assert response.status_code == 200, response.text
+        found.update(item["id"] for item in response.json()["items"])
+        cursor = response.json()["next_cursor"]
+        if cursor is None:
+            return found & among
+
+
+async def test_search_matches_the_weekly_hours_and_follows_changes(client):
+    early_id, early_headers = await register(client, "doctor")
+    later_id, later_headers = await register(client, "doctor")
+    saturday_id, saturday_headers = await register(client, "doctor")
+    _, patient_headers = await register(client, "patient")
+    ours = {early_id, later_id, saturday_id}
+    await save_hours(client, early_headers, [("sunday", "06:00:00", "07:00:00")])
+    await save_hours(client, later_headers, [("sunday", "06:30:00", "08:00:00")])
+    await save_hours(client, saturday_headers, [("saturday", "06:00:00", "07:00:00")])
+
+    assert await search(client, patient_headers, ours, day="sunday") == {early_id, later_id}
+    assert await search(client, patient_headers, ours, day="saturday") == {saturday_id}
+    assert await search(client, patient_headers, ours, day="sunday", time="06:10:00") == {early_id}
+    assert await search(client, patient_headers, ours, day="sunday", time="06:45:00") == {early_id, later_id}
+    # Windows end before their last minute.
+    assert await search(client, patient_headers, ours, day="sunday", time="07:00:00") == {later_id}
+
+    # Saving availability updates this worker's bitmap in place instead of rebuilding it.
+    bitmap = await doctor_search_index.get()
+    await save_hours(client, early_headers, [("sunday", "07:30:00", "09:00:00"), ("saturday", "06:00:00", "06:30:00")])
+    assert await doctor_search_index.get() is bitmap
+    assert await search(client, patient_headers, ours, day="sunday", time="06:45:00") == {later_id}
+    assert await search(client, patient_headers, ours, day="sunday", time="08:30:00") == {early_id}
+    assert await search(client, patient_headers, ours, day="saturday", time="06:10:00") == {early_id, saturday_id}
+
+    await save_hours(client, early_headers, [])
+    assert await search(client, patient_headers, ours, day="saturday") == {saturday_id}
+
+
+async def test_date_search_follows_exceptions_and_bookings(client):
+    sunday = next_sunday()
+    usual_id, usual_headers = await register(client, "doctor")
+    single_slot_id, single_slot_headers = await register(client, "doctor")
+    saturday_id, saturday_headers = await register(client, "doctor")
+    _, patient_headers = await register(client, "patient")
+    ours = {usual_id, single_slot_id, saturday_id}
+    await save_hours(client, usual_headers, [("sunday", "06:00:00", "07:00:00")])
+    await save_hours(client, single_slot_headers, [("sunday", "06:00:00", "06:30:00")])
+    await save_hours(client, saturday_headers, [("saturday", "06:00:00", "07:00:00")])
+    date = sunday.isoformat()
+
+    assert await search(client, patient_headers, ours, date=date) == {usual_id, single_slot_id}
+    assert await search(client, patient_headers, ours, date=date, time="06:15:00") == {usual_id, single_slot_id}
+
+    # Booking a doctor's only slot takes them out of that date's results, but not the weekly ones.
+    await book(client, single_slot_id, patient_headers, datetime.datetime.combine(sunday, datetime.time(6)))
+    assert await search(client, patient_headers, ours, date=date) == {usual_id}
+    assert await search(client, patient_headers, ours, date=date, time="06:15:00") == {usual_id}
+    assert await search(client, patient_headers, ours, day="sunday") == {usual_id, single_slot_id}
+
+    # A day off removes a doctor from that date; extra hours add one who does not usually work then.
+    response = await client.put(f"{API}/availability/exceptions/{date}", json=[], headers=usual_headers)
+    assert response.status_code == 200, response.text
+    response = await client.put(
+        f"{API}/availability/exceptions/{date}",
+        json=[{"start_time": "06:00:00", "end_time": "06:30:00"}],
+        headers=saturday_headers,
+    )
+    assert response.status_code == 200, response.text
+    assert await search(client, patient_headers, ours, date=date) == {saturday_id}
+    assert await search(client, patient_headers, ours, date=date, time="06:45:00") == set()
+    next_week = (sunday + datetime.timedelta(days=7)).isoformat()
+    assert await search(client, patient_headers, ours, date=next_week) == {usual_id, single_slot_id}
+
+    response = await client.delete(f"{API}/availability/exceptions/{date}", headers=usual_headers)
+    assert response.status_code == 204
+    assert await search(client, patient_headers, ours, date=date) == {usual_id, saturday_id}
@@ -0,0 +1,206 @@
+import datetime
+import uuid
+
+import pytest
+from sqlalchemy import func, select
+
+from app.core.config import settings
+from app.db.database import session
+from app.models.job import JobStatus
+from app.schema.job import Job
+from app.services import jobs
+from app.services.jobs import JobRequest, JobWorker, enqueue, enqueue_many, job_handler, retry_delay
+from tests.conftest import FakeClock
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(jobs, "now", clock.now)
+    return clock
+
+
+@pytest.fixture
+def worker(client, monkeypatch):
+    # The client fixture creates the schema. Handlers registered by a test are dropped after it.
+    monkeypatch.setattr(jobs, "_handlers", dict(jobs._handlers))
+    return JobWorker(session, batch_size=1000, poll_interval=0)
+
+
+def test_retry_delay_backs_off_exponentially_up_to_the_cap(monkeypatch):
+    monkeypatch.setattr(settings, "JOB_RETRY_BASE_SECONDS", 10.0)
+    monkeypatch.setattr(settings, "JOB_RETRY_MAX_SECONDS", 100.0)
+    for attempts, delay in enumerate([10, 20, 40, 80, 100, 100], start=1):
+        for _ in range(20):
+            assert delay * 0.5 <= retry_delay(attempts) <= delay
+
+
+async def get_job(job_id: int) -> Job:
+    async with session() as db:
+        return await db.get(Job, job_id)
+
+
+async def test_enqueue_skips_an_idempotency_key_that_is_already_queued(worker):
+    key = f"test:{uuid.uuid4().hex}"
+    async with session() as db:
+        first = await enqueue(db, "test-dedupe", {"n": 1}, idempotency_key=key)
+        # Not flushed yet, and still recognised.
+        assert await enqueue(db, "test-dedupe", {"n": 2}, idempotency_key=key) is None
+        await db.commit()
+    async with session() as db:
+        queued = await enqueue_many(db, [
+            JobRequest("test-dedupe", {"n": 3}, idempotency_key=key),
+            JobRequest("test-dedupe", {"n": 4}),
+        ])
+        assert [job.payload for job in queued] == [{"n": 4}]
+        await db.commit()
+        assert await db.scalar(select(func.count()).select_from(Job).where(Job.idempotency_key == key)) == 1
+    assert (await get_job(first.id)).payload == {"n": 1}
+
+
+async def test_failing_job_is_retried_with_backoff_until_it_fails(worker, clock, monkeypatch):
+    monkeypatch.setattr(settings, "JOB_MAX_ATTEMPTS", 3)
+    kind = f"test-failing-{uuid.uuid4().hex}"
+    calls = []
+
+    @job_handler(kind)
+    async def fail(payloads):
+        calls.append(payloads)
+        raise RuntimeError("mail server down")
+
+    async with session() as db:
+        job = await enqueue(db, kind, {"to": "someone"})
+        await db.commit()
+
+    await worker.run_once()
+    job = await get_job(job.id)
+    assert (job.status, job.attempts, job.last_error) == (JobStatus.PENDING, 1, "RuntimeError: mail server down")
+    first_delay = (job.run_at - clock.now()).total_seconds()
+    assert settings.JOB_RETRY_BASE_SECONDS * 0.5 <= first_delay <= settings.JOB_RETRY_BASE_SECONDS
+
+    # Not retried before the backoff has passed.
+    await worker.run_once()
+    assert len(calls) == 1
+
+    clock.advance(first_delay)
+    await worker.run_once()
+    job = await get_job(job.id)
+    assert (job.status, job.attempts) == (JobStatus.PENDING, 2)
+    second_delay = (job.run_at - clock.now()).total_seconds()
+    assert settings.JOB_RETRY_BASE_SECONDS <= second_delay <= settings.JOB_RETRY_BASE_SECONDS * 2
+
+    clock.advance(second_delay)
+    await worker.run_once()
+    job = await get_job(job.id)
+    assert (job.status, job.attempts, job.claimed_by, job.locked_until) == (JobStatus.FAILED, 3, None, None)
+
+    clock.advance(3600)
+    await worker.run_once()
+    assert calls == [[{"to": "someone"}]] * 3
+
+
+async def test_job_succeeds_on_retry(worker, clock):
+    kind = f"test-flaky-{uuid.uuid4().hex}"
+    calls = []
+
+    @job_handler(kind)
+    async def flaky(payloads):
+        calls.append(payloads)
+        if len(calls) == 1:
+            raise ConnectionError("timed out")
+
+    async with session() as db:
+        job = await enqueue(db, kind, {"id": 1})
+        await db.commit()
+
+    await worker.run_once()
+    clock.advance(settings.JOB_RETRY_BASE_SECONDS)
+    await worker.run_once()
+    job = await get_job(job.id)
+    assert (job.status, job.attempts, job.last_error) == (JobStatus.DONE, 2, None)
+    assert len(calls) == 2
+
+
+async def test_batched_handler_gets_every_due_job_of_its_kind_at_once(worker, clock):
+    kind = f"test-batched-{uuid.uuid4().hex}"
+    calls = []
+
+    @job_handler(kind, batched=True)
+    async def handle(payloads):
+        calls.append(sorted(payload["n"] for payload in payloads))
+
+    async with session() as db:
+        queued = await enqueue_many(db, [JobRequest(kind, {"n": n}) for n in range(3)])
+        await db.commit()
+
+    await worker.run_once()
+    assert calls == [[0, 1, 2]]
+    assert [(await get_job(job.id)).status for job in queued] == [JobStatus.DONE] * 3
+
+
+async def test_lease_is_renewed_before_each_job_of_a_batch(worker, clock):
+    kind = f"test-slow-{uuid.uuid4().hex}"
+    other_worker = JobWorker(session, batch_size=1000, poll_interval=0)
+    calls = []
+
+    @job_handler(kind)
+    async def slow(payloads):
+        calls.append(payloads)
+        # Each job takes most of a lease, so the second one outlives the lease taken at claim time.
+        clock.advance(settings.JOB_LEASE_SECONDS * 0.75)
+        await other_worker.run_once()
+
+    async with session() as db:
+        queued = await enqueue_many(db, [JobRequest(kind, {"n": n}) for n in range(2)])
+        await db.commit()
+
+    await worker.run_once()
+    assert sorted(payload["n"] for [payload] in calls) == [0, 1]
+    assert [(await get_job(job.id)).status for job in queued] == [JobStatus.DONE] * 2
+
+
+async def test_worker_that_lost_its_claim_does_not_overwrite_the_outcome(worker, clock):
+    kind = f"test-reclaimed-{uuid.uuid4().hex}"
+    other_worker = JobWorker(session, batch_size=1000, poll_interval=0)
+    calls = []
+
+    @job_handler(kind)
+    async def stuck(payloads):
+        calls.append(payloads)
+        if len(calls) == 1:
+            # The lease runs out and another worker runs the job to completion meanwhile.
+            clock.advance(settings.JOB_LEASE_SECONDS + 1)
+            await other_worker.run_once()
+            raise TimeoutError("SMTP send timed out")
+
+    async with session() as db:
+        job = await enqueue(db, kind, {"to": "someone"})
+        await db.commit()
+
+    await worker.run_once()
+    assert len(calls) == 2
+    job = await get_job(job.id)
+    assert (job.status, job.attempts, job.last_error, job.claimed_by) == (JobStatus.DONE, 1, None, None)
+
+
+async def test_purge_deletes_done_jobs_past_the_retention(worker, clock, monkeypatch):
+    monkeypatch.setattr(settings, "JOB_RETENTION_DAYS", 7)
+    kind = f"test-purge-{uuid.uuid4().hex}"
+    ran_at = clock.now() - datetime.timedelta(days=8)
+    async with session() as db:
+        old_done, old_failed, recent_done = await enqueue_many(db, [
+            JobRequest(kind, {}, run_at=ran_at),
+            JobRequest(kind, {}, run_at=ran_at),
+            JobRequest(kind, {}, idempotency_key=f"test:{uuid.uuid4().hex}", run_at=clock.now()),
+        ])
+        old_done.status = recent_done.status = JobStatus.DONE
+        old_failed.status = JobStatus.FAILED
+        await db.commit()
+
+    assert await worker.purge() >= 1
+    assert await get_job(old_done.id) is None
+    # Failed jobs are kept for inspection, and recent ones keep their idempotency key.
+    assert (await get_job(old_failed.id)).status == JobStatus.FAILED
+    assert (await get_job(recent_done.id)).status == JobStatus.DONE
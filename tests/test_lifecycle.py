@@ -0,0 +1,127 @@
+import datetime
+
+import pytest
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.db.database import session
+from app.models.appointment import AppointmentStatus
+from app.schema.appointment import Appointment as AppointmentModel, ArchivedAppointment
+from app.services.lifecycle import archive_old_appointments, complete_past_appointments
+from tests.conftest import API, book, next_monday, register, set_weekday_hours
+
+pytestmark = pytest.mark.anyio
+
+DAY = datetime.timedelta(days=1)
+
+
+@pytest.fixture(autouse=True)
+def small_batches(monkeypatch):
+    # Several batches per sweep, so the batching is exercised too.
+    monkeypatch.setattr(settings, "APPOINTMENT_SWEEP_BATCH_SIZE", 2)
+
+
+async def add_past(doctor_id: int, patient_id: int, appointments: dict) -> dict:
+    """
+    Write past appointments straight to the live table, which booking does not allow;
+    `appointments` maps a name to (time, status). Returns the ids by name.
+    """
+    rows = {
+        name: AppointmentModel(
+            appointment_time=at,
+            active_slot=at if status_ == AppointmentStatus.SCHEDULED else None,
+            status=status_,
+            doctor_id=doctor_id,
+            patient_id=patient_id,
+        )
+        for name, (at, status_) in appointments.items()
+    }
+    async with session() as db:
+        db.add_all(rows.values())
+        await db.commit()
+    return {name: row.id for name, row in rows.items()}
+
+
+async def sweep() -> None:
+    async with session() as db:
+        await complete_past_appointments(db)
+        await archive_old_appointments(db)
+
+
+async def test_sweep_completes_past_appointments_and_archives_old_ones(client):
+    doctor_id, doctor_headers = await register(client, "doctor")
+    await set_weekday_hours(client, doctor_headers)
+    patient_id, patient_headers = await register(client, "patient")
+    old = datetime.datetime.now().replace(microsecond=0) - (settings.APPOINTMENT_ARCHIVE_AFTER_DAYS + 10) * DAY
+    recent = datetime.datetime.now().replace(microsecond=0) - 2 * DAY
+    ids = await add_past(doctor_id, patient_id, {
+        "old": (old, AppointmentStatus.SCHEDULED),
+        "old_later": (old + DAY, AppointmentStatus.SCHEDULED),
+        "old_cancelled": (old + 2 * DAY, AppointmentStatus.CANCELLED),
+        "recent": (recent, AppointmentStatus.SCHEDULED),
+        "recent_cancelled": (recent + DAY, AppointmentStatus.CANCELLED),
+    })
+    ids["upcoming"] = await book(client, doctor_id, patient_headers, next_monday())
+
+    await sweep()
+
+    async with session() as db:
+        live = dict((await db.execute(
+            select(AppointmentModel.id, AppointmentModel.status).where(AppointmentModel.doctor_id == doctor_id)
+        )).tuples().all())
+        archived = dict((await db.execute(
+            select(ArchivedAppointment.id, ArchivedAppointment.status).where(ArchivedAppointment.doctor_id == doctor_id)
+        )).tuples().all())
+    # Archived rows keep their ids, and are completed before they are moved.
+    assert archived == {
+        ids["old"]: AppointmentStatus.COMPLETED,
+        ids["old_later"]: AppointmentStatus.COMPLETED,
+        ids["old_cancelled"]: AppointmentStatus.CANCELLED,
+    }
+    assert live == {
+        ids["recent"]: AppointmentStatus.COMPLETED,
+        ids["recent_cancelled"]: AppointmentStatus.CANCELLED,
+        ids["upcoming"]: AppointmentStatus.SCHEDULED,
+    }
+
+    # A second sweep finds nothing left to do.
+    async with session() as db:
+        assert await complete_past_appointments(db) == 0
+        assert await archive_old_appointments(db) == 0
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3])
+async def test_cursor_paging_crosses_from_the_archive_to_the_live_table(client, limit):
+    doctor_id, doctor_headers = await register(client, "doctor")
+    await set_weekday_hours(client, doctor_headers)
+    patient_id, patient_headers = await register(client, "patient")
+    old = datetime.datetime.now().replace(microsecond=0) - (settings.APPOINTMENT_ARCHIVE_AFTER_DAYS + 10) * DAY
+    ids = await add_past(doctor_id, patient_id, {
+        "old": (old, AppointmentStatus.SCHEDULED),
+        "old_twin": (old, AppointmentStatus.CANCELLED),
+        "old_later": (old + DAY, AppointmentStatus.SCHEDULED),
+        "recent": (datetime.datetime.now().replace(microsecond=0) - DAY, AppointmentStatus.SCHEDULED),
+    })
+    ids["upcoming"] = await book(client, doctor_id, patient_headers, next_monday())
+    ids["upcoming_later"] = await book(client, doctor_id, patient_headers, next_monday(datetime.time(10)))
+    await sweep()
+    async with session() as db:
+        assert len((await db.scalars(
+            select(ArchivedAppointment.id).where(ArchivedAppointment.doctor_id == doctor_id)
+        )).all()) == 3
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": limit, **({"cursor": cursor} if cursor else {})}
+        response = await client.get(f"{API}/appointments", params=params, headers=doctor_headers)
+        assert response.status_code == 200, response.text
+        page = response.json()
+        assert len(page["items"]) <= limit
+        seen += [item["id"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    # (appointment_time, id) order without gaps or duplicates; the twins tie on time.
+    twins = sorted([ids["old"], ids["old_twin"]])
+    assert seen == twins + [ids["old_later"], ids["recent"], ids["upcoming"], ids["upcoming_later"]]
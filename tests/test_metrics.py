@@ -0,0 +1,60 @@
+import re
+
+import pytest
+
+from benchmarks.load_test import SERVER_TIMING_QUERIES
+from tests.conftest import API, count_queries, register
+
+pytestmark = pytest.mark.anyio
+
+
+async def scrape(client) -> dict:
+    """
+    The samples of /metrics, keyed by metric name plus labels.
+    """
+    response = await client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    samples = {}
+    for line in response.text.splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+
+
+async def test_a_request_is_counted_and_reports_its_db_work(client):
+    _, headers = await register(client, "doctor")
+    requests = 'http_requests_total{method="GET",route="/api/v1/appointments",status="200"}'
+    queries = 'db_queries_total{route="/api/v1/appointments"}'
+    duration = 'http_request_duration_seconds_count{method="GET",route="/api/v1/appointments"}'
+    before = await scrape(client)
+
+    with count_queries() as statements:
+        response = await client.get(f"{API}/appointments", headers=headers)
+    assert response.status_code == 200
+
+    # The header is what benchmarks/load_test.py reads the per-request query count from.
+    timing = response.headers["Server-Timing"]
+    assert re.search(r"app;dur=[\d.]+", timing)
+    assert re.search(r"pool;dur=[\d.]+", timing)
+    match = SERVER_TIMING_QUERIES.search(timing)
+    assert match is not None, timing
+    assert int(match.group(1)) == len(statements) > 0
+
+    after = await scrape(client)
+    assert after[requests] == before.get(requests, 0) + 1
+    assert after[duration] == before.get(duration, 0) + 1
+    assert after[queries] == before.get(queries, 0) + len(statements)
+
+
+async def test_unmatched_requests_are_counted_under_one_route(client):
+    unmatched = 'http_requests_total{method="GET",route="unmatched",status="404"}'
+    before = await scrape(client)
+
+    response = await client.get(f"{API}/no-such-endpoint")
+    assert response.status_code == 404
+    assert SERVER_TIMING_QUERIES.search(response.headers["Server-Timing"]).group(1) == "0"
+
+    after = await scrape(client)
+    assert after[unmatched] == before.get(unmatched, 0) + 1
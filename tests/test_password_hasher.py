@@ -0,0 +1,83 @@
+import asyncio
+import time
+
+import pytest
+from passlib.hash import bcrypt
+from sqlalchemy import select
+
+import app.api.v1.users_api as users_api
+from app.core.config import settings
+from app.core.security import pwd_context
+from app.db.database import session
+from app.schema.users import User
+from app.services.password_hasher import PasswordHasher
+from tests.conftest import API, PASSWORD, register
+
+pytestmark = pytest.mark.anyio
+
+
+async def register_patient(client) -> str:
+    """
+    Register a patient through the shared helper; returns their email, which login needs.
+    """
+    patient_id, _ = await register(client, "patient")
+    async with session() as db:
+        return await db.scalar(select(User.email).where(User.id == patient_id))
+
+
+async def stored_hash(email: str) -> str:
+    async with session() as db:
+        return await db.scalar(select(User.password).where(User.email == email))
+
+
+@pytest.fixture
+def small_hasher(monkeypatch):
+    # One worker process and room for a single call in flight.
+    hasher = PasswordHasher(workers=1, max_pending=1)
+    hasher.start()
+    monkeypatch.setattr(users_api, "password_hasher", hasher)
+    yield hasher
+    hasher.shutdown()
+
+
+async def test_login_gets_503_while_the_hasher_is_saturated(client, small_hasher):
+    email = await register_patient(client)
+
+    # Occupy the only slot with a call that keeps the worker busy.
+    busy = asyncio.ensure_future(small_hasher._run(time.sleep, 1))
+    await asyncio.sleep(0)
+    assert small_hasher._pending == 1
+
+    response = await client.post(f"{API}/auth/login", json={"email": email, "password": PASSWORD})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+    await busy
+    assert small_hasher._pending == 0
+    response = await client.post(f"{API}/auth/login", json={"email": email, "password": PASSWORD})
+    assert response.status_code == 200, response.text
+
+
+async def test_login_replaces_a_hash_with_an_outdated_cost(client, small_hasher):
+    email = await register_patient(client)
+    outdated = bcrypt.using(rounds=4).hash(PASSWORD)
+    async with session() as db:
+        user = await db.scalar(select(User).where(User.email == email))
+        user.password = outdated
+        await db.commit()
+
+    response = await client.post(f"{API}/auth/login", json={"email": email, "password": PASSWORD})
+    assert response.status_code == 200, response.text
+    upgraded = await stored_hash(email)
+    assert upgraded != outdated
+    assert upgraded.startswith(f"$2b${settings.BCRYPT_ROUNDS:02d}$")
+    assert pwd_context.verify(PASSWORD, upgraded)
+
+    # A current hash is kept as it is.
+    response = await client.post(f"{API}/auth/login", json={"email": email, "password": PASSWORD})
+    assert response.status_code == 200, response.text
+    assert await stored_hash(email) == upgraded
+
+    response = await client.post(f"{API}/auth/login", json={"email": email, "password": "wrong-password"})
+    assert response.status_code == 401
+    assert await stored_hash(email) == upgraded
@@ -0,0 +1,52 @@
+import datetime
+
+import pytest
+
+from tests.conftest import API, WEEKDAYS, book, count_queries, next_monday, register, set_weekday_hours
+
+pytestmark = pytest.mark.anyio
+
+MANY = 10
+
+
+async def test_appointment_listing_queries_do_not_grow_with_appointments(client):
+    one_id, one_headers = await register(client, "doctor")
+    many_id, many_headers = await register(client, "doctor")
+    await set_weekday_hours(client, one_headers)
+    await set_weekday_hours(client, many_headers)
+    patients = [await register(client, "patient") for _ in range(3)]
+
+    start = next_monday()
+    await book(client, one_id, patients[0][1], start)
+    for i in range(MANY):
+        await book(client, many_id, patients[i % len(patients)][1], start + datetime.timedelta(minutes=30 * i))
+
+    counts = []
+    for headers, expected in [(one_headers, 1), (many_headers, MANY)]:
+        # The first request also loads the doctor into the auth cache.
+        await client.get(f"{API}/appointments", headers=headers)
+        with count_queries() as statements:
+            response = await client.get(f"{API}/appointments", headers=headers)
+        assert response.status_code == 200
+        assert len(response.json()["items"]) == expected
+        counts.append(len(statements))
+    assert counts[0] == counts[1], counts
+
+
+async def test_doctor_details_queries_do_not_grow_with_availability(client):
+    one_id, one_headers = await register(client, "doctor")
+    many_id, many_headers = await register(client, "doctor")
+    await set_weekday_hours(client, one_headers, days=WEEKDAYS[:1])
+    await set_weekday_hours(client, many_headers)
+    _, patient_headers = await register(client, "patient")
+    await client.get(f"{API}/doctors", headers=patient_headers)
+
+    counts = []
+    for doctor_id, expected in [(one_id, 1), (many_id, len(WEEKDAYS))]:
+        # The profile is cached after the first read, so only that first read is counted.
+        with count_queries() as statements:
+            response = await client.get(f"{API}/doctors/{doctor_id}", headers=patient_headers)
+        assert response.status_code == 200
+        assert len(response.json()["availabilities"]) == expected
+        counts.append(len(statements))
+    assert counts[0] == counts[1], counts
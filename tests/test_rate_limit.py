@@ -0,0 +1,97 @@
+import fakeredis
+import pytest
+
+from app.core.config import settings
+from app.services import rate_limit
+from app.services.rate_limit import MemoryRateLimitBackend, Rate, RedisRateLimitBackend
+from tests.conftest import API, PASSWORD, FakeClock, register
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit, "time", clock)
+    return clock
+
+
+def test_rate_parse():
+    assert Rate.parse("5/minute") == Rate(capacity=5, period=60)
+    assert Rate.parse(" 10 / hour ").refill_per_second == 10 / 3600
+    for value in ["5", "0/minute", "-1/minute", "5/fortnight", "five/minute"]:
+        with pytest.raises(ValueError):
+            Rate.parse(value)
+
+
+async def test_bucket_allows_its_capacity_then_refills(clock):
+    backend = MemoryRateLimitBackend(maxsize=10)
+    rate = Rate.parse("3/minute")
+    assert [await backend.hit("key", rate) for _ in range(3)] == [0, 0, 0]
+    assert await backend.hit("key", rate) == pytest.approx(20)
+
+    # A third of a minute refills one token; a refused hit takes none.
+    clock.advance(10)
+    assert await backend.hit("key", rate) == pytest.approx(10)
+    clock.advance(10)
+    assert await backend.hit("key", rate) == 0
+    assert await backend.hit("key", rate) == pytest.approx(20)
+
+    # Other keys have buckets of their own.
+    assert await backend.hit("other", rate) == 0
+
+    # However long the bucket idles, it never holds more than its capacity.
+    clock.advance(3600)
+    assert [await backend.hit("key", rate) for _ in range(4)][-1] == pytest.approx(20)
+
+
+async def test_redis_bucket_allows_its_capacity():
+    backend = RedisRateLimitBackend(fakeredis.FakeAsyncRedis())
+    rate = Rate.parse("3/hour")
+    try:
+        assert [await backend.hit("key", rate) for _ in range(3)] == [0, 0, 0]
+        # The script runs on the server's clock, so a little time may have passed.
+        assert 1190 < await backend.hit("key", rate) <= 1200
+        assert await backend.hit("other", rate) == 0
+    finally:
+        await backend.close()
+
+
+@pytest.fixture
+def rate_limited(monkeypatch, clock):
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(rate_limit, "rate_limit_backend", MemoryRateLimitBackend(maxsize=100))
+    return clock
+
+
+async def test_login_answers_429_with_retry_after_once_the_email_bucket_is_empty(client, rate_limited):
+    login = {"email": "limited@test.io", "password": PASSWORD}
+
+    # Five attempts a minute per email, whether or not the account exists.
+    statuses = [(await client.post(f"{API}/auth/login", json=login)).status_code for _ in range(5)]
+    assert statuses == [401] * 5
+    response = await client.post(f"{API}/auth/login", json=login)
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "12"
+
+    # Another email from the same address still has attempts left.
+    response = await client.post(f"{API}/auth/login", json={**login, "email": "other@test.io"})
+    assert response.status_code == 401
+
+    rate_limited.advance(12)
+    assert (await client.post(f"{API}/auth/login", json=login)).status_code == 401
+    assert (await client.post(f"{API}/auth/login", json=login)).status_code == 429
+
+
+async def test_register_answers_429_once_the_address_bucket_is_empty(client, rate_limited):
+    # Ten registrations an hour per client address.
+    for _ in range(10):
+        await register(client, "patient")
+    response = await client.post(
+        f"{API}/auth/register", json={"email": "late@test.io", "password": PASSWORD, "role": "patient"}
+    )
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "360"
+
+    rate_limited.advance(360)
+    await register(client, "patient")
@@ -0,0 +1,97 @@
+import asyncio
+import datetime
+import sqlite3
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.api import dependencies
+from app.core.config import settings
+from app.db.database import create_db_engine, engine
+from app.schema.appointment import Appointment as AppointmentModel
+from tests.conftest import API, next_monday, register, set_weekday_hours
+
+pytestmark = pytest.mark.anyio
+
+
+class Replica:
+    """
+    A second SQLite file that only catches up with the primary when told to,
+    so every read can be traced to one of the two.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.engine = create_db_engine(f"sqlite:///{path}")
+        self.session = async_sessionmaker(
+            bind=self.engine, autoflush=False, expire_on_commit=False, info={"replica": True}
+        )
+
+    def catch_up(self) -> None:
+        source, target = sqlite3.connect(make_url(settings.DATABASE_URL).database), sqlite3.connect(self.path)
+        try:
+            source.backup(target)
+        finally:
+            source.close()
+            target.close()
+
+
+@pytest.fixture
+async def replica(tmp_path, monkeypatch):
+    replica = Replica(tmp_path / "replica.db")
+    monkeypatch.setattr(dependencies, "replica_sessions", [replica.session])
+    monkeypatch.setattr(dependencies, "read_session", lambda: replica.session)
+    yield replica
+    await replica.engine.dispose()
+
+
+async def appointment_ids(db_engine, doctor_id: int) -> list:
+    async with db_engine.connect() as conn:
+        return list(await conn.scalars(select(AppointmentModel.id).where(AppointmentModel.doctor_id == doctor_id)))
+
+
+async def free_slots(client, doctor_id: int, headers: dict, day: datetime.datetime) -> list:
+    response = await client.get(
+        f"{API}/doctors/{doctor_id}/slots",
+        params={"from": day.isoformat(), "to": (day + datetime.timedelta(days=1)).isoformat()},
+        headers=headers,
+    )
+    assert response.status_code == 200, response.text
+    return [slot["start"] for slot in response.json()]
+
+
+async def test_reads_use_the_replica_unless_the_client_just_wrote(client, replica, monkeypatch):
+    monkeypatch.setattr(settings, "PRIMARY_STICKY_SECONDS", 1)
+    doctor_id, doctor_headers = await register(client, "doctor")
+    await set_weekday_hours(client, doctor_headers)
+    _, patient_headers = await register(client, "patient")
+    _, other_headers = await register(client, "patient")
+    start = next_monday()
+    replica.catch_up()
+
+    # Plain reads go to the replica, which has the doctor's hours.
+    assert start.isoformat() in await free_slots(client, doctor_id, patient_headers, start)
+
+    # Writes go to the primary; the replica has not seen the booking yet.
+    response = await client.post(
+        f"{API}/book-appointments",
+        json={"doctor_id": doctor_id, "appointment_time": start.isoformat()},
+        headers=patient_headers,
+    )
+    assert response.status_code == 201, response.text
+    assert await appointment_ids(engine, doctor_id) == [response.json()["id"]]
+    assert await appointment_ids(replica.engine, doctor_id) == []
+
+    # The patient who booked is pinned to the primary and sees the slot taken,
+    # while everyone else still reads the lagging replica.
+    assert start.isoformat() not in await free_slots(client, doctor_id, patient_headers, start)
+    assert start.isoformat() in await free_slots(client, doctor_id, other_headers, start)
+
+    # Once the pin window has passed, the patient is back on the replica.
+    await asyncio.sleep(1.1)
+    assert start.isoformat() in await free_slots(client, doctor_id, patient_headers, start)
+
+    replica.catch_up()
+    assert start.isoformat() not in await free_slots(client, doctor_id, other_headers, start)
@@ -0,0 +1,47 @@
+import pytest
+
+import app.api.ops_api as ops_api
+from app.db.database import create_db_engine, engine
+
+pytestmark = pytest.mark.anyio
+
+REPLICA = create_db_engine("sqlite:////nonexistent-directory/replica.db")
+
+
+@pytest.fixture
+def unreachable(monkeypatch):
+    """
+    Configure one replica and patch the ping so the engines in the returned set are down.
+    """
+    down = set()
+    real_ping = ops_api._ping
+
+    async def ping(db_engine):
+        return False if db_engine in down else await real_ping(engine)
+
+    monkeypatch.setattr(ops_api, "replica_engines", [REPLICA])
+    monkeypatch.setattr(ops_api, "_ping", ping)
+    return down
+
+
+async def test_ready_while_every_database_answers(client, unreachable):
+    response = await client.get("/readyz")
+    assert response.status_code == 200
+    assert response.json() == {"status": "ok", "checks": {"database": "ok", "replica-0": "ok"}}
+
+
+@pytest.mark.parametrize("failing", ["database", "replica-0"])
+async def test_not_ready_when_the_primary_or_a_replica_is_unreachable(client, unreachable, failing):
+    unreachable.add(engine if failing == "database" else REPLICA)
+
+    response = await client.get("/readyz")
+    assert response.status_code == 503
+    checks = {"database": "ok", "replica-0": "ok", failing: "failed"}
+    assert response.json() == {"status": "unavailable", "checks": checks}
+    # Liveness does not depend on the database.
+    assert (await client.get("/livez")).status_code == 200
+
+
+async def test_ping_fails_for_a_database_it_cannot_connect_to():
+    assert await ops_api._ping(engine)
+    assert not await ops_api._ping(REPLICA)
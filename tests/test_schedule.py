@@ -0,0 +1,168 @@
+import datetime
+
+import pytest
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.db.database import session
+from app.schema.schedule import ScheduleSlot
+from tests.conftest import API, book, next_monday, register, set_weekday_hours
+
+pytestmark = pytest.mark.anyio
+
+
+async def get_slots(client, doctor_id: int, headers: dict, start: datetime.datetime, end: datetime.datetime, **params):
+    response = await client.get(
+        f"{API}/doctors/{doctor_id}/slots",
+        params={"from": start.isoformat(), "to": end.isoformat(), **params},
+        headers=headers,
+    )
+    assert response.status_code == 200, response.text
+    return [(slot["start"], slot["end"]) for slot in response.json()]
+
+
+async def materialized(doctor_id: int) -> list:
+    async with session() as db:
+        return (await db.execute(
+            select(ScheduleSlot.start_time, ScheduleSlot.end_time)
+            .where(ScheduleSlot.doctor_id == doctor_id)
+            .order_by(ScheduleSlot.start_time)
+        )).all()
+
+
+async def book_at(client, doctor_id: int, headers: dict, at: datetime.datetime):
+    return await client.post(
+        f"{API}/book-appointments", json={"doctor_id": doctor_id, "appointment_time": at.isoformat()}, headers=headers
+    )
+
+
+async def test_weekly_hours_are_materialized_over_the_horizon(client):
+    doctor_id, doctor_headers = await register(client, "doctor")
+    response = await client.post(
+        f"{API}/availability",
+        json=[
+            {"day_of_week": "monday", "start_time": "09:00:00", "end_time": "11:00:00"},
+            # The 10 minutes left after the last 20-minute slot are dropped.
+            {"day_of_week": "wednesday", "start_time": "14:00:00", "end_time": "15:10:00", "slot_minutes": 20},
+        ],
+        headers=doctor_headers,
+    )
+    assert response.status_code == 201, response.text
+
+    slots = await materialized(doctor_id)
+    today = datetime.date.today()
+    horizon_end = today + datetime.timedelta(weeks=settings.SCHEDULE_HORIZON_WEEKS)
+    assert all(today <= start.date() < horizon_end for start, _ in slots)
+    days = sorted({start.date() for start, _ in slots})
+    assert {day.weekday() for day in days} == {0, 2}
+    assert len(days) == 2 * settings.SCHEDULE_HORIZON_WEEKS
+    for day in days:
+        day_slots = [(start.time(), end.time()) for start, end in slots if start.date() == day]
+        if day.weekday() == 0:
+            assert day_slots == [
+                (datetime.time(9), datetime.time(9, 30)),
+                (datetime.time(9, 30), datetime.time(10)),
+                (datetime.time(10), datetime.time(10, 30)),
+                (datetime.time(10, 30), datetime.time(11)),
+            ]
+        else:
+            assert day_slots == [
+                (datetime.time(14), datetime.time(14, 20)),
+                (datetime.time(14, 20), datetime.time(14, 40)),
+                (datetime.time(14, 40), datetime.time(15)),
+            ]
+
+    # Replacing the hours drops the slots of the day that is no longer worked.
+    response = await client.post(
+        f"{API}/availability",
+        json=[{"day_of_week": "monday", "start_time": "09:00:00", "end_time": "11:00:00"}],
+        headers=doctor_headers,
+    )
+    assert response.status_code == 201, response.text
+    slots = await materialized(doctor_id)
+    assert {start.weekday() for start, _ in slots} == {0}
+    assert len(slots) == 4 * settings.SCHEDULE_HORIZON_WEEKS
+
+
+async def test_exceptions_remove_and_replace_slots_of_their_date(client):
+    doctor_id, doctor_headers = await register(client, "doctor")
+    await set_weekday_hours(client, doctor_headers)
+    _, patient_headers = await register(client, "patient")
+    monday = next_monday()
+    day_start, day_end = monday.replace(hour=0), monday.replace(hour=23)
+    date = monday.date().isoformat()
+    assert len(await get_slots(client, doctor_id, patient_headers, day_start, day_end)) == 16
+
+    response = await client.put(f"{API}/availability/exceptions/{date}", json=[], headers=doctor_headers)
+    assert response.status_code == 200, response.text
+    assert await get_slots(client, doctor_id, patient_headers, day_start, day_end) == []
+    assert [start for start, _ in await materialized(doctor_id) if start.date() == monday.date()] == []
+    # The rest of the week is untouched.
+    tuesday = day_start + datetime.timedelta(days=1)
+    assert len(await get_slots(client, doctor_id, patient_headers, tuesday, tuesday.replace(hour=23))) == 16
+
+    response = await client.put(
+        f"{API}/availability/exceptions/{date}",
+        json=[{"start_time": "13:00:00", "end_time": "14:00:00", "slot_minutes": 60}],
+        headers=doctor_headers,
+    )
+    assert response.status_code == 200, response.text
+    assert await get_slots(client, doctor_id, patient_headers, day_start, day_end) == [
+        (monday.replace(hour=13).isoformat(), monday.replace(hour=14).isoformat()),
+    ]
+
+    response = await client.delete(f"{API}/availability/exceptions/{date}", headers=doctor_headers)
+    assert response.status_code == 204
+    assert len(await get_slots(client, doctor_id, patient_headers, day_start, day_end)) == 16
+
+
+async def test_booking_off_the_slot_grid_is_rejected(client):
+    doctor_id, doctor_headers = await register(client, "doctor")
+    await set_weekday_hours(client, doctor_headers)
+    _, patient_headers = await register(client, "patient")
+    monday = next_monday()
+    sunday = monday - datetime.timedelta(days=1)
+
+    for at in (monday.replace(minute=10), monday.replace(hour=17), monday.replace(hour=8, minute=30), sunday):
+        response = await book_at(client, doctor_id, patient_headers, at)
+        assert response.status_code == 400, (at, response.text)
+        assert response.json()["detail"] == "The requested time slot is outside the doctor's availability."
+
+    response = await client.put(f"{API}/availability/exceptions/{monday.date()}", json=[], headers=doctor_headers)
+    assert response.status_code == 200, response.text
+    response = await book_at(client, doctor_id, patient_headers, monday)
+    assert response.status_code == 400
+
+    tuesday = monday + datetime.timedelta(days=1)
+    response = await client.post(
+        f"{API}/book-appointments/bulk",
+        json=[
+            {"doctor_id": doctor_id, "appointment_time": tuesday.isoformat()},
+            {"doctor_id": doctor_id, "appointment_time": tuesday.replace(minute=15).isoformat()},
+        ],
+        headers=patient_headers,
+    )
+    assert response.status_code == 200, response.text
+    assert [item["status_code"] for item in response.json()] == [201, 400]
+
+
+async def test_duration_returns_spans_covered_by_back_to_back_free_slots(client):
+    doctor_id, doctor_headers = await register(client, "doctor")
+    await set_weekday_hours(client, doctor_headers)
+    _, patient_headers = await register(client, "patient")
+    monday = next_monday()
+    at = lambda hour, minute=0: monday.replace(hour=hour, minute=minute)
+    await book(client, doctor_id, patient_headers, at(10))
+
+    spans = await get_slots(client, doctor_id, patient_headers, at(9), at(12), duration=60)
+    assert spans == [
+        (at(9).isoformat(), at(10).isoformat()),
+        (at(10, 30).isoformat(), at(11, 30).isoformat()),
+        (at(11).isoformat(), at(12).isoformat()),
+    ]
+    # A span may end inside a slot, as long as the slots it needs are free.
+    spans = await get_slots(client, doctor_id, patient_headers, at(9), at(12), duration=45)
+    assert [start for start, _ in spans] == [at(9).isoformat(), at(10, 30).isoformat(), at(11).isoformat()]
+    # Without a duration, the free slots themselves are listed.
+    slots = await get_slots(client, doctor_id, patient_headers, at(9), at(11))
+    assert [start for start, _ in slots] == [at(9).isoformat(), at(9, 30).isoformat(), at(10, 30).isoformat()]
@@ -0,0 +1,238 @@
+import asyncio
+import datetime
+import json
+import signal
+
+import pytest
+
+from app.core.config import settings
+from app.main import _on_exit_signal, app
+from app.services.events import RESYNC, Subscription, slot_events
+from tests.conftest import API, book, next_monday, register, set_weekday_hours
+
+pytestmark = pytest.mark.anyio
+
+
+class ASGIConnection:
+    """
+    Drives one long-lived request (an event stream or a WebSocket) straight through the
+    app, in the test's event loop. httpx's ASGI transport only returns a response once
+    its body is complete, so it cannot read a stream that stays open.
+    """
+
+    def __init__(self, path: str, token: str, websocket: bool = False):
+        self.websocket = websocket
+        self.scope = {
+            "type": "websocket" if websocket else "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "ws" if websocket else "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "root_path": "",
+            "query_string": f"feed_token={token}".encode(),
+            "headers": [(b"host", b"test")],
+            "client": ("127.0.0.1", 50000),
+            "server": ("test", 80),
+            "subprotocols": [],
+        }
+        self.messages: asyncio.Queue = asyncio.Queue()
+        self._connected = False
+        self._disconnected = asyncio.Event()
+        self._task = None
+
+    async def _receive(self) -> dict:
+        if not self._connected:
+            self._connected = True
+            return {"type": "websocket.connect"} if self.websocket else {"type": "http.request", "body": b""}
+        await self._disconnected.wait()
+        return {"type": "websocket.disconnect", "code": 1000} if self.websocket else {"type": "http.disconnect"}
+
+    async def __aenter__(self) -> "ASGIConnection":
+        self._task = asyncio.create_task(app(self.scope, self._receive, self.messages.put))
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self._disconnected.set()
+        await asyncio.wait_for(self._task, 5)
+
+    async def next(self) -> dict:
+        return await asyncio.wait_for(self.messages.get(), 5)
+
+    async def next_event(self) -> dict:
+        """
+        The next event sent, skipping heartbeats.
+        """
+        return await asyncio.wait_for(self._next_event(), 5)
+
+    async def _next_event(self) -> dict:
+        while True:
+            message = await self.messages.get()
+            if self.websocket:
+                event = json.loads(message["text"])
+            else:
+                body = message["body"].decode()
+                if not body.startswith("data: "):
+                    continue
+                event = json.loads(body[len("data: "):])
+            if event["op"] != "heartbeat":
+                return event
+
+
+def token_of(headers: dict) -> str:
+    return headers["Authorization"].split(" ", 1)[1]
+
+
+async def feed_token(client, doctor_id: int, headers: dict) -> str:
+    response = await client.post(f"{API}/doctors/{doctor_id}/slots/feed-token", headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()["feed_token"]
+
+
+async def cancel(client, appointment_id: int, headers: dict) -> None:
+    response = await client.post(
+        f"{API}/appointments/bulk-cancel", json={"appointment_ids": [appointment_id]}, headers=headers
+    )
+    assert [result["status_code"] for result in response.json()] == [200]
+
+
+async def test_event_stream_reports_booked_and_freed_slots(client):
+    doctor_id, doctor_headers = await register(client, "doctor")
+    await set_weekday_hours(client, doctor_headers)
+    _, patient_headers = await register(client, "patient")
+    slot = next_monday()
+
+    subscribers = len(slot_events)
+    path = f"{API}/doctors/{doctor_id}/slots/events"
+    async with ASGIConnection(path, await feed_token(client, doctor_id, patient_headers)) as stream:
+        start = await stream.next()
+        assert start["status"] == 200
+        assert (b"content-type", b"text/event-stream; charset=utf-8") in start["headers"]
+        assert (await stream.next())["body"] == b"retry: 3000\n\n"
+        assert len(slot_events) == subscribers + 1
+
+        appointment_id = await book(client, doctor_id, patient_headers, slot)
+        assert await stream.next_event() == {"doctor_id": doctor_id, "op": "booked", "slots": [slot.isoformat()]}
+        await cancel(client, appointment_id, patient_headers)
+        assert await stream.next_event() == {"doctor_id": doctor_id, "op": "freed", "slots": [slot.isoformat()]}
+    assert len(slot_events) == subscribers
+
+
+async def test_websocket_reports_booked_slots_with_heartbeats_in_between(client, monkeypatch):
+    monkeypatch.setattr(settings, "SLOT_FEED_HEARTBEAT_SECONDS", 0.05)
+    doctor_id, doctor_headers = await register(client, "doctor")
+    await set_weekday_hours(client, doctor_headers)
+    _, patient_headers = await register(client, "patient")
+    slot = next_monday()
+
+    subscribers = len(slot_events)
+    path = f"{API}/doctors/{doctor_id}/slots/ws"
+    async with ASGIConnection(path, await feed_token(client, doctor_id, patient_headers), websocket=True) as websocket:
+        assert (await websocket.next())["type"] == "websocket.accept"
+        assert json.loads((await websocket.next())["text"]) == {"op": "heartbeat"}
+
+        await book(client, doctor_id, patient_headers, slot)
+        assert await websocket.next_event() == {"doctor_id": doctor_id, "op": "booked", "slots": [slot.isoformat()]}
+    assert len(slot_events) == subscribers
+
+
+async def test_full_feed_refuses_new_subscribers(client, monkeypatch):
+    doctor_id, doctor_headers = await register(client, "doctor")
+    _, patient_headers = await register(client, "patient")
+    token = await feed_token(client, doctor_id, patient_headers)
+    monkeypatch.setattr(slot_events, "max_subscribers", len(slot_events))
+
+    response = await client.get(f"{API}/doctors/{doctor_id}/slots/events", headers=patient_headers)
+    assert response.status_code == 503
+
+    path = f"{API}/doctors/{doctor_id}/slots/ws"
+    async with ASGIConnection(path, token, websocket=True) as websocket:
+        message = await websocket.next()
+    assert message["type"] == "websocket.close"
+    assert message["code"] == 1013
+
+    # Unknown doctors and missing tokens are refused before counting against the limit.
+    monkeypatch.setattr(slot_events, "max_subscribers", len(slot_events) + 1)
+    response = await client.get(f"{API}/doctors/0/slots/events", headers=patient_headers)
+    assert response.status_code == 404
+    response = await client.get(f"{API}/doctors/{doctor_id}/slots/events")
+    assert response.status_code == 401
+
+
+async def test_only_feed_tokens_for_the_doctor_are_accepted_in_the_url(client):
+    doctor_id, _ = await register(client, "doctor")
+    other_doctor_id, _ = await register(client, "doctor")
+    _, patient_headers = await register(client, "patient")
+    token = await feed_token(client, doctor_id, patient_headers)
+
+    # Access tokens are only taken from the header, since query strings end up in access logs.
+    response = await client.get(
+        f"{API}/doctors/{doctor_id}/slots/events", params={"feed_token": token_of(patient_headers)}
+    )
+    assert response.status_code == 401
+    path = f"{API}/doctors/{other_doctor_id}/slots/ws"
+    async with ASGIConnection(path, token, websocket=True) as websocket:
+        message = await websocket.next()
+    assert message["type"] == "websocket.close"
+    assert message["code"] == 1008
+
+    # A feed token does nothing else: it is not an access token or a password reset token.
+    slot = next_monday()
+    response = await client.get(
+        f"{API}/doctors/{doctor_id}/slots",
+        params={"from": slot.isoformat(), "to": (slot + datetime.timedelta(hours=1)).isoformat()},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 401
+    response = await client.post(f"{API}/auth/reset-password", json={"token": token, "new_password": "hijacked"})
+    assert response.status_code == 400
+
+
+async def test_closing_the_subscriptions_ends_open_feeds(client):
+    doctor_id, _ = await register(client, "doctor")
+    _, patient_headers = await register(client, "patient")
+    subscribers = len(slot_events)
+
+    path = f"{API}/doctors/{doctor_id}/slots"
+    async with ASGIConnection(f"{path}/events", await feed_token(client, doctor_id, patient_headers)) as stream:
+        async with ASGIConnection(
+            f"{path}/ws", await feed_token(client, doctor_id, patient_headers), websocket=True
+        ) as websocket:
+            assert (await stream.next())["status"] == 200
+            assert (await stream.next())["body"] == b"retry: 3000\n\n"
+            assert (await websocket.next())["type"] == "websocket.accept"
+            assert len(slot_events) == subscribers + 2
+
+            slot_events.close_subscriptions()
+            # Both end on their own, without waiting for the client to go away.
+            assert (await stream.next()) == {"type": "http.response.body", "body": b"", "more_body": False}
+            message = await websocket.next()
+            assert (message["type"], message["code"]) == ("websocket.close", 1001)
+            await asyncio.wait_for(asyncio.gather(stream._task, websocket._task), 5)
+    assert len(slot_events) == subscribers
+
+
+async def test_exit_signal_schedules_the_callback_and_calls_the_servers_handler():
+    calls = []
+    server_handler = signal.signal(signal.SIGTERM, lambda sig, frame: calls.append("server"))
+    try:
+        restore = _on_exit_signal(lambda: calls.append("callback"))
+        signal.raise_signal(signal.SIGTERM)
+        await asyncio.sleep(0)
+        assert calls == ["server", "callback"]
+
+        restore()
+        signal.raise_signal(signal.SIGTERM)
+        await asyncio.sleep(0)
+        assert calls == ["server", "callback", "server"]
+    finally:
+        signal.signal(signal.SIGTERM, server_handler)
+
+
+async def test_subscriber_that_falls_behind_gets_a_resync():
+    subscription = Subscription(doctor_id=1, maxsize=2)
+    for payload in [b"1", b"2", b"3"]:
+        subscription.put(payload)
+    assert await subscription.get(0) == RESYNC
+    assert await subscription.get(0) is None